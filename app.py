@@ -1,41 +1,87 @@
 """
 森系智韵智能空气管理平台 - Flask主应用
 """
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
 from datetime import timedelta
 import json
 import os
+import time
 
 # 导入数据库模型
-from models import db, User, Product, Order, OrderItem, Post, Comment, PostLike, PostFavorite
+from models import (db, User, Product, Order, OrderItem, Post, Comment, PostLike, PostFavorite,
+                    POST_LOADERS, COMMENT_LOADERS, init_strict_loading)
 
 # 导入自定义模块
 from utils.smart_guide import SmartGuideSystem
 from utils.air_butler import AirButler
+from utils.research import get_research_articles
 from utils.product_manager import ProductManager
 from utils.auth import auth_manager, login_required, get_current_user
+from utils.preload import freeze_catalog
+from utils.metrics import init_metrics, track
+from utils.migrations import upgrade_schema
+from utils.ranking import install_sql_functions
+from utils.database import CartDB, CommentDB, OrderDB, PostDB, ORDER_PAGE_SIZE
+from utils.feed_state import init_feed_state, get_post_flags_loader
+from utils.ids import new_post_id
+from utils.write_queue import init_write_queue, write_queue
+from utils.write_coordinator import init_write_coordinator
+from utils.read_replica import init_read_replica
+from utils.inventory import init_inventory, inventory
+from utils.analytics import init_analytics, event_log
+from utils.fragment_cache import init_fragment_cache
+from utils.warmup import init_template_cache
+from utils.streaming import SSE_HEADERS, reply_events, sse_stream, wants_event_stream
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
 app.permanent_session_lifetime = timedelta(days=7)
 
 # 数据库配置
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///senxi_air.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SENXI_DATABASE_URI', 'sqlite:///senxi_air.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ECHO'] = False  # 设置为 True 可以看到 SQL 语句
+# 严格加载模式：请求中的隐式懒加载直接报错（开发/测试时开启）
+app.config['SQLALCHEMY_STRICT_LOADING'] = os.environ.get('SENXI_STRICT_LOADING') == '1'
 
 # 初始化数据库
 db.init_app(app)
+# WAL + busy_timeout（须在建立连接之前），utils.database 的写操作经单写线程合并提交
+init_write_coordinator(app)
+init_strict_loading(app)
+init_metrics(app)
+init_feed_state(app)
 
-# 创建数据库表
+# 注册 hot_score() 等 SQL 函数（须在建立连接之前）
+install_sql_functions()
+
+# 创建缺失的表并执行未应用的迁移（不删除已有数据）
 with app.app_context():
-    db.create_all()
+    upgrade_schema()
     print('数据库表创建成功！')
 
+# 计数、热度分等派生写入交给后台写队列
+init_write_queue(app)
+# 列表查询的只读连接与读快照
+init_read_replica(app)
+# 下单前的库存预占
+init_inventory(app)
+
 # 初始化系统组件
 smart_guide = SmartGuideSystem()
 air_butler = AirButler()
 product_manager = ProductManager()
+# AI空气管家的知识检索覆盖研究院文章和产品介绍
+air_butler.load_documents(get_research_articles(), product_manager.get_all_products())
+
+# 只读化静态目录（gunicorn preload 模式下在 master 中完成，worker 写时复制共享）
+freeze_catalog(smart_guide, air_butler, product_manager)
+# 管家与导购的对话事件（后台批量写入独立的事件库）
+init_analytics(app, air_butler)
+# 模板片段缓存（{% cache %}，键随产品目录指纹和帖子 updated_at 变化）
+init_fragment_cache(app, product_manager)
+# 模板字节码缓存与启动预热的页面（预热由 gunicorn.conf.py / asgi.py 在接收请求前执行）
+init_template_cache(app)
 
 
 # 注入当前用户到模板上下文
@@ -86,24 +132,28 @@ def air_research():
 
 @app.route('/community')
 def community():
-    """健康呼吸社区"""
-    posts = get_community_posts()
+    """健康呼吸社区（按热度排序）"""
+    posts = [_feed_item(post) for post in PostDB.get_hot(limit=20)]
+    # 一次批量加载整页的点赞/收藏状态，模板中通过 post_flags() 读取
+    get_post_flags_loader().load(post['id'] for post in posts)
     return render_template('pages/community.html', posts=posts)
 
 
 @app.route('/post/<post_id>')
 def post_detail(post_id):
     """帖子详情页"""
-    post = Post.query.filter_by(post_id=post_id).first()
+    post = Post.query.options(*POST_LOADERS).filter_by(post_id=post_id).first()
     if not post:
         return render_template('pages/404.html'), 404
     
-    # 增加浏览量
-    post.views += 1
-    db.session.commit()
+    # 浏览量只记入内存缓冲区，由写队列的写线程合并后批量累加
+    write_queue.increment('post_views', post.id)
     
-    # 获取评论
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.created_at.desc()).all()
+    # 获取评论（连同作者一次查出）
+    comments = (Comment.query.options(*COMMENT_LOADERS)
+                .filter_by(post_id=post.id)
+                .order_by(Comment.created_at.desc())
+                .all())
     
     return render_template('pages/post_detail.html', post=post, comments=comments)
 
@@ -144,6 +194,13 @@ def profile():
     return render_template('pages/profile.html')
 
 
+@app.route('/orders')
+@login_required
+def orders():
+    """我的订单页面"""
+    return render_template('pages/orders.html')
+
+
 @app.route('/auth/<platform>')
 def oauth_redirect(platform):
     """第三方登录跳转"""
@@ -230,8 +287,12 @@ def get_user_info():
 @app.route('/api/guide/start', methods=['POST'])
 def guide_start():
     """开始智能导购对话"""
-    session['guide_state'] = smart_guide.init_session()
-    response = smart_guide.get_welcome_message()
+    started = time.perf_counter()
+    with track('smart_guide'):
+        guide_state = session['guide_state'] = smart_guide.init_session()
+        response = smart_guide.get_welcome_message()
+    event_log.record('guide', time.perf_counter() - started, session=guide_state['session_id'],
+                     intent=response['type'], step=0, next_step=response['next_step'])
     return jsonify(response)
 
 
@@ -246,7 +307,11 @@ def guide_chat():
     guide_state = session.get('guide_state', smart_guide.init_session())
     
     # 处理用户输入
-    response = smart_guide.process_input(guide_state, user_input, current_step)
+    started = time.perf_counter()
+    with track('smart_guide'):
+        response = smart_guide.process_input(guide_state, user_input, current_step)
+    event_log.record('guide', time.perf_counter() - started, session=guide_state.get('session_id'),
+                     intent=response['type'], step=current_step, next_step=response['next_step'])
     
     # 更新会话状态
     session['guide_state'] = guide_state
@@ -260,7 +325,8 @@ def guide_recommend():
     data = request.json
     user_profile = data.get('profile', {})
     
-    recommendations = smart_guide.generate_recommendations(user_profile)
+    with track('smart_guide'):
+        recommendations = smart_guide.generate_recommendations(user_profile)
     return jsonify(recommendations)
 
 
@@ -268,13 +334,30 @@ def guide_recommend():
 
 @app.route('/api/butler/chat', methods=['POST'])
 def butler_chat():
-    """AI空气管家对话"""
+    """
+    AI空气管家对话
+
+    请求头 Accept 包含 text/event-stream 时以 SSE 流式返回：
+    先发送 meta（意图、快捷回复等），再分段发送 delta（正文），最后发送 done
+    （回复整体生成后才开始写出，事件拆分只用于前端逐段呈现）
+    """
     data = request.json
     user_message = data.get('message', '')
     context = data.get('context', {})
     
-    response = air_butler.chat(user_message, context)
-    return jsonify(response)
+    started = time.perf_counter()
+    if wants_event_stream(request.headers.get('Accept')):
+        with track('air_butler'):
+            response = air_butler.chat(user_message, context)
+        event_log.record('butler', time.perf_counter() - started, message=user_message)
+        return Response(sse_stream(reply_events(response)), mimetype='text/event-stream',
+                        headers=SSE_HEADERS)
+    
+    # 回复在启动时已序列化，直接写出；意图、子话题和关键词由事件日志在后台补全
+    with track('air_butler'):
+        body = air_butler.chat_json(user_message, context)
+    event_log.record('butler', time.perf_counter() - started, message=user_message)
+    return Response(body, mimetype='application/json')
 
 
 @app.route('/api/butler/quick-reply', methods=['GET'])
@@ -308,92 +391,184 @@ def api_product_detail(product_id):
 
 @app.route('/api/products/compare', methods=['POST'])
 def api_compare_products():
-    """产品对比"""
-    data = request.json
+    """产品对比（同一组产品的响应体只序列化一次）"""
+    data = request.json or {}
     product_ids = data.get('product_ids', [])
+    if not isinstance(product_ids, list):
+        return jsonify({'error': 'product_ids 必须是列表'}), 400
     
-    comparison = product_manager.compare_products(product_ids)
-    return jsonify(comparison)
+    body = product_manager.compare_products_json([str(pid) for pid in product_ids])
+    return Response(body, mimetype='application/json')
+
+
+# ==================== 购物车API ====================
+
+def _cart_quantity(data: dict, default=None):
+    """解析请求中的数量，无效时返回 None"""
+    try:
+        return int(data.get('quantity', default))
+    except (TypeError, ValueError):
+        return None
+
+
+@app.route('/api/cart', methods=['GET'])
+def api_cart():
+    """购物车明细（含当前价格、库存校验和合计）"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    return jsonify({'success': True, **CartDB.get_items(user['id'])})
+
+
+@app.route('/api/cart/summary', methods=['GET'])
+def api_cart_summary():
+    """购物车摘要（角标用，带缓存）"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': True, 'item_count': 0, 'quantity': 0,
+                        'total_amount': 0, 'unavailable_count': 0})
+    return jsonify({'success': True, **CartDB.get_summary(user['id'])})
+
+
+@app.route('/api/cart', methods=['POST'])
+def api_cart_add():
+    """加入购物车"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    data = request.json or {}
+    quantity = _cart_quantity(data, 1)
+    if quantity is None or quantity <= 0:
+        return jsonify({'success': False, 'message': '数量无效'}), 400
+    if not CartDB.add(user['id'], data.get('product_id', ''), quantity):
+        return jsonify({'success': False, 'message': '产品不存在'}), 404
+    return jsonify({'success': True, 'summary': CartDB.get_summary(user['id'])})
+
+
+@app.route('/api/cart/<product_id>', methods=['PUT'])
+def api_cart_update(product_id):
+    """修改数量（0 表示移除）"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    quantity = _cart_quantity(request.json or {})
+    if quantity is None:
+        return jsonify({'success': False, 'message': '数量无效'}), 400
+    if not CartDB.update_quantity(user['id'], product_id, quantity):
+        return jsonify({'success': False, 'message': '购物车中没有该产品'}), 404
+    return jsonify({'success': True, 'summary': CartDB.get_summary(user['id'])})
+
+
+@app.route('/api/cart/<product_id>', methods=['DELETE'])
+def api_cart_remove(product_id):
+    """移出购物车"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    if not CartDB.remove(user['id'], product_id):
+        return jsonify({'success': False, 'message': '购物车中没有该产品'}), 404
+    return jsonify({'success': True, 'summary': CartDB.get_summary(user['id'])})
+
+
+# ==================== 订单API ====================
+
+ORDER_STATUSES = ('pending', 'paid', 'shipped', 'completed', 'cancelled')
+
+
+def _order_json(order: dict) -> dict:
+    """订单对外以订单编号作为 id"""
+    return {**order, 'id': order['order_id']}
+
+
+@app.route('/api/orders', methods=['GET'])
+def api_orders():
+    """订单列表（?status= 按状态筛选，?cursor= 翻页）"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    status = request.args.get('status')
+    if status and status not in ORDER_STATUSES:
+        return jsonify({'success': False, 'message': '订单状态无效'}), 400
+    limit = min(max(request.args.get('limit', ORDER_PAGE_SIZE, type=int), 1), 100)
+    
+    page = OrderDB.get_user_orders(user['id'], status=status, limit=limit,
+                                   cursor=request.args.get('cursor'))
+    return jsonify({'success': True, 'orders': [_order_json(order) for order in page['orders']],
+                    'next_cursor': page['next_cursor']})
+
+
+@app.route('/api/orders/<order_id>/cancel', methods=['POST'])
+def api_order_cancel(order_id):
+    """取消订单（仅待付款订单，退回库存）"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    if not OrderDB.cancel(order_id, user['id']):
+        return jsonify({'success': False, 'message': '订单不存在或当前状态不能取消'}), 409
+    return jsonify({'success': True, 'status': 'cancelled'})
+
+
+@app.route('/api/orders/<order_id>/complete', methods=['POST'])
+def api_order_complete(order_id):
+    """确认收货"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    if not OrderDB.complete(order_id, user['id']):
+        return jsonify({'success': False, 'message': '订单不存在或当前状态不能确认收货'}), 409
+    return jsonify({'success': True, 'status': 'completed'})
+
+
+# ==================== 库存预占API ====================
+
+@app.route('/api/inventory/reserve', methods=['POST'])
+def api_inventory_reserve():
+    """预占库存（下单时在订单项中带上 reservation_id）"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    data = request.json or {}
+    try:
+        quantity = int(data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': '数量无效'}), 400
+    if quantity <= 0:
+        return jsonify({'success': False, 'message': '数量无效'}), 400
+    
+    product_id = data.get('product_id', '')
+    if not product_manager.get_product_by_id(product_id):
+        return jsonify({'success': False, 'message': '商品不存在'}), 404
+    
+    reservation = inventory.reserve(product_id, quantity, user_id=user['id'])
+    if reservation is None:
+        return jsonify({'success': False, 'message': '库存不足'}), 409
+    return jsonify({'success': True, **reservation.to_dict()})
+
+
+@app.route('/api/inventory/reservations/<reservation_id>/release', methods=['POST'])
+def api_inventory_release(reservation_id):
+    """释放预占"""
+    user = session.get('user')
+    if not user:
+        return jsonify({'success': False, 'message': 'not_logged_in'}), 401
+    
+    if not inventory.release(reservation_id, user_id=user['id']):
+        return jsonify({'success': False, 'message': '预占不存在或已失效'}), 404
+    return jsonify({'success': True})
 
 
 # ==================== 辅助函数 ====================
 
-def get_research_articles():
-    """获取空气研究院文章"""
-    return [
-        {
-            'id': 1,
-            'title': 'PM2.5对人体健康的影响及防护措施',
-            'category': '空气污染',
-            'summary': '深入了解PM2.5的危害以及如何有效防护...',
-            'image': '/static/images/research/pm25.jpg',
-            'date': '2024-12-15',
-            'views': 3256
-        },
-        {
-            'id': 2,
-            'title': '甲醛污染：新房装修后的隐形杀手',
-            'category': '室内污染',
-            'summary': '装修后甲醛释放周期及科学除醛方法...',
-            'image': '/static/images/research/formaldehyde.jpg',
-            'date': '2024-12-10',
-            'views': 4521
-        },
-        {
-            'id': 3,
-            'title': '过敏季节如何保护呼吸健康',
-            'category': '健康防护',
-            'summary': '春季花粉过敏的预防与空气净化方案...',
-            'image': '/static/images/research/allergy.jpg',
-            'date': '2024-12-05',
-            'views': 2890
-        },
-        {
-            'id': 4,
-            'title': 'HEPA滤网技术原理详解',
-            'category': '技术科普',
-            'summary': '了解空气净化器核心技术HEPA的工作原理...',
-            'image': '/static/images/research/hepa.jpg',
-            'date': '2024-12-01',
-            'views': 5123
-        }
-    ]
-
-
-def get_community_posts():
-    """获取社区帖子"""
-    return [
-        {
-            'id': 1,
-            'author': '清新小屋',
-            'avatar': '/static/images/avatars/user1.jpg',
-            'title': '使用净界者Pro三个月的真实体验',
-            'content': '自从入手了净界者Pro，家里的空气质量明显改善...',
-            'likes': 156,
-            'comments': 23,
-            'date': '2024-12-16'
-        },
-        {
-            'id': 2,
-            'author': '健康生活家',
-            'avatar': '/static/images/avatars/user2.jpg',
-            'title': '新房除甲醛，我的经验分享',
-            'content': '装修完半年了，分享一下我的除甲醛心得...',
-            'likes': 234,
-            'comments': 45,
-            'date': '2024-12-14'
-        },
-        {
-            'id': 3,
-            'author': '宝妈日记',
-            'avatar': '/static/images/avatars/user3.jpg',
-            'title': '宝宝房间空气净化器选购指南',
-            'content': '作为新手妈妈，对宝宝房间的空气质量特别关注...',
-            'likes': 189,
-            'comments': 34,
-            'date': '2024-12-12'
-        }
-    ]
+def _feed_item(post: dict) -> dict:
+    """帖子列表记录转换为社区模板字段"""
+    return dict(post, author=post['author_name'] or '匿名用户', date=str(post['created_at'])[:10])
 
 
 # ==================== 错误处理 ====================
@@ -425,22 +600,11 @@ def api_post_like(post_id):
     if not post:
         return jsonify({'success': False, 'message': '帖子不存在'}), 404
     
-    # 检查是否已点赞
-    existing_like = PostLike.query.filter_by(user_id=user['id'], post_id=post.id).first()
-    
-    if existing_like:
-        # 取消点赞
-        db.session.delete(existing_like)
-        post.likes = max(0, post.likes - 1)
-        db.session.commit()
-        return jsonify({'success': True, 'liked': False, 'likes': post.likes})
-    else:
-        # 添加点赞
-        new_like = PostLike(user_id=user['id'], post_id=post.id)
-        db.session.add(new_like)
-        post.likes += 1
-        db.session.commit()
-        return jsonify({'success': True, 'liked': True, 'likes': post.likes})
+    # 点赞数和热度分由写队列更新，这里返回更新后的预估值
+    likes = post.likes
+    if PostDB.toggle_like(post.id, user['id']):
+        return jsonify({'success': True, 'liked': True, 'likes': likes + 1})
+    return jsonify({'success': True, 'liked': False, 'likes': max(0, likes - 1)})
 
 
 @app.route('/api/post/<post_id>/favorite', methods=['POST'])
@@ -454,20 +618,8 @@ def api_post_favorite(post_id):
     if not post:
         return jsonify({'success': False, 'message': '帖子不存在'}), 404
     
-    # 检查是否已收藏
-    existing_favorite = PostFavorite.query.filter_by(user_id=user['id'], post_id=post.id).first()
-    
-    if existing_favorite:
-        # 取消收藏
-        db.session.delete(existing_favorite)
-        db.session.commit()
-        return jsonify({'success': True, 'favorited': False})
-    else:
-        # 添加收藏
-        new_favorite = PostFavorite(user_id=user['id'], post_id=post.id)
-        db.session.add(new_favorite)
-        db.session.commit()
-        return jsonify({'success': True, 'favorited': True})
+    favorited = PostDB.toggle_favorite(post.id, user['id'])
+    return jsonify({'success': True, 'favorited': favorited})
 
 
 @app.route('/api/post/<post_id>/comment', methods=['POST'])
@@ -487,19 +639,11 @@ def api_post_comment(post_id):
     if not content:
         return jsonify({'success': False, 'message': '评论内容不能为空'}), 400
     
-    # 创建评论
-    comment = Comment(
-        post_id=post.id,
-        user_id=user['id'],
-        content=content
-    )
-    db.session.add(comment)
-    
-    # 更新帖子评论数
-    post.comment_count += 1
-    
-    db.session.commit()
+    # 创建评论（评论数和热度分由写队列更新）
+    comment_pk = CommentDB.create(post.id, user['id'], content)
     
+    # 连同作者加载一次用于序列化
+    comment = Comment.query.options(*COMMENT_LOADERS).filter_by(id=comment_pk).one()
     return jsonify({'success': True, 'message': '评论成功', 'comment': comment.to_dict()})
 
 
@@ -519,20 +663,10 @@ def api_create_post():
     if not title or not content:
         return jsonify({'success': False, 'message': '标题和内容不能为空'}), 400
     
-    # 生成帖子ID
-    import time
-    post_id = f"post_{int(time.time() * 1000)}"
+    # 生成帖子编号（按时间递增，多线程/多 worker 下不重复）
+    post_id = new_post_id()
     
     # 创建帖子
-    post = Post(
-        post_id=post_id,
-        user_id=user['id'],
-        title=title,
-        content=content,
-        category=category,
-        images=json.dumps(images) if images else None
-    )
-    db.session.add(post)
-    db.session.commit()
+    PostDB.create(user['id'], title, content, category, images, post_id=post_id)
     
     return jsonify({'success': True, 'message': '发帖成功', 'post_id': post_id})
@@ -0,0 +1,345 @@
+"""
+ASGI 入口
+长连接的对话接口（AI空气管家、智能导购）由异步处理函数直接在事件循环中响应：
+等待请求体、逐段写出 SSE 时只占用一个协程，不占用线程，单进程可以保持数万个空闲对话连接。
+其余路由交给 Flask 应用，在有界线程池中以 WSGI 方式执行（数据库访问都在线程池中）。
+
+启动（需安装 uvicorn）:
+    uvicorn asgi:app --workers 4
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+配置（环境变量）：
+    SENXI_SYNC_THREADS: 线程池大小，默认 32
+    SENXI_SYNC_BACKLOG: 等待线程池的请求数上限（超出后协程排队等待，不再提交），默认 线程数 × 8
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask.sessions import SecureCookieSession
+from itsdangerous import BadSignature
+from werkzeug.http import dump_cookie, parse_cookie
+
+from app import app as flask_app, air_butler, smart_guide
+from utils.analytics import event_log
+from utils.metrics import registry, track
+from utils.streaming import SSE_HEADERS, format_sse, reply_events, wants_event_stream
+from utils.warmup import warm_up
+
+SYNC_THREADS = int(os.environ.get('SENXI_SYNC_THREADS', 32))
+SYNC_BACKLOG = int(os.environ.get('SENXI_SYNC_BACKLOG', SYNC_THREADS * 8))
+MAX_JSON_BODY = 1024 * 1024  # 异步接口的请求体上限（字节）
+
+_END = object()
+
+
+class SyncPool:
+    """
+    有界线程池：同步代码（Flask 视图、数据库访问）在这里执行
+
+    线程数固定；提交前先获取信号量，积压过多时新请求在事件循环中等待，不会无限堆积到线程池队列
+    """
+    
+    def __init__(self, threads: int = SYNC_THREADS, backlog: int = SYNC_BACKLOG):
+        self.threads = threads
+        self.backlog = backlog
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pid = None
+    
+    async def run(self, fn: Callable, *args):
+        if self._pid != os.getpid():
+            # 按进程创建（gunicorn 在 fork 出的 worker 中启动事件循环）
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='asgi-sync')
+            self._slots = asyncio.Semaphore(self.backlog)
+            self._pid = os.getpid()
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._pid = None
+
+
+sync_pool = SyncPool()
+
+
+# ==================== 请求与会话 ====================
+
+class AsgiRequest:
+    """异步处理函数使用的请求对象"""
+    
+    def __init__(self, scope: Dict, body: bytes):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.cookies = parse_cookie(self.headers.get('cookie', ''))
+    
+    def json(self) -> Dict:
+        try:
+            data = flask_app.json.loads(self.body or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+
+class SessionCodec:
+    """读写 Flask 的签名 Cookie 会话，与 Flask 视图共用同一个会话"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.interface = app.session_interface
+    
+    def load(self, request: AsgiRequest) -> SecureCookieSession:
+        value = request.cookies.get(self.interface.get_cookie_name(self.app))
+        serializer = self.interface.get_signing_serializer(self.app)
+        if not value or serializer is None:
+            return SecureCookieSession()
+        try:
+            max_age = int(self.app.permanent_session_lifetime.total_seconds())
+            return SecureCookieSession(serializer.loads(value, max_age=max_age))
+        except BadSignature:
+            return SecureCookieSession()
+    
+    def set_cookie_header(self, session: SecureCookieSession) -> Tuple[bytes, bytes]:
+        app, interface = self.app, self.interface
+        value = interface.get_signing_serializer(app).dumps(dict(session))
+        cookie = dump_cookie(
+            interface.get_cookie_name(app), value,
+            expires=interface.get_expiration_time(app, session),
+            domain=interface.get_cookie_domain(app),
+            path=interface.get_cookie_path(app),
+            secure=interface.get_cookie_secure(app),
+            httponly=interface.get_cookie_httponly(app),
+            samesite=interface.get_cookie_samesite(app),
+            max_size=app.config['MAX_COOKIE_SIZE'],
+        )
+        return b'set-cookie', cookie.encode('latin-1')
+
+
+sessions = SessionCodec(flask_app)
+
+
+# ==================== 响应 ====================
+
+def json_response(data, status: int = 200, headers: List[Tuple[bytes, bytes]] = ()) -> Tuple:
+    body = (flask_app.json.dumps(data) + '\n').encode()
+    return status, [(b'content-type', b'application/json'), *headers], [body]
+
+
+async def send_response(send, status: int, headers: List[Tuple[bytes, bytes]], chunks):
+    """发送响应；chunks 可以是列表或异步迭代器（逐段发送）"""
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    if isinstance(chunks, list):
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+        return
+    async for chunk in chunks:
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+# ==================== 异步处理函数 ====================
+
+async def butler_chat(request: AsgiRequest):
+    """AI空气管家对话（与 Flask 版 /api/butler/chat 相同，支持 SSE）"""
+    data = request.json()
+    message = data.get('message', '')
+    started = time.perf_counter()
+    if not wants_event_stream(request.headers.get('accept')):
+        with track('air_butler'):
+            body = air_butler.chat_json(message, data.get('context', {}))
+        event_log.record('butler', time.perf_counter() - started, message=message)
+        return 200, [(b'content-type', b'application/json')], [body]
+    
+    with track('air_butler'):
+        response = air_butler.chat(message, data.get('context', {}))
+    event_log.record('butler', time.perf_counter() - started, message=message)
+    
+    async def frames():
+        for event, payload in reply_events(response):
+            yield format_sse(event, payload).encode()
+    headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+    headers += [(name.lower().encode(), value.encode()) for name, value in SSE_HEADERS.items()]
+    return 200, headers, frames()
+
+
+async def guide_start(request: AsgiRequest):
+    """开始智能导购对话"""
+    session = sessions.load(request)
+    started = time.perf_counter()
+    with track('smart_guide'):
+        guide_state = session['guide_state'] = smart_guide.init_session()
+        response = smart_guide.get_welcome_message()
+    event_log.record('guide', time.perf_counter() - started, session=guide_state['session_id'],
+                     intent=response['type'], step=0, next_step=response['next_step'])
+    return json_response(response, headers=[sessions.set_cookie_header(session), (b'vary', b'Cookie')])
+
+
+async def guide_chat(request: AsgiRequest):
+    """智能导购对话交互"""
+    data = request.json()
+    session = sessions.load(request)
+    guide_state = session.get('guide_state', smart_guide.init_session())
+    current_step = data.get('step', 0)
+    started = time.perf_counter()
+    with track('smart_guide'):
+        response = smart_guide.process_input(guide_state, data.get('message', ''), current_step)
+    event_log.record('guide', time.perf_counter() - started, session=guide_state.get('session_id'),
+                     intent=response['type'], step=current_step, next_step=response['next_step'])
+    session['guide_state'] = guide_state
+    return json_response(response, headers=[sessions.set_cookie_header(session), (b'vary', b'Cookie')])
+
+
+# 由异步处理函数响应的路由，其余路由交给 Flask
+ASYNC_ROUTES = {
+    ('POST', '/api/butler/chat'): butler_chat,
+    ('POST', '/api/guide/start'): guide_start,
+    ('POST', '/api/guide/chat'): guide_chat,
+}
+
+
+# ==================== WSGI 回退 ====================
+
+def _wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ: Dict):
+    """在线程池中调用 Flask，返回状态码、响应头和响应体迭代器"""
+    started = {}
+    
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                              for name, value in headers]
+    
+    iterable = flask_app(environ, start_response)
+    return started['status'], started['headers'], iterable
+
+
+async def wsgi_fallback(scope: Dict, body: bytes, send):
+    status, headers, iterable = await sync_pool.run(_call_wsgi, _wsgi_environ(scope, body))
+    try:
+        if isinstance(iterable, (list, tuple)):
+            await send_response(send, status, headers, list(iterable))
+            return
+        
+        # 流式响应体：每取一段都在线程池中执行（生成器中可能访问数据库）
+        iterator = iter(iterable)
+        
+        async def chunks():
+            while True:
+                chunk = await sync_pool.run(next, iterator, _END)
+                if chunk is _END:
+                    return
+                yield chunk
+        await send_response(send, status, headers, chunks())
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            await sync_pool.run(close)
+
+
+# ==================== ASGI 应用 ====================
+
+async def _read_body(receive, limit: Optional[int] = None) -> Optional[bytes]:
+    """读取完整请求体，超过 limit 时返回 None"""
+    parts, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionResetError('客户端已断开')
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit is not None and size > limit:
+            return None
+        parts.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(parts)
+
+
+class AsgiApp:
+    """ASGI 应用：对话接口走异步处理函数，其余走 Flask"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+        try:
+            if handler is None:
+                await wsgi_fallback(scope, await _read_body(receive), send)
+            else:
+                await self._handle(handler, scope, receive, send)
+        except ConnectionResetError:
+            pass
+    
+    async def _handle(self, handler, scope, receive, send):
+        started = time.perf_counter()
+        body = await _read_body(receive, MAX_JSON_BODY)
+        if body is None:
+            status, headers, chunks = json_response({'error': '请求体过大'}, 413)
+        else:
+            status, headers, chunks = await handler(AsgiRequest(scope, body))
+        await send_response(send, status, headers, chunks)
+        
+        # 与 Flask 请求钩子记录相同的指标
+        labels = {'route': scope['path'], 'method': scope['method']}
+        registry.observe('senxi_request_duration_seconds', time.perf_counter() - started, **labels)
+        registry.inc('senxi_requests_total', help_text='请求总数', status=status, **labels)
+    
+    @staticmethod
+    async def _lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # 单独运行 uvicorn 时在此预热（gunicorn 下已在 post_worker_init 中完成，不会重复执行）
+                await sync_pool.run(warm_up, flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                sync_pool.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = AsgiApp()
@@ -0,0 +1,127 @@
+"""
+AI空气管家单条消息 CPU 耗时
+用一组覆盖全部意图和子话题的消息反复调用 AirButler，按 time.process_time 统计每条消息的 CPU 时间：
+
+- cached：chat_json，规范化消息后命中回复缓存，直接取预先序列化的 JSON
+- compiled：不经回复缓存，识别意图、匹配子话题后查路由表
+- render：识别意图、匹配子话题后每次重新生成回复并序列化（路由表编译前每条消息的工作量）
+- retrieval：不经回复缓存，未命中意图关键词的长尾问题经 BM25 检索后查路由表
+
+各模式都记录对话历史。
+
+用法: python benchmarks/butler_cpu.py --messages 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import retrieval  # noqa: E402
+from utils.air_butler import AirButler, normalize_message  # noqa: E402
+from utils.preload import freeze_catalog  # noqa: E402
+from utils.product_manager import ProductManager  # noqa: E402
+from utils.research import get_research_articles  # noqa: E402
+
+# 覆盖各意图与子话题（含概览回复）的消息
+MESSAGES = [
+    '你好', '在吗，我想找人工客服',
+    '推荐一款入门的净化器', '森林呼吸Pro和清新之风Max有什么区别？', '有没有适合大客厅的产品推荐',
+    '哪款适合婴儿房使用？', '推荐哪款好',
+    '如何连接手机APP？', '睡眠模式怎么开启？', '自动模式是如何工作的？', '怎么用',
+    '净化器噪音变大怎么办？', '显示屏一直闪烁是什么原因？', '出风口风量变小了，是不是故障', '机器有问题',
+    '滤芯多久需要更换？', '滤网可以清洗吗',
+    '空气质量指数怎么看', 'PM2.5污染严重怎么办', '甲醛超标', '空气质量怎么样',
+    '订单什么时候发货', '退货流程',
+]
+
+# 不含意图关键词的长尾问题（检索命中文章、产品介绍或知识库条目，以及未命中时的通用回复）
+LONG_TAIL_MESSAGES = [
+    '花粉过敏怎么办', '新房装修后多久能入住', 'HEPA是什么原理', '有没有能杀菌的', '出风口没风',
+    '办公室用哪个', 'h13和h12差别', '负离子有用吗', '静音效果', '手机控制', '今天天气不错', '谢谢',
+]
+
+
+def _record(butler: AirButler, message: str, payload: Dict):
+    timestamp = datetime.now().isoformat()
+    butler.conversation_history.append({'role': 'user', 'content': message, 'timestamp': timestamp})
+    butler.conversation_history.append({'role': 'assistant', 'content': payload['message'], 'timestamp': timestamp})
+
+
+def _uncached(butler: AirButler) -> Callable[[str], bytes]:
+    def reply(message: str) -> bytes:
+        payload, body = butler._resolve(normalize_message(message))
+        _record(butler, message, payload)
+        return body
+    return reply
+
+
+def _render(butler: AirButler) -> Callable[[str], bytes]:
+    renderers = butler._renderers()
+    
+    def reply(message: str) -> bytes:
+        message_lower = message.lower()
+        intent = butler._identify_intent(message_lower) or 'general'
+        payload = renderers[intent](butler._match_subtopic(intent, message_lower))
+        _record(butler, message, payload)
+        return json.dumps(payload, ensure_ascii=False).encode()
+    return reply
+
+
+def measure(reply: Callable[[str], bytes], messages: List[str], butler: AirButler, total: int) -> Dict:
+    """按消息列表循环调用 total 次，返回每条消息的 CPU 时间（微秒）"""
+    rounds = max(1, total // len(messages))
+    started = time.process_time()
+    for _ in range(rounds):
+        for message in messages:
+            reply(message)
+        # 对话历史只增不减，每轮清空避免影响测量
+        butler.conversation_history.clear()
+    cpu = time.process_time() - started
+    count = rounds * len(messages)
+    return {'messages': count, 'cpu_s': round(cpu, 3), 'cpu_us_per_message': round(cpu / count * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI空气管家单条消息 CPU 耗时')
+    parser.add_argument('--messages', type=int, default=200000, help='每种模式调用的消息数')
+    parser.add_argument('--modes', default='cached,compiled,render,retrieval',
+                        help='逗号分隔：cached,compiled,render,retrieval')
+    parser.add_argument('--output', help='结果输出到 JSON 文件')
+    args = parser.parse_args()
+    
+    butler = AirButler()
+    butler.load_documents(get_research_articles(), ProductManager().get_all_products())
+    # 与 gunicorn 预加载相同，在只读化后的知识库上测量
+    freeze_catalog(butler)
+    modes = {
+        'cached': (butler.chat_json, MESSAGES),
+        'compiled': (_uncached(butler), MESSAGES),
+        'render': (_render(butler), MESSAGES),
+        'retrieval': (_uncached(butler), LONG_TAIL_MESSAGES),
+    }
+    
+    report: Dict[str, Dict] = {}
+    for mode in args.modes.split(','):
+        reply, messages = modes[mode]
+        for message in messages:
+            reply(message)
+        report[mode] = measure(reply, messages, butler, args.messages)
+    
+    print(f"numpy: {'是' if retrieval.np is not None else '否'}")
+    print(f"{'模式':<10}{'消息数':>10}{'CPU(s)':>9}{'每条(µs)':>10}")
+    for mode, r in report.items():
+        print(f"{mode:<10}{r['messages']:>10}{r['cpu_s']:>9}{r['cpu_us_per_message']:>10}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'routes': len(butler._routes), 'numpy': retrieval.np is not None, 'modes': report},
+                      f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
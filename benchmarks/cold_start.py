@@ -0,0 +1,102 @@
+"""
+新进程首批请求延迟
+每种模式启动一个新的 Python 进程导入应用，用 test client 依次请求预热页面：
+先记录每个页面的第一次请求（刚部署或扩容的 worker 收到的请求），再循环若干轮得到稳定状态的延迟。
+
+- cold：不使用字节码缓存，不预热（首次访问时解析并编译模板）
+- bytecode：从字节码缓存加载模板，不预热
+- warmup：启动时执行 utils.warmup.warm_up()（编译全部模板并请求一遍主要页面）
+
+用法: python benchmarks/cold_start.py --rounds 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('cold', 'bytecode', 'warmup')
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def child(mode: str, cache_dir: str, rounds: int):
+    """在新进程中执行：导入应用、按模式准备、测量后把结果以 JSON 输出到 stdout"""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    from jinja2 import FileSystemBytecodeCache
+    from app import app
+    from utils.warmup import warm_up
+    
+    app.jinja_env.bytecode_cache = None if mode == 'cold' else FileSystemBytecodeCache(cache_dir)
+    if mode == 'warmup':
+        warm_up(app)
+    boot_ms = (time.perf_counter() - started) * 1000
+    
+    client = app.test_client()
+    paths = app.config['WARMUP_PATHS']
+    
+    def timed(path: str) -> float:
+        request_started = time.perf_counter()
+        client.get(path)
+        return (time.perf_counter() - request_started) * 1000
+    
+    first = [timed(path) for path in paths]
+    steady = [timed(path) for _ in range(rounds) for path in paths]
+    print(json.dumps({'boot_ms': boot_ms, 'first': first, 'steady': steady}))
+
+
+def run(mode: str, cache_dir: str, rounds: int) -> Dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, '--cache-dir', cache_dir,
+         '--rounds', str(rounds)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return {
+        'boot_ms': round(result['boot_ms'], 1),
+        'first_max_ms': round(max(result['first']), 2),
+        'first_p50_ms': round(_percentile(result['first'], 0.5), 2),
+        'steady_p99_ms': round(_percentile(result['steady'], 0.99), 2),
+        'steady_p50_ms': round(_percentile(result['steady'], 0.5), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='新进程首批请求延迟')
+    parser.add_argument('--rounds', type=int, default=50, help='稳定状态测量的轮数（每轮请求全部页面）')
+    parser.add_argument('--modes', default=','.join(MODES), help='逗号分隔：cold,bytecode,warmup')
+    parser.add_argument('--cache-dir', help='字节码缓存目录，默认使用临时目录')
+    parser.add_argument('--output', help='结果输出到 JSON 文件')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        child(args.child, args.cache_dir, args.rounds)
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = args.cache_dir or tmp
+        # 先启动一次填充字节码缓存（与部署后第二个及以后启动的 worker 相同）
+        run('warmup', cache_dir, 1)
+        report = {mode: run(mode, cache_dir, args.rounds) for mode in args.modes.split(',')}
+    
+    print(f"{'模式':<10}{'启动(ms)':>10}{'首次最大':>10}{'首次p50':>10}{'稳定p50':>10}{'稳定p99':>10}")
+    for mode, r in report.items():
+        print(f"{mode:<10}{r['boot_ms']:>10}{r['first_max_ms']:>10}{r['first_p50_ms']:>10}"
+              f"{r['steady_p50_ms']:>10}{r['steady_p99_ms']:>10}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+秒杀压测
+N 个线程同时抢购同一个库存有限的商品（需求远大于库存），对比两种扣减方式：
+
+- row：每次抢购执行一次带条件的 UPDATE products SET stock = stock - 1（ProductDB.reduce_stock），
+  所有请求争抢同一行
+- reserve：utils.inventory 预占，按批领取库存后在内存计数器上分配，预占记录经写协调器合并提交
+
+两种方式抢到的数量都必须等于库存（不超卖、不少卖）；reserve 模式另外核对
+products.stock + 租约库存 = 初始库存、stock_reservations 中的预占数 = 成功数。
+
+用法: python benchmarks/flash_sale.py --threads 200 --stock 5000 --attempts 50
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import seed as seeder  # noqa: E402
+from load_test import summarize  # noqa: E402
+
+# 各模式抢购的商品（互不影响）
+MODE_PRODUCTS = {
+    'row': 'bench_000001',
+    'reserve': 'bench_000002',
+}
+
+
+def _set_stock(app, product_code: str, stock: int):
+    from sqlalchemy import text
+    from models import db
+    with app.app_context():
+        db.session.execute(text('UPDATE products SET stock = :stock WHERE product_id = :code'),
+                           {'stock': stock, 'code': product_code})
+        db.session.commit()
+
+
+def _buyer(app, mode: str, product_code: str) -> Callable[[int], bool]:
+    from utils.database import ProductDB
+    from utils.inventory import inventory
+    
+    def buy(user_id: int) -> bool:
+        with app.app_context():
+            if mode == 'row':
+                return ProductDB.reduce_stock(product_code, 1)
+            return inventory.reserve(product_code, 1, user_id=user_id) is not None
+    return buy
+
+
+def run_mode(buy: Callable[[int], bool], threads: int, attempts: int) -> Dict:
+    """threads 个线程同时开始，每个线程抢购 attempts 次"""
+    barrier = threading.Barrier(threads + 1)
+    latencies: List[float] = []
+    counts = {'success': 0, 'sold_out': 0, 'errors': 0}
+    lock = threading.Lock()
+    
+    def worker(index: int):
+        local, success, sold_out, errors = [], 0, 0, 0
+        barrier.wait()
+        for _ in range(attempts):
+            started = time.perf_counter()
+            try:
+                if buy(index + 1):
+                    success += 1
+                else:
+                    sold_out += 1
+                local.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+        with lock:
+            latencies.extend(local)
+            counts['success'] += success
+            counts['sold_out'] += sold_out
+            counts['errors'] += errors
+    
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - started
+    
+    result = summarize(latencies, counts['errors'], wall)
+    result.update(counts)
+    result['wall_s'] = round(wall, 2)
+    return result
+
+
+def verify(app, mode: str, product_code: str, stock: int, result: Dict) -> Dict:
+    """核对库存守恒，返回核对结果"""
+    from sqlalchemy import text
+    from models import db
+    with app.app_context():
+        row = db.session.execute(text('SELECT id, stock FROM products WHERE product_id = :code'),
+                                 {'code': product_code}).one()
+        leased = db.session.execute(text(
+            'SELECT COALESCE(SUM(quantity), 0) FROM inventory_leases WHERE product_id = :pk'
+        ), {'pk': row.id}).scalar()
+        held = db.session.execute(text(
+            "SELECT COALESCE(SUM(quantity), 0) FROM stock_reservations WHERE product_id = :pk AND status = 'held'"
+        ), {'pk': row.id}).scalar()
+    
+    checks = {'no_oversell': result['success'] <= stock, 'sold_out': result['success'] == stock}
+    if mode == 'row':
+        checks['stock_left'] = row.stock == stock - result['success']
+    else:
+        checks['stock_conserved'] = row.stock + leased == stock
+        checks['reservations_logged'] = held == result['success']
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='秒杀压测')
+    parser.add_argument('--db', default=os.path.join(seeder.ROOT, 'benchmarks', 'flash.db'))
+    parser.add_argument('--threads', type=int, default=200, help='并发抢购线程数')
+    parser.add_argument('--attempts', type=int, default=50, help='每个线程的抢购次数')
+    parser.add_argument('--stock', type=int, default=5000, help='商品库存')
+    parser.add_argument('--modes', default='row,reserve', help='逗号分隔：row,reserve')
+    parser.add_argument('--output', help='结果输出到 JSON 文件')
+    args = parser.parse_args()
+    
+    seeder.use_database(args.db)
+    # 只需要少量数据
+    seeder.seed({'users': args.threads, 'products': len(MODE_PRODUCTS), 'posts': 1,
+                 'comments': 0, 'likes': 0, 'orders': 0})
+    
+    from app import app
+    report = {'threads': args.threads, 'attempts_per_thread': args.attempts, 'stock': args.stock,
+              'modes': {}}
+    for mode in args.modes.split(','):
+        product_code = MODE_PRODUCTS[mode]
+        _set_stock(app, product_code, args.stock)
+        result = run_mode(_buyer(app, mode, product_code), args.threads, args.attempts)
+        result['checks'] = verify(app, mode, product_code, args.stock, result)
+        report['modes'][mode] = result
+    
+    print(f"{'模式':<9}{'成功':>7}{'售罄':>8}{'错误':>6}{'抢购/s':>9}{'p50(ms)':>9}{'p99(ms)':>9}  核对")
+    for mode, r in report['modes'].items():
+        checks = ', '.join(f"{name}={'OK' if ok else 'FAIL'}" for name, ok in r['checks'].items())
+        print(f"{mode:<9}{r['success']:>7}{r['sold_out']:>8}{r['errors']:>6}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p99_ms']:>9}  {checks}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if not all(ok for r in report['modes'].values() for ok in r['checks'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+热点接口压测
+先生成可复现的数据集，再分别用 Flask test client（进程内、单线程）和本地多线程 HTTP 客户端
+压测首页、产品页、帖子详情、导购/管家对话、点赞和下单，输出 p50/p95/p99 延迟与吞吐量（JSON）
+
+用法:
+    python benchmarks/load_test.py --requests 500 --threads 8 --output result.json
+    python benchmarks/load_test.py --no-seed --baseline result.json   # 与上次结果对比
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.cookiejar import CookieJar
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import seed as seeder  # noqa: E402
+
+GUIDE_MESSAGES = ('50-80㎡', '北方城市', '甲醛', '有孩子', '卧室', '3000-5000元')
+BUTLER_MESSAGES = ('推荐一款净化器', '甲醛怎么去除', '滤网多久换一次', '雾霾天怎么办', '你好')
+
+
+class Scenario:
+    """
+    压测场景
+
+    kind 为 'http' 时按 method/path/body 发请求；为 'call' 时在应用上下文中直接调用 func
+    （下单目前没有 HTTP 接口，直接走 OrderDB.create）
+    """
+    
+    def __init__(self, name: str, kind: str = 'http', method: str = 'GET',
+                 path: Optional[Callable] = None, body: Optional[Callable] = None,
+                 login: bool = False, func: Optional[Callable] = None):
+        self.name = name
+        self.kind = kind
+        self.method = method
+        self.path = path
+        self.body = body
+        self.login = login
+        self.func = func
+
+
+def build_scenarios(scale: Dict[str, int]) -> List[Scenario]:
+    posts, products = max(scale['posts'], 1), max(scale['products'], 1)
+    
+    def place_order(rng: random.Random, user_id: int) -> bool:
+        from utils.database import OrderDB
+        items = [{'product_id': f'bench_{rng.randint(1, products):06d}', 'quantity': 1}]
+        shipping = {'name': '压测', 'phone': '13900000000', 'address': '北京市朝阳区'}
+        return OrderDB.create(user_id, items, shipping) is not None
+    
+    return [
+        Scenario('index', path=lambda rng: '/'),
+        Scenario('products', path=lambda rng: '/products'),
+        Scenario('post_detail', path=lambda rng: f'/post/post_bench_{rng.randint(1, posts)}'),
+        Scenario('guide_chat', method='POST', path=lambda rng: '/api/guide/chat',
+                 body=lambda rng: {'message': rng.choice(GUIDE_MESSAGES), 'step': rng.randint(0, 5)}),
+        Scenario('butler_chat', method='POST', path=lambda rng: '/api/butler/chat',
+                 body=lambda rng: {'message': rng.choice(BUTLER_MESSAGES)}),
+        Scenario('post_like', method='POST', login=True,
+                 path=lambda rng: f'/api/post/post_bench_{rng.randint(1, posts)}/like'),
+        Scenario('place_order', kind='call', func=place_order),
+    ]
+
+
+def summarize(latencies: List[float], errors: int, wall: float) -> Dict:
+    """汇总延迟分布（毫秒）与吞吐量"""
+    ordered = sorted(latencies)
+    
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        # 最近秩法
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return round(ordered[index] * 1000, 3)
+    
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+    }
+
+
+# ==================== 进程内 test client ====================
+
+def run_test_client(app, scenarios: List[Scenario], requests: int, seed_value: int) -> Dict:
+    """单线程进程内压测，排除网络与 WSGI 服务器开销"""
+    rng = random.Random(seed_value)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 1, 'nickname': '用户1'}
+        sess['user_id'] = 1
+    
+    results = {}
+    for scenario in scenarios:
+        latencies, errors = [], 0
+        wall_started = time.perf_counter()
+        for _ in range(requests):
+            started = time.perf_counter()
+            if scenario.kind == 'call':
+                with app.test_request_context():
+                    ok = scenario.func(rng, rng.randint(1, 100))
+            else:
+                body = scenario.body(rng) if scenario.body else None
+                response = client.open(scenario.path(rng), method=scenario.method, json=body)
+                ok = response.status_code < 400
+            latencies.append(time.perf_counter() - started)
+            errors += 0 if ok else 1
+        results[scenario.name] = summarize(latencies, errors, time.perf_counter() - wall_started)
+    return results
+
+
+# ==================== 多线程 HTTP ====================
+
+def _login(opener, base_url: str, user_id: int):
+    """走验证码接口登录基准用户"""
+    phone = seeder.bench_phone(user_id)
+    code = _post_json(opener, f'{base_url}/api/auth/send-code', {'phone': phone})['debug_code']
+    _post_json(opener, f'{base_url}/api/auth/login', {'phone': phone, 'code': code})
+
+
+def _post_json(opener, url: str, body: Dict) -> Dict:
+    request = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with opener.open(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def _http_worker(app, base_url: str, scenario: Scenario, count: int, worker_id: int,
+                 seed_value: int, out: List[Tuple[List[float], int]]):
+    rng = random.Random(seed_value + worker_id)
+    user_id = worker_id + 1
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    if scenario.login:
+        _login(opener, base_url, user_id)
+    
+    latencies, errors = [], 0
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            if scenario.kind == 'call':
+                with app.app_context():
+                    ok = scenario.func(rng, user_id)
+            else:
+                body = scenario.body(rng) if scenario.body else None
+                data = json.dumps(body).encode() if body is not None else None
+                request = urllib.request.Request(
+                    base_url + scenario.path(rng), data=data, method=scenario.method,
+                    headers={'Content-Type': 'application/json'} if data else {}
+                )
+                with opener.open(request, timeout=30) as response:
+                    response.read()
+                ok = True
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += 0 if ok else 1
+    out.append((latencies, errors))
+
+
+def run_http(app, scenarios: List[Scenario], requests: int, threads: int,
+             seed_value: int, base_url: Optional[str] = None) -> Dict:
+    """多线程 HTTP 压测；未指定 base_url 时在本地线程中启动 werkzeug 多线程服务器"""
+    server = None
+    if base_url is None:
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+    
+    results = {}
+    try:
+        for scenario in scenarios:
+            out: List[Tuple[List[float], int]] = []
+            per_thread = max(requests // threads, 1)
+            workers = [
+                threading.Thread(target=_http_worker,
+                                 args=(app, base_url, scenario, per_thread, i, seed_value, out))
+                for i in range(threads)
+            ]
+            wall_started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            wall = time.perf_counter() - wall_started
+            latencies = [value for chunk, _ in out for value in chunk]
+            results[scenario.name] = summarize(latencies, sum(e for _, e in out), wall)
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+
+# ==================== 报告 ====================
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=seeder.ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    """打印结果表；提供基线时附带 p95 与吞吐量变化"""
+    for driver, results in report['drivers'].items():
+        print(f'\n== {driver} ==')
+        print(f"{'场景':<14}{'请求':>7}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}"
+              f"{'p99(ms)':>10}{'rps':>9}")
+        for name, r in results.items():
+            line = (f"{name:<14}{r['requests']:>7}{r['errors']:>6}{r['p50_ms']:>10}"
+                    f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['throughput_rps']:>9}")
+            base = (baseline or {}).get('drivers', {}).get(driver, {}).get(name)
+            if base and base['p95_ms'] and base['throughput_rps']:
+                p95_delta = (r['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100
+                rps_delta = (r['throughput_rps'] - base['throughput_rps']) / base['throughput_rps'] * 100
+                line += f'   p95 {p95_delta:+.1f}%  rps {rps_delta:+.1f}%'
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点接口压测')
+    parser.add_argument('--db', default=os.path.join(seeder.ROOT, 'benchmarks', 'bench.db'))
+    parser.add_argument('--no-seed', action='store_true', help='复用已有数据集')
+    parser.add_argument('--driver', choices=('test-client', 'http', 'all'), default='all')
+    parser.add_argument('--requests', type=int, default=300, help='每个场景的请求数')
+    parser.add_argument('--threads', type=int, default=8, help='HTTP 并发线程数')
+    parser.add_argument('--url', help='压测已启动的服务（如 gunicorn），默认启动本地服务器')
+    parser.add_argument('--scenarios', help='逗号分隔的场景名，默认全部')
+    parser.add_argument('--output', help='结果输出到 JSON 文件')
+    parser.add_argument('--baseline', help='对比的历史结果 JSON')
+    seeder.add_scale_arguments(parser)
+    args = parser.parse_args()
+    
+    seeder.use_database(args.db)
+    scale = seeder.scale_from_args(args)
+    if not args.no_seed:
+        seeder.seed(scale, args.seed)
+    
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    scenarios = build_scenarios(scale)
+    if args.scenarios:
+        wanted = set(args.scenarios.split(','))
+        scenarios = [s for s in scenarios if s.name in wanted]
+    
+    report = {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'scale': scale,
+        'requests_per_scenario': args.requests,
+        'threads': args.threads,
+        'drivers': {},
+    }
+    if args.driver in ('test-client', 'all'):
+        report['drivers']['test_client'] = run_test_client(app, scenarios, args.requests, args.seed)
+    if args.driver in ('http', 'all'):
+        report['drivers']['http'] = run_http(app, scenarios, args.requests, args.threads,
+                                             args.seed, args.url)
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
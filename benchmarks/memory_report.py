@@ -0,0 +1,137 @@
+"""
+gunicorn worker 内存报告
+分别以关闭/开启预加载的方式启动 gunicorn，预热主要路由后统计每个 worker 的 RSS/PSS/USS
+
+用法: python benchmarks/memory_report.py --workers 8
+依赖 Linux /proc/<pid>/smaps_rollup
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WARMUP_PATHS = ['/', '/products', '/compare', '/community', '/api/products', '/product/pro-01']
+
+
+def read_smaps(pid: int) -> Dict[str, int]:
+    """读取进程内存统计（单位 KB）"""
+    stats = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                stats[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss_kb': stats.get('Rss', 0),
+        'pss_kb': stats.get('Pss', 0),
+        'uss_kb': stats.get('Private_Clean', 0) + stats.get('Private_Dirty', 0),
+        'shared_kb': stats.get('Shared_Clean', 0) + stats.get('Shared_Dirty', 0),
+    }
+
+
+def child_pids(parent: int) -> List[int]:
+    """列出 gunicorn master 的 worker 进程"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def wait_ready(port: int, timeout: float = 30.0):
+    """等待服务可用"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn 启动超时')
+
+
+def measure(preload: bool, workers: int, port: int, warmup: int) -> Dict:
+    """启动一轮 gunicorn 并统计各 worker 内存"""
+    env = dict(os.environ, SENXI_PRELOAD='1' if preload else '0',
+               WEB_CONCURRENCY=str(workers), GUNICORN_BIND=f'127.0.0.1:{port}')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port)
+        # 轮询请求，使每个 worker 都触达目录数据
+        for i in range(warmup):
+            path = WARMUP_PATHS[i % len(WARMUP_PATHS)]
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5).read()
+            except OSError:
+                pass
+        time.sleep(1)
+        
+        per_worker = [dict(pid=pid, **read_smaps(pid)) for pid in child_pids(proc.pid)]
+        totals = {key: sum(w[key] for w in per_worker)
+                  for key in ('rss_kb', 'pss_kb', 'uss_kb', 'shared_kb')}
+        return {
+            'preload': preload,
+            'workers': per_worker,
+            'master': read_smaps(proc.pid),
+            'totals': totals,
+            'avg_pss_kb': totals['pss_kb'] // max(len(per_worker), 1),
+            'avg_uss_kb': totals['uss_kb'] // max(len(per_worker), 1),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def print_table(result: Dict):
+    """打印单轮结果"""
+    title = '预加载 + gc.freeze' if result['preload'] else '无预加载（每个 worker 各自导入）'
+    print(f'\n== {title} ==')
+    print(f"{'pid':>8} {'RSS(KB)':>10} {'PSS(KB)':>10} {'USS(KB)':>10} {'共享(KB)':>10}")
+    for w in result['workers']:
+        print(f"{w['pid']:>8} {w['rss_kb']:>10} {w['pss_kb']:>10} {w['uss_kb']:>10} {w['shared_kb']:>10}")
+    t = result['totals']
+    print(f"{'合计':>8} {t['rss_kb']:>10} {t['pss_kb']:>10} {t['uss_kb']:>10} {t['shared_kb']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gunicorn worker 内存报告')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--warmup', type=int, default=400, help='预热请求数')
+    parser.add_argument('--json', help='结果输出到 JSON 文件')
+    args = parser.parse_args()
+    
+    before = measure(False, args.workers, args.port, args.warmup)
+    after = measure(True, args.workers, args.port, args.warmup)
+    print_table(before)
+    print_table(after)
+    
+    saved = before['totals']['pss_kb'] - after['totals']['pss_kb']
+    print(f"\n每 worker 平均 PSS: {before['avg_pss_kb']} KB -> {after['avg_pss_kb']} KB")
+    print(f"每 worker 平均 USS: {before['avg_uss_kb']} KB -> {after['avg_uss_kb']} KB")
+    print(f"{args.workers} 个 worker 合计节省 PSS: {saved} KB")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'before': before, 'after': after}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+基准测试数据集生成
+按指定规模批量写入用户、产品、帖子、评论、点赞和订单，随机种子固定，结果可复现
+
+用法: python benchmarks/seed.py --db benchmarks/bench.db --users 10000 --posts 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认规模
+DEFAULT_SCALE = {
+    'users': 2000,
+    'products': 200,
+    'posts': 5000,
+    'comments': 20000,
+    'likes': 20000,
+    'orders': 5000,
+}
+
+CHUNK_SIZE = 5000
+
+POST_CATEGORIES = ('experience', 'formaldehyde', 'allergy', 'general')
+PRODUCT_CATEGORIES = ('home', 'office', 'car', 'accessory')
+BASE_TIME = datetime(2024, 1, 1)
+
+
+def use_database(path: str):
+    """让应用连接指定的数据库文件（须在导入 app 之前调用）"""
+    os.environ['SENXI_DATABASE_URI'] = f'sqlite:///{os.path.abspath(path)}'
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+def bench_phone(user_id: int) -> str:
+    """基准用户手机号"""
+    return f'139{user_id:08d}'
+
+
+def _chunks(rows: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _users(n: int, rng: random.Random) -> Iterator[Dict]:
+    for i in range(1, n + 1):
+        yield {
+            'id': i, 'phone': bench_phone(i), 'username': f'用户{i}',
+            'avatar': f'https://i.pravatar.cc/100?img={i % 70}',
+            'level': f'L{rng.randint(1, 3)}', 'points': rng.randint(0, 5000),
+            'created_at': BASE_TIME, 'updated_at': BASE_TIME,
+        }
+
+
+def _products(n: int, rng: random.Random) -> Iterator[Dict]:
+    for i in range(1, n + 1):
+        price = rng.randint(199, 15999)
+        yield {
+            'id': i, 'product_id': f'bench_{i:06d}', 'name': f'基准净化器 {i}',
+            'category': rng.choice(PRODUCT_CATEGORIES),
+            'price': price, 'original_price': price * 1.2,
+            'stock': 10 ** 9, 'sales': rng.randint(0, 5000),
+            'description': '基准测试产品',
+            'main_image': '/static/images/products/raysun_ydh201.png',
+            'images': '[]', 'specs': json.dumps({'cadr': '500m³/h'}),
+            'features': '[]', 'tags': '[]', 'status': 'active',
+            'rating': 4.5, 'review_count': rng.randint(0, 500),
+            'created_at': BASE_TIME, 'updated_at': BASE_TIME,
+        }
+
+
+def _posts(n: int, users: int, rng: random.Random) -> Iterator[Dict]:
+    for i in range(1, n + 1):
+        created = BASE_TIME + timedelta(minutes=i)
+        yield {
+            'id': i, 'post_id': f'post_bench_{i}', 'user_id': rng.randint(1, users),
+            'title': f'基准帖子 {i}', 'content': '空气净化使用心得。' * 20,
+            'category': rng.choice(POST_CATEGORIES), 'images': '[]',
+            'likes': 0, 'views': rng.randint(0, 10000), 'comment_count': 0,
+            'created_at': created, 'updated_at': created,
+        }
+
+
+def _comments(n: int, users: int, posts: int, rng: random.Random) -> Iterator[Dict]:
+    for i in range(1, n + 1):
+        yield {
+            'id': i, 'post_id': rng.randint(1, posts), 'user_id': rng.randint(1, users),
+            'content': f'评论 {i}', 'likes': 0,
+            'created_at': BASE_TIME + timedelta(minutes=i),
+        }
+
+
+def _likes(n: int, users: int, posts: int, rng: random.Random) -> Iterator[Dict]:
+    n = min(n, users * posts)
+    seen = set()
+    while len(seen) < n:
+        pair = (rng.randint(1, users), rng.randint(1, posts))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        yield {'user_id': pair[0], 'post_id': pair[1], 'created_at': BASE_TIME}
+
+
+def _orders(n: int, users: int, rng: random.Random) -> Iterator[Dict]:
+    for i in range(1, n + 1):
+        created = BASE_TIME + timedelta(minutes=i)
+        yield {
+            'id': i, 'order_id': f'ORDBENCH{i:010d}', 'user_id': rng.randint(1, users),
+            'total_amount': 0, 'status': rng.choice(('pending', 'paid', 'completed')),
+            'receiver_name': '基准用户', 'receiver_phone': '13900000000',
+            'receiver_address': '北京市朝阳区', 'created_at': created, 'updated_at': created,
+        }
+
+
+def _order_items(n: int, products: int, rng: random.Random) -> Iterator[Dict]:
+    for order_id in range(1, n + 1):
+        for _ in range(rng.randint(1, 3)):
+            yield {
+                'order_id': order_id, 'product_id': rng.randint(1, products),
+                'product_name': '基准净化器', 'price': 999, 'quantity': rng.randint(1, 2),
+            }
+
+
+def seed(scale: Dict[str, int], seed_value: int = 42) -> Dict[str, float]:
+    """
+    重建表结构并按规模写入数据
+
+    Returns:
+        各表写入耗时（秒）
+    """
+    from sqlalchemy import insert, text
+    from app import app
+    from models import db, User, Product, Post, Comment, PostLike, Order, OrderItem
+    from utils.ranking import HOT_SCORE_SQL
+    from utils.write_queue import write_queue
+    
+    rng = random.Random(seed_value)
+    users, posts = max(scale['users'], 1), max(scale['posts'], 1)
+    products = max(scale['products'], 1)
+    plan = [
+        (User, _users(users, rng)),
+        (Product, _products(products, rng)),
+        (Post, _posts(posts, users, rng)),
+        (Comment, _comments(scale['comments'], users, posts, rng)),
+        (PostLike, _likes(scale['likes'], users, posts, rng)),
+        (Order, _orders(scale['orders'], users, rng)),
+        (OrderItem, _order_items(scale['orders'], products, rng)),
+    ]
+    
+    timings = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        write_queue.clear()
+        for model, rows in plan:
+            started = time.perf_counter()
+            for chunk in _chunks(rows, CHUNK_SIZE):
+                db.session.execute(insert(model.__table__), chunk)
+                db.session.commit()
+            timings[model.__tablename__] = time.perf_counter() - started
+        
+        # 回填冗余计数
+        db.session.execute(text(
+            'UPDATE posts SET '
+            'likes = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id), '
+            'comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)'
+        ))
+        db.session.execute(text(f'UPDATE posts SET hot_score = {HOT_SCORE_SQL}'))
+        db.session.execute(text(
+            'UPDATE orders SET total_amount = (SELECT COALESCE(SUM(price * quantity), 0) '
+            'FROM order_items WHERE order_items.order_id = orders.id)'
+        ))
+        db.session.commit()
+    return timings
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser):
+    """注册数据规模参数"""
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+
+
+def scale_from_args(args) -> Dict[str, int]:
+    return {name: getattr(args, name) for name in DEFAULT_SCALE}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成基准测试数据集')
+    parser.add_argument('--db', default=os.path.join(ROOT, 'benchmarks', 'bench.db'))
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    
+    use_database(args.db)
+    scale = scale_from_args(args)
+    timings = seed(scale, args.seed)
+    for table, elapsed in timings.items():
+        print(f'{table:<12} {elapsed:8.2f}s')
+    print(f'数据集已写入 {args.db}: {scale}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+并发写入压测
+N 个线程同时发表评论，对比两种写入方式：
+
+- direct：改造前的方式，每个线程各自连接、各自开事务写评论 + 更新评论数 + 重算热度分，回滚日志模式，默认 5 秒锁等待
+- coordinator：WAL + busy_timeout，写操作经 utils.write_coordinator 的单写线程合并提交（CommentDB.create），
+  评论数和热度分经发件箱交给写队列合并更新
+
+同时运行若干读线程查询社区热榜，观察写入压力下的读延迟。
+
+用法: python benchmarks/stress_writes.py --writers 500 --writes 10 --readers 8
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import seed as seeder  # noqa: E402
+from load_test import summarize  # noqa: E402
+
+# 直连方式执行的语句（改造前 CommentDB.create 的写法）
+DIRECT_STATEMENTS = (
+    "INSERT INTO comments (post_id, user_id, content, likes, created_at) VALUES (?, ?, ?, 0, datetime('now'))",
+    'UPDATE posts SET comment_count = comment_count + 1 WHERE id = ?',
+)
+
+
+def _is_lock_error(error: Exception) -> bool:
+    return isinstance(error, sqlite3.OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error)
+    )
+
+
+def _set_journal_mode(app, path: str, mode: str):
+    """切换日志模式（需先关闭连接池中的连接）"""
+    from models import db
+    with app.app_context():
+        db.engine.dispose()
+    conn = sqlite3.connect(path)
+    actual = conn.execute(f'PRAGMA journal_mode = {mode}').fetchone()[0]
+    conn.close()
+    if actual.lower() != mode.lower():
+        raise RuntimeError(f'无法切换到 {mode} 模式（当前 {actual}）')
+
+
+def _direct_writer(path: str) -> Callable:
+    """改造前：每个线程独立连接，默认锁等待"""
+    from utils.ranking import HOT_SCORE_SQL, _register_sql_functions
+    local = threading.local()
+    
+    def write(post_id: int, user_id: int, content: str):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = sqlite3.connect(path)
+            _register_sql_functions(conn, None)
+        try:
+            conn.execute(DIRECT_STATEMENTS[0], (post_id, user_id, content))
+            conn.execute(DIRECT_STATEMENTS[1], (post_id,))
+            conn.execute(f'UPDATE posts SET hot_score = {HOT_SCORE_SQL} WHERE id = ?', (post_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return write
+
+
+def _coordinator_writer(app) -> Callable:
+    from utils.database import CommentDB
+    
+    def write(post_id: int, user_id: int, content: str):
+        with app.app_context():
+            CommentDB.create(post_id, user_id, content)
+    return write
+
+
+def run_mode(app, write: Callable, scale: Dict[str, int], writers: int, writes: int,
+             readers: int, seed_value: int) -> Dict:
+    """启动 writers 个写线程（同时开始）和 readers 个读线程，返回写/读统计"""
+    from utils.database import PostDB
+    
+    barrier = threading.Barrier(writers + readers + 1)
+    write_latencies: List[float] = []
+    read_latencies: List[float] = []
+    errors = {'lock': 0, 'other': 0}
+    lock = threading.Lock()
+    writing = threading.Event()
+    writing.set()
+    
+    def writer(index: int):
+        rng = random.Random(seed_value + index)
+        latencies, lock_errors, other_errors = [], 0, 0
+        barrier.wait()
+        for i in range(writes):
+            started = time.perf_counter()
+            try:
+                write(rng.randint(1, scale['posts']), rng.randint(1, scale['users']), f'压测评论 {index}-{i}')
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                if _is_lock_error(e):
+                    lock_errors += 1
+                else:
+                    other_errors += 1
+        with lock:
+            write_latencies.extend(latencies)
+            errors['lock'] += lock_errors
+            errors['other'] += other_errors
+    
+    def reader():
+        latencies = []
+        barrier.wait()
+        with app.app_context():
+            while writing.is_set():
+                started = time.perf_counter()
+                try:
+                    PostDB.get_hot(limit=20)
+                    latencies.append(time.perf_counter() - started)
+                except sqlite3.OperationalError:
+                    pass
+        with lock:
+            read_latencies.extend(latencies)
+    
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads + reader_threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    writing.clear()
+    for thread in reader_threads:
+        thread.join()
+    
+    result = summarize(write_latencies, errors['lock'] + errors['other'], wall)
+    result['lock_errors'] = errors['lock']
+    result['wall_s'] = round(wall, 2)
+    result['reads'] = summarize(read_latencies, 0, wall)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发写入压测')
+    parser.add_argument('--db', default=os.path.join(seeder.ROOT, 'benchmarks', 'stress.db'))
+    parser.add_argument('--no-seed', action='store_true', help='复用已有数据集')
+    parser.add_argument('--writers', type=int, default=500, help='并发写线程数')
+    parser.add_argument('--writes', type=int, default=10, help='每个写线程的写入次数')
+    parser.add_argument('--readers', type=int, default=8, help='并发读线程数')
+    parser.add_argument('--modes', default='direct,coordinator', help='逗号分隔：direct,coordinator')
+    parser.add_argument('--output', help='结果输出到 JSON 文件')
+    seeder.add_scale_arguments(parser)
+    args = parser.parse_args()
+    
+    seeder.use_database(args.db)
+    scale = seeder.scale_from_args(args)
+    if not args.no_seed:
+        seeder.seed(scale, args.seed)
+    
+    from app import app
+    path = os.path.abspath(args.db)
+    report = {'writers': args.writers, 'writes_per_writer': args.writes, 'readers': args.readers,
+              'scale': scale, 'modes': {}}
+    for mode in args.modes.split(','):
+        if mode == 'direct':
+            _set_journal_mode(app, path, 'DELETE')
+            write = _direct_writer(path)
+        else:
+            _set_journal_mode(app, path, 'WAL')
+            write = _coordinator_writer(app)
+        report['modes'][mode] = run_mode(app, write, scale, args.writers, args.writes,
+                                         args.readers, args.seed)
+    
+    from utils.write_coordinator import write_coordinator
+    if write_coordinator.batches:
+        report['coordinator_batches'] = write_coordinator.batches
+        report['writes_per_commit'] = round(write_coordinator.writes / write_coordinator.batches, 1)
+    
+    print(f"{'模式':<13}{'成功':>7}{'锁错误':>7}{'其他错误':>9}{'写入/s':>9}{'写p50(ms)':>11}"
+          f"{'写p99(ms)':>11}{'读p99(ms)':>11}")
+    for mode, r in report['modes'].items():
+        print(f"{mode:<13}{r['requests']:>7}{r['lock_errors']:>7}{r['errors'] - r['lock_errors']:>9}"
+              f"{r['throughput_rps']:>9}{r['p50_ms']:>11}{r['p99_ms']:>11}{r['reads']['p99_ms']:>11}")
+    if 'writes_per_commit' in report:
+        print(f"coordinator 平均每次提交合并 {report['writes_per_commit']} 个写请求")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
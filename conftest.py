@@ -0,0 +1,9 @@
+"""
+pytest 公共配置
+导入 app 之前把数据库指向临时目录，测试不读写 instance/ 下的正式数据库
+"""
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix='senxi-test-')
+os.environ.setdefault('SENXI_DATABASE_URI', f'sqlite:///{os.path.join(_TEST_DIR, "senxi_air.db")}')
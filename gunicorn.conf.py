@@ -0,0 +1,49 @@
+"""
+gunicorn 配置
+preload 模式下由 master 进程导入应用、构建只读目录并冻结堆，
+fork 出的 worker 以写时复制方式共享这些内存页
+
+启动: gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# SENXI_PRELOAD=0 可关闭预加载（用于内存对比）
+preload_app = os.environ.get('SENXI_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    """master 就绪、即将 fork worker 之前编译全部模板并冻结堆对象（worker 共享编译结果）"""
+    if preload_app:
+        from app import app
+        from utils.preload import freeze_heap
+        from utils.warmup import compile_templates
+        compile_templates(app)
+        freeze_heap()
+
+
+def pre_fork(server, worker):
+    """为即将 fork 的 worker 分配一个存活 worker 中未被占用的编号槽位"""
+    used = {getattr(w, 'id_slot', None) for w in server.WORKERS.values()}
+    worker.id_slot = next(slot for slot in range(64) if slot not in used)
+
+
+def post_fork(server, worker):
+    """worker fork 后设置编号生成器的 worker id，并丢弃从 master 继承的数据库连接"""
+    from utils.ids import configure_worker
+    configure_worker(worker.id_slot)
+    
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """worker 开始接收请求前预热：编译模板（preload 时已在 master 完成）、请求一遍主要页面"""
+    from app import app
+    from utils.warmup import warm_up
+    warm_up(app)
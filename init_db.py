@@ -1,24 +1,44 @@
 """
 数据库初始化脚本
-用于创建数据库表并填充示例数据
+用于创建数据库表并填充示例数据，或从 JSONL/CSV 文件批量导入数据
+
+用法:
+    python init_db.py                                   # 建表/迁移，空库时写入示例数据
+    python init_db.py --reset                           # 删除所有表后重建并写入示例数据
+    python init_db.py --users users.jsonl --orders orders.csv   # 批量导入（追加）
 """
 
 from app import app, db
 from models import User, Product, Post, Comment
+from utils.bulk_import import BulkImporter, DEFAULT_CHUNK_SIZE, IMPORT_ORDER
+from utils.migrations import upgrade_schema
+from utils.write_queue import write_queue
 from datetime import datetime
+import argparse
 import json
 
 
-def init_database():
-    """初始化数据库"""
+def init_database(reset: bool = False):
+    """
+    初始化数据库
+
+    Args:
+        reset: 是否先删除所有表（会清空数据，谨慎使用）
+    """
     with app.app_context():
-        # 删除所有表（谨慎使用）
-        print("正在删除现有数据库表...")
-        db.drop_all()
+        if reset:
+            print("正在删除现有数据库表...")
+            db.drop_all()
+            write_queue.clear()
         
-        # 创建所有表
+        # 创建缺失的表并执行未应用的迁移
         print("正在创建数据库表...")
-        db.create_all()
+        version = upgrade_schema()
+        print(f"数据库结构版本: {version}")
+        
+        if User.query.first() is not None:
+            print("数据库中已有数据，跳过示例数据（使用 --reset 清空后重建）")
+            return
         
         # 添加示例用户
         print("正在添加示例用户...")
@@ -375,5 +395,32 @@ def init_database():
         print("\n默认用户密码: 123456")
 
 
+def import_data(files: dict, chunk_size: int = DEFAULT_CHUNK_SIZE, reset: bool = False):
+    """从 JSONL/CSV 文件批量导入数据（默认追加到现有表）"""
+    with app.app_context():
+        if reset:
+            print("正在删除现有数据库表...")
+            db.drop_all()
+            write_queue.clear()
+        upgrade_schema()
+        importer = BulkImporter(chunk_size=chunk_size, progress=print)
+        counts = importer.import_files(files)
+        
+        print("\n导入完成！")
+        for table, count in counts.items():
+            print(f"{table}: {count}")
+
+
 if __name__ == '__main__':
-    init_database()
+    parser = argparse.ArgumentParser(description='数据库初始化')
+    for table in IMPORT_ORDER:
+        parser.add_argument(f'--{table}', metavar='FILE', help=f'{table} 数据文件（.jsonl 或 .csv）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每个事务写入的行数')
+    parser.add_argument('--reset', action='store_true', help='删除所有表后重建（清空数据）')
+    args = parser.parse_args()
+    
+    files = {table: getattr(args, table) for table in IMPORT_ORDER if getattr(args, table)}
+    if files:
+        import_data(files, args.chunk_size, reset=args.reset)
+    else:
+        init_database(reset=args.reset)
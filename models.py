@@ -3,10 +3,15 @@
 使用 Flask-SQLAlchemy 管理数据库
 """
 
+from flask import has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, configure_mappers, joinedload, selectinload
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from utils.ranking import hot_score
+
 db = SQLAlchemy()
 
 
@@ -15,7 +20,7 @@ class User(db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
-    phone = db.Column(db.String(11), unique=True, nullable=False, index=True)
+    phone = db.Column(db.String(11), unique=True, nullable=True, index=True)  # 第三方登录用户可为空
     email = db.Column(db.String(120), unique=True, nullable=True)
     username = db.Column(db.String(80), nullable=True)
     password_hash = db.Column(db.String(128), nullable=True)
@@ -35,11 +40,11 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
-    orders = db.relationship('Order', backref='user', lazy='dynamic')
-    posts = db.relationship('Post', backref='author', lazy='dynamic')
-    comments = db.relationship('Comment', backref='author', lazy='dynamic')
-    liked_posts = db.relationship('PostLike', backref='user', lazy='dynamic')
-    favorited_posts = db.relationship('PostFavorite', backref='user', lazy='dynamic')
+    orders = db.relationship('Order', backref='user', lazy='select')
+    posts = db.relationship('Post', backref='author', lazy='select')
+    comments = db.relationship('Comment', backref='author', lazy='select')
+    liked_posts = db.relationship('PostLike', backref='user', lazy='select')
+    favorited_posts = db.relationship('PostFavorite', backref='user', lazy='select')
     
     def set_password(self, password):
         """设置密码"""
@@ -87,6 +92,7 @@ class Product(db.Model):
     tags = db.Column(db.Text, nullable=True)  # JSON 格式存储标签
     
     # 展示信息
+    status = db.Column(db.String(20), default='active')  # active, inactive
     badge = db.Column(db.String(20), nullable=True)  # 角标文字
     badge_color = db.Column(db.String(20), nullable=True)  # 角标颜色
     rating = db.Column(db.Float, default=5.0)
@@ -97,7 +103,7 @@ class Product(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
-    order_items = db.relationship('OrderItem', backref='product', lazy='dynamic')
+    order_items = db.relationship('OrderItem', backref='product', lazy='select')
     
     def decrease_stock(self, quantity):
         """减少库存（销售）"""
@@ -159,12 +165,19 @@ class Order(db.Model):
     paid_at = db.Column(db.DateTime, nullable=True)
     shipped_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
-    items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
+    items = db.relationship('OrderItem', backref='order', lazy='select', cascade='all, delete-orphan')
+    
+    # 订单列表（全部/按状态）按下单时间倒序分页
+    __table_args__ = (
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),
+        db.Index('ix_orders_user_status_created', 'user_id', 'status', 'created_at'),
+    )
     
     def to_dict(self):
-        """转换为字典"""
+        """转换为字典（需预加载 items 及 items.product，见 ORDER_LOADERS）"""
         return {
             'id': self.id,
             'order_id': self.order_id,
@@ -184,9 +197,13 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     
+    # 下单时的商品快照
+    product_name = db.Column(db.String(200), nullable=True)
+    product_image = db.Column(db.String(500), nullable=True)
+    
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)  # 购买时的价格
     
@@ -195,13 +212,21 @@ class OrderItem(db.Model):
         return {
             'id': self.id,
             'product_id': self.product_id,
-            'product_name': self.product.name if self.product else None,
+            'product_name': self.product_name or (self.product.name if self.product else None),
+            'product_image': self.product_image,
             'quantity': self.quantity,
             'price': self.price,
             'subtotal': self.quantity * self.price
         }
 
 
+def _initial_hot_score(context):
+    """新帖热度分（插入时按计数和发帖时间计算）"""
+    params = context.get_current_parameters()
+    return hot_score(params.get('likes'), params.get('comment_count'),
+                     params.get('views'), params.get('created_at'))
+
+
 class Post(db.Model):
     """帖子模型"""
     __tablename__ = 'posts'
@@ -224,10 +249,17 @@ class Post(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 热度分（见 utils/ranking.py），计数变化时同步更新
+    hot_score = db.Column(db.Float, default=_initial_hot_score, index=True)
+    
     # 关系
-    comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
-    post_likes = db.relationship('PostLike', backref='post', lazy='dynamic', cascade='all, delete-orphan')
-    post_favorites = db.relationship('PostFavorite', backref='post', lazy='dynamic', cascade='all, delete-orphan')
+    comments = db.relationship('Comment', backref='post', lazy='select', cascade='all, delete-orphan')
+    post_likes = db.relationship('PostLike', backref='post', lazy='select', cascade='all, delete-orphan')
+    post_favorites = db.relationship('PostFavorite', backref='post', lazy='select', cascade='all, delete-orphan')
+    
+    def refresh_hot_score(self):
+        """按当前计数重算热度分（点赞/评论/浏览变化后调用）"""
+        self.hot_score = hot_score(self.likes, self.comment_count, self.views, self.created_at)
     
     def to_dict(self):
         """转换为字典"""
@@ -302,3 +334,139 @@ class PostFavorite(db.Model):
     
     # 确保同一用户对同一帖子只能收藏一次
     __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_favorite'),)
+
+
+
+class CartItem(db.Model):
+    """购物车条目"""
+    __tablename__ = 'cart_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, default=1, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 同一用户同一商品只占一行，加购时累加数量
+    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_cart_product'),)
+
+
+class InventoryLease(db.Model):
+    """库存租约：进程从 products.stock 中预领、在内存中分配给预占的库存"""
+    __tablename__ = 'inventory_leases'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    owner = db.Column(db.String(100), nullable=False)  # 持有租约的进程
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)  # 进程定期续期，过期视为进程已退出
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('product_id', 'owner', name='unique_product_lease_owner'),)
+
+
+class StockReservation(db.Model):
+    """库存预占日志"""
+    __tablename__ = 'stock_reservations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reservation_id = db.Column(db.String(50), unique=True, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    owner = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default='held')  # held, committed, released, expired
+    order_id = db.Column(db.String(50), nullable=True)  # 提交时关联的订单编号
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_stock_reservations_owner_status', 'owner', 'status'),)
+
+
+class AppliedJob(db.Model):
+    """已在主库执行过的写队列任务（编号来自队列库），任务重放时据此跳过"""
+    __tablename__ = 'applied_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    applied_at = db.Column(db.Float, nullable=False, index=True)  # 超过保留期后清理
+
+
+class JobOutbox(db.Model):
+    """
+    写队列发件箱：与主写入（点赞记录、评论等）在同一事务内写入的派生写入任务，
+    由写队列线程在主库的一个事务内执行并删除
+    """
+    __tablename__ = 'job_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    amount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.Float, nullable=False)
+
+
+class ProductFavorite(db.Model):
+    """商品收藏记录"""
+    __tablename__ = 'product_favorites'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_favorite'),)
+
+
+class Address(db.Model):
+    """收货地址"""
+    __tablename__ = 'addresses'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(11), nullable=False)
+    province = db.Column(db.String(50), nullable=False)
+    city = db.Column(db.String(50), nullable=False)
+    district = db.Column(db.String(50), nullable=False)
+    detail = db.Column(db.String(500), nullable=False)
+    is_default = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+
+# ==================== 关系加载策略 ====================
+
+# backref 在映射配置完成后才会挂到类上
+configure_mappers()
+
+# 各接口序列化 to_dict 树所需的预加载选项，保证查询数与结果条数无关
+POST_LOADERS = (joinedload(Post.author),)
+COMMENT_LOADERS = (joinedload(Comment.author),)
+ORDER_LOADERS = (selectinload(Order.items).joinedload(OrderItem.product),)
+
+
+class StrictLoadingError(Exception):
+    """严格加载模式下，请求处理中发生了隐式懒加载"""
+
+
+def init_strict_loading(app):
+    """
+    启用严格加载模式（配置项 SQLALCHEMY_STRICT_LOADING）
+
+    请求处理期间任何隐式懒加载都会抛出 StrictLoadingError，
+    用于在开发和测试中发现遗漏的预加载选项
+    """
+    if not app.config.get('SQLALCHEMY_STRICT_LOADING'):
+        return
+    
+    @event.listens_for(Session, 'do_orm_execute')
+    def _reject_lazy_load(orm_execute_state):
+        if not orm_execute_state.is_select or not has_request_context():
+            return
+        if orm_execute_state.lazy_loaded_from is None:
+            return
+        path = orm_execute_state.loader_strategy_path
+        raise StrictLoadingError(
+            f'接口 {request.endpoint} 中发生隐式懒加载: {path}，请在查询中添加预加载选项'
+        )
@@ -174,19 +174,29 @@ function initButlerWidget() {
         
         showTypingIndicator();
         
+        let replies = null;
         try {
             const response = await fetch(`${CONFIG.API_BASE}/butler/chat`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream, application/json'
+                },
                 body: JSON.stringify({
                     message: text,
                     history: conversationHistory.slice(-10)
                 })
             });
             
-            const data = await response.json();
-            hideTypingIndicator();
-            addBotMessage(data.response || '抱歉，我暂时无法回答这个问题。请稍后再试或联系人工客服。');
+            const contentType = response.headers.get('Content-Type') || '';
+            if (response.body && contentType.includes('text/event-stream')) {
+                replies = await readButlerStream(response);
+            } else {
+                const data = await response.json();
+                hideTypingIndicator();
+                addBotMessage(data.message || '抱歉，我暂时无法回答这个问题。请稍后再试或联系人工客服。');
+                replies = data.quick_replies;
+            }
         } catch (error) {
             hideTypingIndicator();
             // 本地回复
@@ -194,7 +204,88 @@ function initButlerWidget() {
             addBotMessage(localResponse);
         }
         
-        showQuickReplies();
+        if (replies && replies.length) {
+            showSuggestedReplies(replies);
+        } else {
+            showQuickReplies();
+        }
+    }
+    
+    // 读取流式回复：meta 到达即显示消息框，delta 逐段追加正文，返回服务端建议的快捷回复
+    async function readButlerStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let bubble = null;
+        let message = '';
+        let replies = null;
+        
+        const handleEvent = (event, data) => {
+            if (event === 'meta') {
+                hideTypingIndicator();
+                bubble = addBotMessageShell();
+                replies = data.quick_replies;
+            } else if (event === 'delta' && bubble) {
+                message += data.text;
+                bubble.textContent = message;
+                butlerMessages.scrollTop = butlerMessages.scrollHeight;
+            }
+        };
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                handleEvent(event, data ? JSON.parse(data) : {});
+            }
+        }
+        
+        hideTypingIndicator();
+        conversationHistory.push({ role: 'assistant', content: message });
+        return replies;
+    }
+    
+    // 添加一个空的机器人消息框，返回正文元素（流式回复逐段填充）
+    function addBotMessageShell() {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'flex items-start space-x-3';
+        messageDiv.innerHTML = `
+            <div class="w-8 h-8 bg-primary-100 rounded-full flex items-center justify-center flex-shrink-0">
+                <i data-lucide="bot" class="w-4 h-4 text-primary-600"></i>
+            </div>
+            <div class="bg-white border border-gray-200 rounded-2xl rounded-bl-sm px-4 py-2 max-w-xs shadow-sm">
+                <p class="text-gray-800 text-sm"></p>
+            </div>
+        `;
+        butlerMessages.appendChild(messageDiv);
+        butlerMessages.scrollTop = butlerMessages.scrollHeight;
+        lucide.createIcons();
+        return messageDiv.querySelector('p');
+    }
+    
+    // 显示服务端建议的快捷回复（点击后作为消息发送）
+    function showSuggestedReplies(replies) {
+        butlerQuickReplies.innerHTML = '';
+        replies.forEach(text => {
+            const btn = document.createElement('button');
+            btn.className = 'px-3 py-1 bg-gray-100 hover:bg-primary-100 text-gray-700 hover:text-primary-700 rounded-full text-sm transition-colors';
+            btn.textContent = text;
+            btn.addEventListener('click', () => {
+                butlerInput.value = text;
+                sendMessage();
+            });
+            butlerQuickReplies.appendChild(btn);
+        });
     }
     
     // 本地响应（API不可用时的备用）
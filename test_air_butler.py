@@ -0,0 +1,65 @@
+"""
+AI空气管家回复缓存测试
+消息规范化后共用缓存条目、预热条目不被 LRU 淘汰、对话历史按上限保留最近的消息
+"""
+import pytest
+
+from app import air_butler
+from utils.air_butler import CONVERSATION_HISTORY_LIMIT, ResponseCache, normalize_message
+
+ENTRY = ({'intent': 'air_quality', 'message': 'AQI 是空气质量指数'}, b'{}')
+
+
+@pytest.mark.parametrize('message', ['AQI是什么', 'ＡＱＩ是什么？', '  aqi是什么!! ', 'Aqi是什么。'])
+def test_normalize_variants(message):
+    assert normalize_message(message) == 'aqi是什么'
+
+
+def test_casefold_and_whitespace():
+    assert normalize_message('STRASSE') == normalize_message('straße') == 'strasse'
+    assert normalize_message('滤网　 多久\t换') == '滤网 多久 换'
+
+
+def test_variants_share_one_cache_entry():
+    cache = ResponseCache()
+    key, entry = cache.lookup('AQI是什么')
+    assert (key, entry) == ('aqi是什么', None)
+    cache.put(key, ENTRY)
+    
+    for variant in ('ＡＱＩ是什么？', 'aqi是什么!', ' AQI是什么 '):
+        key, entry = cache.lookup(variant)
+        assert key == 'aqi是什么'
+        assert entry is ENTRY
+    # 原文也被记为键，原样重复的消息不再规范化
+    assert cache._get('ＡＱＩ是什么？') is ENTRY
+
+
+def test_pinned_entries_survive_eviction():
+    cache = ResponseCache(max_entries=2)
+    cache.pin({'你好': ENTRY})
+    for index in range(5):
+        cache.put(f'消息{index}', ({'message': str(index)}, b''))
+    
+    assert cache.lookup('你好')[1] is ENTRY
+    assert cache.lookup('消息0')[1] is None
+    assert cache.lookup('消息4')[1] is not None
+    assert len(cache) == 3
+
+
+def test_long_messages_are_not_cached():
+    cache = ResponseCache()
+    cache.put('长' * 101, ENTRY)
+    assert len(cache) == 0
+
+
+def test_history_keeps_latest_messages():
+    assert air_butler.conversation_history.maxlen == CONVERSATION_HISTORY_LIMIT == 200
+    for index in range(CONVERSATION_HISTORY_LIMIT):
+        air_butler.chat(f'历史消息 {index}')
+    
+    history = air_butler.conversation_history
+    assert len(history) == CONVERSATION_HISTORY_LIMIT
+    # 每轮对话记录用户和管家各一条，最早的一半已被挤出
+    assert history[0]['content'] == f'历史消息 {CONVERSATION_HISTORY_LIMIT // 2}'
+    assert [entry['role'] for entry in list(history)[-2:]] == ['user', 'assistant']
+    assert history[-2]['content'] == f'历史消息 {CONVERSATION_HISTORY_LIMIT - 1}'
@@ -0,0 +1,97 @@
+"""
+对话分析事件日志测试
+不启动后台线程，由测试直接 flush；检查缓冲区溢出计数、分批写入和按天聚合
+"""
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date
+
+import pytest
+
+from app import app
+from utils import analytics
+from utils.analytics import EventLog, aggregate
+from utils.metrics import _format_labels, registry
+
+STEP_NAMES = {1: '使用场景', 2: '房间面积', 3: '推荐结果'}
+
+
+@pytest.fixture
+def event_log(tmp_path):
+    log = EventLog()
+    log.init_app(app, str(tmp_path / 'test.events'))
+    # 视为写线程已在当前进程启动
+    log._pid = os.getpid()
+    return log
+
+
+def _dropped_total() -> float:
+    return registry._counters.get(('senxi_analytics_events_dropped_total', _format_labels({})), 0)
+
+
+def _connect(log: EventLog) -> sqlite3.Connection:
+    conn = sqlite3.connect(log.path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_overflow_is_dropped_and_counted(event_log, monkeypatch):
+    monkeypatch.setattr(analytics, 'MAX_BUFFERED', 3)
+    before = _dropped_total()
+    for _ in range(5):
+        event_log.record('butler', 0.01, message='你好', intent='general')
+    
+    assert len(event_log._buffer) == 3
+    assert event_log._dropped == 2
+    assert event_log.flush() == 3
+    assert event_log._dropped == 0
+    assert _dropped_total() - before == 2
+
+
+def test_flush_writes_in_batches(event_log, monkeypatch):
+    monkeypatch.setattr(analytics, 'BATCH_SIZE', 2)
+    statements = []
+    connect = event_log._connect
+    
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+    monkeypatch.setattr(event_log, '_connect', traced_connect)
+    
+    for index in range(5):
+        event_log.record('guide', 0.01, session=f's{index}', step=1, next_step=2)
+    assert event_log.flush() == 5
+    # 5 条事件按每批 2 条分 3 个事务写入
+    assert sum(1 for statement in statements if statement.strip().upper() == 'COMMIT') == 3
+    assert event_log.flush() == 0
+
+
+def test_aggregate_is_repeatable(event_log):
+    for latency in (0.01, 0.03):
+        event_log.record('butler', latency, message='AQI是什么', intent='air_quality', subtopic='aqi')
+    event_log.record('butler', 0.02, message='随便聊聊', intent='general', subtopic='default')
+    # 三个导购会话分别走到第 3、2、1 步
+    for session, reached in (('a', 3), ('b', 2), ('c', 1)):
+        for step in range(reached):
+            event_log.record('guide', 0.005, session=session, step=step, next_step=step + 1)
+    event_log.flush()
+    
+    with closing(_connect(event_log)) as conn:
+        first = aggregate(conn, date.today(), STEP_NAMES)
+        second = aggregate(conn, date.today(), STEP_NAMES)
+        assert first == second
+        
+        intents = {(row['intent'], row['subtopic']): dict(row)
+                   for row in conn.execute('SELECT * FROM intent_daily')}
+        funnel = [dict(row) for row in conn.execute('SELECT * FROM guide_funnel_daily ORDER BY step')]
+    
+    assert len(intents) == 2
+    aqi = intents[('air_quality', 'aqi')]
+    assert (aqi['messages'], aqi['avg_latency_ms'], aqi['p95_latency_ms']) == (2, 20.0, 30.0)
+    assert intents[('general', 'default')]['messages'] == 1
+    assert [(row['step'], row['name'], row['sessions'], row['drop_off']) for row in funnel] == [
+        (1, '使用场景', 3, 1), (2, '房间面积', 2, 1), (3, '推荐结果', 1, 0),
+    ]
+    assert [row['conversion'] for row in funnel] == [1.0, 0.6667, 0.3333]
@@ -0,0 +1,100 @@
+"""
+购物车测试
+数量上限、不可购买条目的标记和合计、摘要缓存在写入后的失效
+"""
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app import app
+from models import Product, User, db
+from utils.database import MAX_CART_QUANTITY, CartDB, CartSummaryCache
+
+
+def _product(stock: int = 100, price: float = 10.0) -> str:
+    code = f'cart_{time.time_ns()}'
+    with app.app_context():
+        db.session.add(Product(product_id=code, name='滤芯', category='filter', price=price,
+                               stock=stock, sales=0))
+        db.session.commit()
+    return code
+
+
+@pytest.fixture
+def user_id():
+    with app.app_context():
+        user = User(username='cart-tester')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'id': user_id, 'username': 'cart-tester'}
+    return client
+
+
+def _items(client) -> dict:
+    return {item['product_id']: item for item in client.get('/api/cart').json['items']}
+
+
+def test_quantity_is_capped(client):
+    code = _product()
+    client.post('/api/cart', json={'product_id': code, 'quantity': 60})
+    response = client.post('/api/cart', json={'product_id': code, 'quantity': 60})
+    assert response.json['summary']['quantity'] == MAX_CART_QUANTITY == 99
+    
+    client.put(f'/api/cart/{code}', json={'quantity': 500})
+    assert _items(client)[code]['quantity'] == MAX_CART_QUANTITY
+
+
+def test_unavailable_items_are_flagged_and_excluded(client):
+    in_stock, low_stock, delisted = _product(price=10.0), _product(stock=1, price=20.0), _product(price=30.0)
+    for code in (in_stock, low_stock, delisted):
+        client.post('/api/cart', json={'product_id': code, 'quantity': 2})
+    with app.app_context():
+        db.session.execute(text("UPDATE products SET status = 'inactive' WHERE product_id = :code"),
+                           {'code': delisted})
+        db.session.commit()
+    
+    body = client.get('/api/cart').json
+    items = {item['product_id']: item for item in body['items']}
+    assert [items[code]['available'] for code in (in_stock, low_stock, delisted)] == [True, False, False]
+    assert body['summary'] == {'item_count': 3, 'quantity': 6, 'total_amount': 20.0, 'unavailable_count': 2}
+    # 已下架的商品不能再加入购物车
+    assert client.post('/api/cart', json={'product_id': delisted}).status_code == 404
+
+
+def test_summary_cache_invalidated_by_put_and_delete(client, user_id):
+    code = _product(price=5.0)
+    client.post('/api/cart', json={'product_id': code, 'quantity': 1})
+    assert client.get('/api/cart/summary').json['quantity'] == 1
+    
+    client.put(f'/api/cart/{code}', json={'quantity': 4})
+    summary = client.get('/api/cart/summary').json
+    assert (summary['quantity'], summary['total_amount']) == (4, 20.0)
+    
+    client.delete(f'/api/cart/{code}')
+    assert client.get('/api/cart/summary').json['item_count'] == 0
+    assert client.delete(f'/api/cart/{code}').status_code == 404
+
+
+def test_summary_cache_skips_store_when_invalidated_during_load():
+    cache = CartSummaryCache(ttl=60)
+    calls = []
+    
+    def loader(user_id):
+        calls.append(user_id)
+        if len(calls) == 1:
+            # 加载期间购物车被修改：这次结果不能写入缓存
+            cache.invalidate(user_id)
+        return {'quantity': len(calls)}
+    
+    assert cache.get(1, loader) == {'quantity': 1}
+    assert cache.get(1, loader) == {'quantity': 2}
+    assert cache.get(1, loader) == {'quantity': 2}
+    assert calls == [1, 1]
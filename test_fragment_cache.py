@@ -0,0 +1,97 @@
+"""
+模板片段缓存测试
+字节预算下的 LRU 淘汰、ttl、key 中的版本字段变化后重新渲染
+"""
+import time
+
+import pytest
+from markupsafe import Markup
+from sqlalchemy import text
+
+from app import app
+from models import Post, User, db
+from utils.fragment_cache import FragmentCache, fragment_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_fragments():
+    fragment_cache.clear()
+    yield
+    fragment_cache.clear()
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = FragmentCache(max_bytes=12)
+    cache.put('a', Markup('净化'))   # 6 字节
+    cache.put('b', Markup('abcd'))
+    cache.get_or_render('a', None, lambda: '不应重新渲染')
+    cache.put('c', Markup('efgh'))
+    
+    assert cache.size == 10
+    assert cache._entries.keys() == {'a', 'c'}
+    # 超过整个预算的片段不缓存
+    cache.put('d', Markup('x' * 13))
+    assert 'd' not in cache._entries and cache.size == 10
+
+
+def test_ttl_expires_fragment():
+    cache = FragmentCache()
+    renders = []
+    
+    def render():
+        renders.append(1)
+        return f'<p>{len(renders)}</p>'
+    
+    assert cache.get_or_render('k', 0.05, render) == '<p>1</p>'
+    assert cache.get_or_render('k', 0.05, render) == '<p>1</p>'
+    time.sleep(0.06)
+    assert cache.get_or_render('k', 0.05, render) == '<p>2</p>'
+    # 不带 ttl 时只按 LRU 淘汰
+    assert cache.get_or_render('forever', None, render) == '<p>3</p>'
+    assert cache._entries['forever'][0] is None
+
+
+def test_catalog_version_in_key_rerenders():
+    template = app.jinja_env.from_string(
+        "{% cache ('grid', catalog_version) %}{{ names | join(',') }}{% endcache %}"
+    )
+    assert template.render(catalog_version='v1', names=['A1']) == 'A1'
+    assert template.render(catalog_version='v1', names=['A2']) == 'A1'
+    assert template.render(catalog_version='v2', names=['A2']) == 'A2'
+
+
+@pytest.fixture
+def post_id():
+    with app.app_context():
+        user = User(username=f'fragment-{time.time_ns()}')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(post_id=f'post_fragment_{time.time_ns()}', user_id=user.id, title='原标题',
+                    content='原正文', category='general', hot_score=1e9)
+        db.session.add(post)
+        db.session.commit()
+        return post.id
+
+
+def test_post_card_rerenders_when_rendered_fields_change(post_id):
+    client = app.test_client()
+    assert '原标题' in client.get('/community').get_data(as_text=True)
+    
+    # 直接改库、不更新 updated_at：key 中包含标题和作者，仍会重新渲染
+    with app.app_context():
+        db.session.execute(text("UPDATE posts SET title = '新标题' WHERE id = :id"), {'id': post_id})
+        db.session.execute(text('UPDATE users SET username = :name WHERE id = '
+                                '(SELECT user_id FROM posts WHERE id = :id)'),
+                           {'name': '新昵称', 'id': post_id})
+        db.session.commit()
+    page = client.get('/community').get_data(as_text=True)
+    assert '新标题' in page and '原标题' not in page
+    assert '新昵称' in page
+    
+    with app.app_context():
+        db.session.execute(text("UPDATE posts SET updated_at = '2030-01-01 00:00:00' WHERE id = :id"),
+                           {'id': post_id})
+        db.session.commit()
+    before = len(fragment_cache)
+    client.get('/community')
+    assert len(fragment_cache) == before + 1
@@ -0,0 +1,52 @@
+"""
+业务编号生成测试
+"""
+import threading
+from unittest import mock
+
+from utils.ids import MAX_SEQUENCE, IdGenerator, decode, encode, parse_id
+
+
+def test_encode_roundtrip_preserves_order():
+    values = [0, 1, 31, 32, 12345678901234, (1 << 63) - 1]
+    encoded = [encode(value) for value in values]
+    assert [decode(text) for text in encoded] == values
+    assert encoded == sorted(encoded)
+
+
+def test_monotonic_across_threads():
+    generator = IdGenerator(worker_id=5)
+    results = [[] for _ in range(8)]
+    
+    def generate(out):
+        for _ in range(2000):
+            out.append(generator.next_id())
+    
+    threads = [threading.Thread(target=generate, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    ids = [text for out in results for text in out]
+    assert len(set(ids)) == len(ids)
+    # 每个线程拿到的编号按生成顺序递增
+    for out in results:
+        assert out == sorted(out)
+    assert all(parse_id(text)[1] == 5 for text in ids)
+
+
+def test_monotonic_when_clock_goes_back():
+    generator = IdGenerator(worker_id=1)
+    clock = iter([1_800_000_000.0, 1_800_000_000.0, 1_799_999_990.0, 1_799_999_990.0, 1_800_000_001.0])
+    with mock.patch('utils.ids.time.time', lambda: next(clock)):
+        ids = [generator.next_int() for _ in range(5)]
+    assert ids == sorted(ids) and len(set(ids)) == 5
+
+
+def test_sequence_overflow_advances_logical_time():
+    generator = IdGenerator(worker_id=0)
+    with mock.patch('utils.ids.time.time', lambda: 1_800_000_000.0):
+        ids = [generator.next_int() for _ in range(MAX_SEQUENCE + 3)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert parse_id(encode(ids[-1]))[0] > parse_id(encode(ids[0]))[0]
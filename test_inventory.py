@@ -0,0 +1,165 @@
+"""
+库存预占测试
+两个 InventoryEngine 实例模拟两个 worker 进程（不同的 owner，共用同一个数据库）；
+不启动后台线程，由测试直接调用对账
+"""
+import os
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app import app
+from models import Product, User, db
+from utils.database import OrderDB
+from utils.inventory import InventoryEngine
+
+STOCK = 100
+LEASE = 10
+
+
+def _engine() -> InventoryEngine:
+    engine = InventoryEngine(lease_size=LEASE)
+    engine.init_app(app)
+    engine._pid = os.getpid()
+    return engine
+
+
+@pytest.fixture
+def product():
+    code = f'inv_{time.time_ns()}'
+    with app.app_context():
+        db.session.add(Product(product_id=code, name='净化器', category='purifier', price=100.0,
+                               stock=STOCK, sales=0))
+        db.session.commit()
+    return code
+
+
+@pytest.fixture
+def user_id():
+    with app.app_context():
+        user = User(username='inventory-tester')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def _scalar(sql: str, **params):
+    with app.app_context():
+        return db.session.execute(text(sql), params).scalar()
+
+
+def _status(reservation_id: str) -> str:
+    return _scalar('SELECT status FROM stock_reservations WHERE reservation_id = :rid', rid=reservation_id)
+
+
+def _stock_and_leases(code: str):
+    stock = _scalar('SELECT stock FROM products WHERE product_id = :code', code=code)
+    leased = _scalar('SELECT COALESCE(SUM(quantity), 0) FROM inventory_leases l JOIN products p '
+                     'ON p.id = l.product_id WHERE p.product_id = :code', code=code)
+    return stock, leased
+
+
+def test_unknown_product_creates_no_counter(user_id):
+    engine = _engine()
+    assert engine.reserve('no_such_product', 1, user_id=user_id) is None
+    assert engine._counters == {}
+
+
+def test_hold_is_persisted_before_return(product, user_id):
+    engine = _engine()
+    reservation = engine.reserve(product, 3, user_id=user_id)
+    
+    assert _status(reservation.reservation_id) == 'held'
+    assert _stock_and_leases(product) == (STOCK - LEASE, LEASE)
+    assert engine._counters[product].held == 3
+
+
+def test_release_and_wrong_user(product, user_id):
+    engine = _engine()
+    reservation = engine.reserve(product, 3, user_id=user_id)
+    
+    assert not engine.release(reservation.reservation_id, user_id=user_id + 1000)
+    assert engine.release(reservation.reservation_id, user_id=user_id)
+    assert not engine.release(reservation.reservation_id, user_id=user_id)
+    assert _status(reservation.reservation_id) == 'released'
+    assert engine._counters[product].held == 0
+
+
+def test_commit_through_order(product, user_id):
+    engine = _engine()
+    reservation = engine.reserve(product, 2, user_id=user_id)
+    items = [{'product_id': product, 'quantity': 2, 'reservation_id': reservation.reservation_id}]
+    
+    # 数量不符时整单失败，预占保持 held
+    assert OrderDB.create(user_id, [dict(items[0], quantity=3)], {'name': '张三'}) is None
+    assert _status(reservation.reservation_id) == 'held'
+    
+    order_id = OrderDB.create(user_id, items, {'name': '张三', 'phone': '13800000000', 'address': '北京'})
+    assert order_id is not None
+    assert _status(reservation.reservation_id) == 'committed'
+    assert _scalar('SELECT sales FROM products WHERE product_id = :code', code=product) == 2
+    # 提交的库存从所属进程的租约中扣除
+    assert _stock_and_leases(product) == (STOCK - LEASE, LEASE - 2)
+    # 同一预占不能再次提交
+    assert OrderDB.create(user_id, items, {'name': '张三'}) is None
+
+
+def test_expire(product, user_id):
+    engine = _engine()
+    reservation = engine.reserve(product, 4, user_id=user_id, ttl=0.01)
+    time.sleep(0.05)
+    
+    assert not engine.commit(reservation.reservation_id, user_id)
+    engine.reconcile()
+    assert _status(reservation.reservation_id) == 'expired'
+    assert engine._counters[product].held == 0
+    assert engine.get(reservation.reservation_id) is None
+
+
+def test_cross_worker_release_and_commit(product, user_id):
+    worker_a, worker_b = _engine(), _engine()
+    released = worker_a.reserve(product, 3, user_id=user_id)
+    committed = worker_a.reserve(product, 5, user_id=user_id)
+    
+    # 请求落到另一个 worker：按数据库中的状态释放和提交
+    assert worker_b.release(released.reservation_id, user_id=user_id)
+    assert worker_b.commit(committed.reservation_id, user_id, order_id='ORD-TEST')
+    assert not worker_a.release(released.reservation_id, user_id=user_id)
+    assert not worker_a.commit(committed.reservation_id, user_id)
+    assert _status(released.reservation_id) == 'released'
+    assert _status(committed.reservation_id) == 'committed'
+    
+    # 所属 worker 对账时同步：释放的库存可再次预占，提交的库存已售出
+    counter = worker_a._counters[product]
+    assert counter.held == 8
+    worker_a.reconcile()
+    assert (counter.leased, counter.held) == (LEASE - 5, 0)
+    assert _stock_and_leases(product) == (STOCK - LEASE, LEASE - 5)
+    assert _scalar('SELECT sales FROM products WHERE product_id = :code', code=product) == 5
+
+
+def test_idle_lease_returned_after_commit(product, user_id):
+    engine = _engine()
+    engine.reserve(product, 1, user_id=user_id)
+    engine.reconcile()  # 本轮有预占，不退回
+    assert _stock_and_leases(product) == (STOCK - LEASE, LEASE)
+    
+    engine.reconcile()
+    counter = engine._counters[product]
+    assert (counter.leased, counter.held, counter.returning) == (1, 1, 0)
+    assert _stock_and_leases(product) == (STOCK - 1, 1)
+
+
+def test_failed_reconcile_keeps_lease(product, user_id, monkeypatch):
+    engine = _engine()
+    engine.reserve(product, 1, user_id=user_id)
+    engine.reconcile()
+    
+    def fail(write):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(engine, '_run', fail)
+    with pytest.raises(RuntimeError):
+        engine.reconcile()
+    counter = engine._counters[product]
+    assert (counter.leased, counter.returning, counter.available) == (LEASE, 0, LEASE - 1)
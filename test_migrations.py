@@ -0,0 +1,135 @@
+"""
+数据库迁移测试
+用 baseline 版本的表结构建库，执行 upgrade_schema 升级到最新版本，检查结构和数据
+"""
+import sqlite3
+
+import pytest
+from flask import Flask
+
+from app import app as _app  # noqa: F401  注册 SQL 函数等
+from models import db
+from utils.migrations import LATEST_VERSION, get_version, rebuild_table, upgrade_schema
+
+# baseline（版本 0）的表结构：users.phone 为 NOT NULL，缺少迁移 1、3 新增的列
+BASELINE_SQL = '''
+CREATE TABLE users (
+    id INTEGER NOT NULL, phone VARCHAR(11) NOT NULL, email VARCHAR(120), username VARCHAR(80),
+    password_hash VARCHAR(128), avatar VARCHAR(200), level VARCHAR(10), points INTEGER,
+    wechat_openid VARCHAR(100), qq_openid VARCHAR(100), github_id VARCHAR(100),
+    created_at DATETIME, updated_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (email), UNIQUE (wechat_openid), UNIQUE (qq_openid), UNIQUE (github_id)
+);
+CREATE UNIQUE INDEX ix_users_phone ON users (phone);
+CREATE TABLE products (
+    id INTEGER NOT NULL, product_id VARCHAR(50) NOT NULL, name VARCHAR(200) NOT NULL,
+    category VARCHAR(50) NOT NULL, price FLOAT NOT NULL, original_price FLOAT, stock INTEGER NOT NULL,
+    sales INTEGER, description TEXT, main_image VARCHAR(500), images TEXT, specs TEXT, features TEXT,
+    tags TEXT, badge VARCHAR(20), badge_color VARCHAR(20), rating FLOAT, review_count INTEGER,
+    created_at DATETIME, updated_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_products_product_id ON products (product_id);
+CREATE TABLE orders (
+    id INTEGER NOT NULL, order_id VARCHAR(50) NOT NULL, user_id INTEGER NOT NULL,
+    total_amount FLOAT NOT NULL, status VARCHAR(20), receiver_name VARCHAR(100) NOT NULL,
+    receiver_phone VARCHAR(11) NOT NULL, receiver_address VARCHAR(500) NOT NULL,
+    created_at DATETIME, paid_at DATETIME, shipped_at DATETIME, completed_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE UNIQUE INDEX ix_orders_order_id ON orders (order_id);
+CREATE TABLE posts (
+    id INTEGER NOT NULL, post_id VARCHAR(50) NOT NULL, user_id INTEGER NOT NULL,
+    title VARCHAR(200) NOT NULL, content TEXT NOT NULL, category VARCHAR(50) NOT NULL, images TEXT,
+    likes INTEGER, views INTEGER, comment_count INTEGER, created_at DATETIME, updated_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE UNIQUE INDEX ix_posts_post_id ON posts (post_id);
+CREATE TABLE order_items (
+    id INTEGER NOT NULL, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL, price FLOAT NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES orders (id),
+    FOREIGN KEY(product_id) REFERENCES products (id)
+);
+'''
+
+USER_COUNT = 120
+
+
+def _columns(conn, table):
+    return {row[1]: row for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+@pytest.fixture
+def baseline_app(tmp_path):
+    """指向 baseline 数据库的独立应用（共用 models.db）"""
+    path = tmp_path / 'baseline.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SQL)
+    conn.executemany(
+        'INSERT INTO users (id, phone, username, level, points, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(i, f'138{i:08d}', f'user{i}', '普通会员', i, '2024-01-01 00:00:00') for i in range(1, USER_COUNT + 1)],
+    )
+    conn.execute("INSERT INTO products (id, product_id, name, category, price, stock) "
+                 "VALUES (1, 'P1', '空气净化器', 'purifier', 1999, 10)")
+    conn.execute("INSERT INTO orders (id, order_id, user_id, total_amount, status, receiver_name, receiver_phone, "
+                 "receiver_address, created_at) VALUES (1, 'O1', 1, 1999, 'pending', '张三', '13800000001', '北京', "
+                 "'2024-01-02 00:00:00')")
+    conn.execute('INSERT INTO order_items (id, order_id, product_id, quantity, price) VALUES (1, 1, 1, 1, 1999)')
+    conn.execute("INSERT INTO posts (id, post_id, user_id, title, content, category, likes, views, comment_count, "
+                 "created_at) VALUES (1, 'T1', 1, '标题', '内容', 'share', 5, 100, 2, '2024-01-03 00:00:00')")
+    conn.commit()
+    conn.close()
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        yield app, path
+        db.engine.dispose()
+
+
+def test_upgrade_from_baseline(baseline_app):
+    _, path = baseline_app
+    assert upgrade_schema(log=lambda message: None) == LATEST_VERSION
+    
+    conn = sqlite3.connect(path)
+    assert get_version(conn) == LATEST_VERSION
+    # 迁移 1：新增的列
+    assert 'status' in _columns(conn, 'products')
+    assert 'updated_at' in _columns(conn, 'orders')
+    assert {'product_name', 'product_image'} <= set(_columns(conn, 'order_items'))
+    # 迁移 2：phone 可空，数据和唯一索引保留
+    assert _columns(conn, 'users')['phone'][3] == 0
+    assert conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == USER_COUNT
+    assert conn.execute('SELECT phone, points FROM users WHERE id = 7').fetchone() == ('13800000007', 7)
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO users (phone) VALUES ('13800000007')")
+    conn.execute("INSERT INTO users (username) VALUES ('oauth-user')")
+    # 迁移 3：热度分已回填
+    assert conn.execute('SELECT hot_score FROM posts WHERE id = 1').fetchone()[0] is not None
+    # 迁移 4：订单索引
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_posts_hot_score', 'ix_orders_user_created', 'ix_order_items_order_id'} <= indexes
+    assert not conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '_migrate_%'").fetchall()
+    conn.close()
+    
+    # 再次执行不做任何事
+    assert upgrade_schema(log=lambda message: None) == LATEST_VERSION
+
+
+def test_rebuild_fails_instead_of_dropping_rows(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'rebuild.db')
+    conn.execute('CREATE TABLE tags (id INTEGER PRIMARY KEY, name VARCHAR(20))')
+    conn.executemany('INSERT INTO tags (id, name) VALUES (?, ?)', [(1, 'a'), (2, 'b'), (3, 'a')])
+    conn.commit()
+    
+    operation = rebuild_table('tags', 'CREATE TABLE tags (id INTEGER PRIMARY KEY, name VARCHAR(20) UNIQUE)',
+                              batch_size=1)
+    with pytest.raises(sqlite3.IntegrityError):
+        operation(conn)
+    
+    # 原表不变，影子表和触发器已清理
+    assert conn.execute('SELECT COUNT(*) FROM tags').fetchone()[0] == 3
+    assert not conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '_migrate_%'").fetchall()
+    conn.close()
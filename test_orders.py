@@ -0,0 +1,140 @@
+"""
+订单列表与状态变更测试
+游标分页的顺序和边界、取消/确认收货的条件状态变更
+"""
+import os
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app import app
+from models import Order, Product, User, db
+from utils.database import OrderDB
+from utils.inventory import InventoryEngine
+
+STOCK = 20
+SHIPPING = {'name': '张三', 'phone': '13800000000', 'address': '北京市'}
+
+
+@pytest.fixture
+def product():
+    code = f'order_{time.time_ns()}'
+    with app.app_context():
+        db.session.add(Product(product_id=code, name='净化器', category='purifier', price=100.0,
+                               stock=STOCK, sales=0))
+        db.session.commit()
+    return code
+
+
+@pytest.fixture
+def user_id():
+    with app.app_context():
+        user = User(username='order-tester')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'id': user_id, 'username': 'order-tester'}
+    return client
+
+
+def _add_orders(user_id: int, created_at: list) -> list:
+    """按给定的下单时间直接插入订单，返回订单编号"""
+    order_ids = []
+    with app.app_context():
+        for index, timestamp in enumerate(created_at):
+            order = Order(order_id=f'ORD{time.time_ns()}{index}', user_id=user_id, total_amount=1.0,
+                          status='pending', receiver_name='张三', receiver_phone='13800000000',
+                          receiver_address='北京市', created_at=timestamp)
+            db.session.add(order)
+            db.session.flush()
+            order_ids.append(order.order_id)
+        db.session.commit()
+    return order_ids
+
+
+def _stock_and_sales(code: str):
+    with app.app_context():
+        return tuple(db.session.execute(
+            text('SELECT stock, sales FROM products WHERE product_id = :code'), {'code': code}
+        ).one())
+
+
+def _pages(user_id: int, limit: int, cursor: str = None) -> list:
+    pages = []
+    while True:
+        with app.app_context():
+            page = OrderDB.get_user_orders(user_id, limit=limit, cursor=cursor)
+        pages.append([order['order_id'] for order in page['orders']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_follow_created_at_then_id(user_id):
+    tie = datetime(2024, 5, 1, 12, 0, 0)
+    # 后三个订单下单时间相同，按 id 倒序排列且不能在翻页边界上重复或丢失
+    order_ids = _add_orders(user_id, [datetime(2024, 4, 1), datetime(2024, 4, 2), tie, tie, tie])
+    
+    pages = _pages(user_id, limit=2)
+    assert pages == [order_ids[4:2:-1], [order_ids[2], order_ids[1]], [order_ids[0]]]
+
+
+def test_garbage_cursor_starts_from_first_page(user_id):
+    order_ids = _add_orders(user_id, [datetime(2024, 4, 1), datetime(2024, 4, 2)])
+    
+    with app.app_context():
+        page = OrderDB.get_user_orders(user_id, limit=10, cursor='不是游标!!')
+    assert [order['order_id'] for order in page['orders']] == order_ids[::-1]
+    assert page['next_cursor'] is None
+
+
+def test_cancel_refunds_stock_once(client, product, user_id):
+    with app.app_context():
+        order_id = OrderDB.create(user_id, [{'product_id': product, 'quantity': 3}], SHIPPING)
+    assert _stock_and_sales(product) == (STOCK - 3, 3)
+    
+    response = client.post(f'/api/orders/{order_id}/cancel')
+    assert response.status_code == 200 and response.json['status'] == 'cancelled'
+    assert _stock_and_sales(product) == (STOCK, 0)
+    
+    # 已取消的订单不能再次取消，库存不会重复退回
+    assert client.post(f'/api/orders/{order_id}/cancel').status_code == 409
+    assert _stock_and_sales(product) == (STOCK, 0)
+
+
+def test_cancel_releases_committed_reservation(client, product, user_id):
+    engine = InventoryEngine(lease_size=5)
+    engine.init_app(app)
+    engine._pid = os.getpid()
+    reservation = engine.reserve(product, 2, user_id=user_id)
+    with app.app_context():
+        order_id = OrderDB.create(user_id, [{'product_id': product, 'quantity': 2,
+                                             'reservation_id': reservation.reservation_id}], SHIPPING)
+    
+    assert client.post(f'/api/orders/{order_id}/cancel').status_code == 200
+    with app.app_context():
+        status = db.session.execute(
+            text('SELECT status FROM stock_reservations WHERE reservation_id = :rid'),
+            {'rid': reservation.reservation_id},
+        ).scalar()
+    assert status == 'released'
+
+
+def test_complete_only_from_shipped(client, product, user_id):
+    with app.app_context():
+        order_id = OrderDB.create(user_id, [{'product_id': product, 'quantity': 1}], SHIPPING)
+    assert client.post(f'/api/orders/{order_id}/complete').status_code == 409
+    
+    with app.app_context():
+        OrderDB.update_status(order_id, 'shipped')
+    assert client.post(f'/api/orders/{order_id}/complete').status_code == 200
+    assert client.post(f'/api/orders/{order_id}/complete').status_code == 409
+    assert client.post(f'/api/orders/{order_id}/cancel').status_code == 409
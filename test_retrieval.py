@@ -0,0 +1,57 @@
+"""
+知识检索测试
+KnowledgeIndex 的打分与排序，以及 AI空气管家未命中意图关键词时经检索得到的路由（RETRIEVAL_MIN_SCORE）
+"""
+import pytest
+
+from app import air_butler
+from utils.air_butler import RETRIEVAL_MIN_SCORE, normalize_message
+from utils.retrieval import KnowledgeIndex, np, tokenize
+
+DOCUMENTS = [
+    ('aqi', '空气质量指数 AQI 反映空气污染程度'),
+    ('noise', '净化器噪音变大 检查滤网是否堵塞'),
+    ('filter', '滤网更换周期 一般三到六个月更换滤网'),
+]
+
+
+def test_tokenize_bigrams_and_words():
+    assert tokenize('PM2.5 甲醛') == ['pm2.5', '甲醛']
+    assert tokenize('噪音变大') == ['噪音', '音变', '变大']
+
+
+def test_index_ranks_and_limits():
+    index = KnowledgeIndex(DOCUMENTS)
+    hits = index.search('滤网多久更换', limit=3)
+    assert [key for key, _ in hits][0] == 'filter'
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert len(index.search('滤网', limit=1)) == 1
+    assert index.search('完全无关的问题') == []
+
+
+@pytest.mark.skipif(np is None, reason='未安装 numpy')
+def test_matrix_and_postings_scores_match(monkeypatch):
+    index = KnowledgeIndex(DOCUMENTS)
+    with_matrix = index.search('净化器滤网噪音', limit=3)
+    monkeypatch.setattr(index, '_matrix', None)
+    with_postings = index.search('净化器滤网噪音', limit=3)
+    assert [key for key, _ in with_postings] == [key for key, _ in with_matrix]
+    assert [score for _, score in with_postings] == pytest.approx([score for _, score in with_matrix], rel=1e-5)
+
+
+@pytest.mark.parametrize('message, intent, subtopic', [
+    ('AQI是什么', 'air_quality', 'aqi'),
+    ('净化器噪音变大怎么办？', 'troubleshoot', 'noise'),
+])
+def test_retrieval_routes_long_tail_questions(message, intent, subtopic):
+    route = air_butler.explain(message)
+    # 不含意图关键词，由检索命中知识库条目
+    assert route['keywords'] == []
+    assert (route['intent'], route['subtopic']) == (intent, subtopic)
+    assert air_butler.chat(message)['intent'] == intent
+
+
+def test_low_score_falls_back_to_general():
+    hits = air_butler._index.search(normalize_message('空气'))
+    assert hits and hits[0][1] < RETRIEVAL_MIN_SCORE == 2.5
+    assert air_butler.chat('空气')['intent'] == 'general'
@@ -0,0 +1,146 @@
+"""
+后台写队列测试
+不启动写线程，由测试直接驱动领取和执行，检查合并与重放
+"""
+import os
+import time
+
+import pytest
+
+from app import app
+from models import Post, User, db
+from utils.database import CommentDB, PostDB, stage_job
+from utils.write_coordinator import AbortWrite, write_coordinator
+from utils.write_queue import WriteQueue
+
+
+@pytest.fixture
+def post_id():
+    with app.app_context():
+        user = User(username='queue-tester')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(post_id=f'post_queue_{time.time_ns()}', user_id=user.id, title='标题', content='内容',
+                    category='general', views=0)
+        db.session.add(post)
+        db.session.commit()
+        return post.id
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WriteQueue()
+    queue.init_app(app, str(tmp_path / 'queue.jobs'))
+    # 视为写线程已在当前进程启动，入队只写队列库
+    queue._pid = os.getpid()
+    queue._conn = queue._connect()
+    yield queue
+    queue._conn.close()
+
+
+def _views(post_id: int) -> int:
+    with app.app_context():
+        return db.session.get(Post, post_id).views
+
+
+def _counts(post_id: int):
+    with app.app_context():
+        post = db.session.get(Post, post_id)
+        return post.likes, post.comment_count
+
+
+def _user(name: str) -> int:
+    with app.app_context():
+        user = User(username=f'{name}-{time.time_ns()}')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def _jobs(queue):
+    return queue._conn.execute('SELECT id, kind, key, amount, state FROM jobs ORDER BY id').fetchall()
+
+
+def test_pending_jobs_coalesce(queue, post_id):
+    for _ in range(3):
+        queue.enqueue('post_views', post_id, amount=2)
+    queue.enqueue('post_likes', post_id, amount=1)
+    
+    jobs = _jobs(queue)
+    assert [(job['kind'], job['amount']) for job in jobs] == [('post_views', 6), ('post_likes', 1)]
+    
+    queue._execute(queue._conn, queue._claim(queue._conn))
+    assert _views(post_id) == 6
+    assert _jobs(queue) == []
+
+
+def test_buffered_increments_coalesce(queue, post_id):
+    for _ in range(5):
+        queue.increment('post_views', post_id)
+    queue._enqueue_buffered(queue._conn)
+    
+    assert [(job['kind'], job['amount']) for job in _jobs(queue)] == [('post_views', 5)]
+    queue._execute(queue._conn, queue._claim(queue._conn))
+    assert _views(post_id) == 5
+
+
+def test_replayed_job_applies_once(queue, post_id):
+    queue.enqueue('post_views', post_id, amount=4)
+    claimed = queue._claim(queue._conn)
+    queue._execute(queue._conn, claimed)
+    assert _views(post_id) == 4
+    
+    # 主库已提交、队列库删除前进程退出：任务仍处于 running，租约过期后被重新领取
+    job = claimed[0]
+    queue._conn.execute('''
+        INSERT INTO jobs (id, kind, key, amount, state, claimed_at, run_at, created_at)
+        VALUES (?, ?, ?, ?, 'running', 0, 0, 0)
+    ''', (job['id'], job['kind'], job['key'], job['amount']))
+    queue._execute(queue._conn, queue._conn.execute('SELECT * FROM jobs').fetchall())
+    assert _views(post_id) == 4
+    assert _jobs(queue) == []
+
+
+def test_expired_claim_of_applied_job_is_dropped(queue, post_id):
+    queue.enqueue('post_views', post_id, amount=3)
+    claimed = queue._claim(queue._conn)
+    queue._execute(queue._conn, claimed)
+    
+    job = claimed[0]
+    queue._conn.execute('''
+        INSERT INTO jobs (id, kind, key, amount, state, claimed_at, run_at, created_at)
+        VALUES (?, ?, ?, ?, 'running', 0, 0, 0)
+    ''', (job['id'], job['kind'], job['key'], job['amount']))
+    # 同一帖子又有新的待执行任务，过期任务不能并入其中
+    queue.enqueue('post_views', post_id, amount=1)
+    queue._release_expired(queue._conn)
+    
+    assert [(job['amount'], job['state']) for job in _jobs(queue)] == [(1, 'pending')]
+    queue._execute(queue._conn, queue._claim(queue._conn))
+    assert _views(post_id) == 4
+
+
+def test_outbox_jobs_commit_with_main_write(queue, post_id):
+    users = [_user('liker') for _ in range(3)]
+    with app.app_context():
+        for user_id in users:
+            assert PostDB.toggle_like(post_id, user_id) is True
+        assert PostDB.toggle_like(post_id, users[0]) is False
+        CommentDB.create(post_id, users[1], '评论')
+    
+    queue._apply_outbox()
+    assert _counts(post_id) == (2, 1)
+    # 已执行的任务与计数在同一事务内删除，再次执行不会重复累加
+    queue._apply_outbox()
+    assert _counts(post_id) == (2, 1)
+
+
+def test_outbox_job_rolls_back_with_main_write(queue, post_id):
+    def write(cursor):
+        stage_job(cursor, 'post_likes', post_id, 1)
+        raise AbortWrite(None)
+    
+    with app.app_context():
+        write_coordinator.run(write)
+    queue._apply_outbox()
+    assert _counts(post_id) == (0, 0)
@@ -2,10 +2,106 @@
 AI空气管家 - 智能客服系统
 森系智韵智能空气管理平台核心模块
 """
+import json
 import re
-from typing import Dict, List, Any, Optional
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from types import MappingProxyType
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+from utils.metrics import registry
+from utils.retrieval import KnowledgeIndex
+
+# 未命中任何子话题规则时使用的子话题（各意图的概览/菜单回复）
+DEFAULT_SUBTOPIC = 'default'
+
+# 未命中意图关键词时按知识检索回答，最高 BM25 得分低于该值时仍使用通用回复
+RETRIEVAL_MIN_SCORE = 2.5
+
+# 回复缓存：LRU 条目数上限；超过该长度的消息不写入缓存（长消息很少重复）
+RESPONSE_CACHE_SIZE = 2048
+MAX_CACHED_MESSAGE_CHARS = 100
+
+# 内存中保留的最近对话条数（完整记录见 utils.analytics 事件日志）
+CONVERSATION_HISTORY_LIMIT = 200
+
+def normalize_message(message: str) -> str:
+    """
+    规范化用户消息：全角转半角（NFKC）、统一大小写、连续空白合并为一个空格、去掉首尾的空白、标点和符号
+
+    意图识别与检索都基于规范化后的消息，规范化结果相同的消息回复一定相同，可以共用缓存
+    """
+    if not unicodedata.is_normalized('NFKC', message):
+        message = unicodedata.normalize('NFKC', message)
+    text = ' '.join(message.casefold().split())
+    start, end = 0, len(text)
+    while start < end and not text[start].isalnum():
+        start += 1
+    while end > start and not text[end - 1].isalnum():
+        end -= 1
+    return text[start:end]
+
+
+class ResponseCache:
+    """
+    AI空气管家回复缓存：消息 -> 路由表条目 (回复字典, JSON 字节串)
+
+    预热条目（各类快捷回复）常驻不淘汰，随路由表编译时生成；其余消息按 LRU 保留 max_entries 条。
+    原文和规范化后的消息都作为键：原样重复的消息（如点击快捷回复）不需要规范化即可命中
+    """
+    
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pinned: Dict[str, Tuple[Dict, bytes]] = {}
+        self._entries: OrderedDict = OrderedDict()
+    
+    def pin(self, entries: Dict[str, Tuple[Dict, bytes]]):
+        """替换预热条目并清空 LRU（路由表重新编译后旧条目失效）"""
+        self._pinned = MappingProxyType(dict(entries))
+        self.clear()
+    
+    def _get(self, key: str) -> Optional[Tuple[Dict, bytes]]:
+        entry = self._pinned.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+        return entry
+    
+    def lookup(self, message: str) -> Tuple[str, Optional[Tuple[Dict, bytes]]]:
+        """返回 (规范化后的消息, 缓存条目)；未命中时条目为 None，由调用方生成后 put"""
+        entry = self._get(message)
+        key = message
+        if entry is None:
+            key = normalize_message(message)
+            if key != message:
+                entry = self._get(key)
+                if entry is not None:
+                    self.put(message, entry)
+        registry.inc('senxi_butler_cache_total', help_text='AI空气管家回复缓存查询次数',
+                     result='miss' if entry is None else 'hit')
+        return key, entry
+    
+    def put(self, key: str, entry: Tuple[Dict, bytes]):
+        if len(key) > MAX_CACHED_MESSAGE_CHARS:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._entries)
+
 
 class AirButler:
     """
@@ -181,95 +277,230 @@ class AirButler:
         }
     }
     
+    # 子话题匹配规则：意图 -> ((子话题, 关键词组), ...)，按顺序匹配
+    # 每个关键词组中至少出现一个关键词即满足该组，所有组都满足时命中；都不命中时为 DEFAULT_SUBTOPIC
+    SUBTOPIC_RULES = {
+        'product_inquiry': (
+            ('mini', (('mini', '入门', '便宜'),)),
+            ('pro', (('pro', '除甲醛', '智能'),)),
+            ('max', (('max', '大', '全屋', '旗舰'),)),
+            ('uv', (('婴儿', '宝宝', '杀菌', '消毒'),)),
+        ),
+        'usage_guide': (
+            ('app_connect', (('app', '连接', '配对'),)),
+            ('sleep_mode', (('睡眠',),)),
+            ('auto_mode', (('自动',),)),
+        ),
+        'troubleshoot': (
+            ('noise', (('噪音', '声音大'),)),
+            ('display_flash', (('闪烁', '显示'),)),
+            ('weak_airflow', (('风',), ('小', '弱'))),
+            ('filter_indicator', (('滤芯',), ('灯', '亮'))),
+        ),
+        'filter_replace': (
+            ('lifespan', (('多久', '寿命', '更换'),)),
+        ),
+        'air_quality': (
+            ('aqi', (('aqi', '指数'),)),
+            ('pm25', (('pm2.5', 'pm'),)),
+            ('formaldehyde', (('甲醛',),)),
+        ),
+    }
+    
+    # 聊天窗口的快捷按钮（与 static/js/main.js 中 CONFIG.QUICK_REPLIES 保持一致），回复缓存预热用
+    WIDGET_QUICK_REPLIES = ('推荐产品', '空气知识', '售后服务', '联系客服')
+    
+    # 产品推荐话术：子话题 -> (开头, 结尾)
+    PRODUCT_PITCHES = {
+        'mini': ('推荐您了解我们的', '这款产品性价比很高，非常适合小空间使用。'),
+        'pro': ('为您推荐', '这是我们的明星产品，除甲醛效果出色，支持智能控制。'),
+        'max': ('隆重推荐', '这是我们的旗舰产品，适合大空间和追求极致净化效果的用户。'),
+        'uv': ('特别推荐', '这款产品通过医疗级认证，UV-C消毒功能可有效杀灭细菌病毒，特别适合有婴幼儿或免疫力较弱人群的家庭。'),
+    }
+    
     def __init__(self):
         """初始化AI空气管家"""
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=CONVERSATION_HISTORY_LIMIT)
+        self.response_cache = ResponseCache()
+        self._articles: Tuple[Dict, ...] = ()
+        self._products: Tuple[Dict, ...] = ()
+        self._compile_routes()
     
-    def chat(self, user_message: str, context: Dict = None) -> Dict:
+    def load_documents(self, articles: List[Dict], products: List[Dict]):
+        """加入空气研究院文章和产品介绍，重新编译路由表与检索索引"""
+        self._articles = tuple(articles)
+        self._products = tuple(products)
+        self._compile_routes()
+    
+    def freeze(self):
+        """按只读化后的知识库重新编译路由表（在 master 进程预加载时调用）"""
+        self._compile_routes()
+        self._routes = MappingProxyType(self._routes)
+    
+    # ==================== 路由表 ====================
+    
+    def _renderers(self) -> Dict[str, Callable[[str], Dict]]:
+        return {
+            'product_inquiry': self._render_product_inquiry,
+            'usage_guide': self._render_usage_guide,
+            'troubleshoot': self._render_troubleshoot,
+            'filter_replace': self._render_filter_inquiry,
+            'air_quality': self._render_air_quality,
+            'order_service': self._render_order_service,
+            'general': self._render_general,
+        }
+    
+    def _compile_routes(self):
         """
-        处理用户消息并返回回复
+        编译路由表：(意图, 子话题) -> (回复字典, JSON 字节串)，并建立检索索引
+
+        知识库固定，所有回复在启动时生成并序列化，对话时只需识别意图、匹配子话题后查表。
+        检索索引的文档即路由表中的回复（通用回复除外）以及文章、产品介绍，检索命中后同样查表
+        """
+        routes = {}
+        documents = []
+        for intent, render in self._renderers().items():
+            subtopics = [subtopic for subtopic, _ in self.SUBTOPIC_RULES.get(intent, ())]
+            for subtopic in subtopics + [DEFAULT_SUBTOPIC]:
+                routes[(intent, subtopic)] = render(subtopic)
+                if intent != 'general':
+                    documents.append(((intent, subtopic), routes[(intent, subtopic)]['message']))
         
-        Args:
-            user_message: 用户输入的消息
-            context: 上下文信息（设备信息、历史记录等）
+        for article in self._articles:
+            key = ('knowledge', f"article:{article['id']}")
+            routes[key] = self._render_article(article)
+            documents.append((key, f"{article['title']} {article['category']} {article['summary']}"))
+        for product in self._products:
+            key = ('knowledge', f"product:{product['id']}")
+            routes[key] = self._render_product(product)
+            highlights = ' '.join(f"{item['title']} {item['desc']}" for item in product.get('highlights', ()))
+            documents.append((key, ' '.join([product['name'], product.get('series', ''), *product.get('tags', ()),
+                                             *product.get('features', ()), highlights])))
         
-        Returns:
-            回复消息字典
-        """
-        # 识别用户意图
-        intent = self._identify_intent(user_message)
+        self._routes: Dict[Tuple[str, str], Tuple[Dict, bytes]] = {
+            key: (payload, json.dumps(payload, ensure_ascii=False).encode()) for key, payload in routes.items()
+        }
+        self._index = KnowledgeIndex(documents)
         
-        # 根据意图生成回复
-        response = self._generate_response(intent, user_message, context)
+        # 预热回复缓存：聊天窗口按钮和各回复附带的快捷回复
+        prewarm = set(self.WIDGET_QUICK_REPLIES)
+        for payload, _ in self._routes.values():
+            prewarm.update(payload.get('quick_replies', ()))
+        pinned = {}
+        for message in prewarm:
+            key = normalize_message(message)
+            pinned[key] = pinned[message] = self._resolve(key)
+        self.response_cache.pin(pinned)
+    
+    def _resolve(self, key: str) -> Tuple[Dict, bytes]:
+        """按规范化后的消息查路由表：识别意图、匹配子话题，未命中意图关键词时检索"""
+        intent = self._identify_intent(key)
+        if intent is None:
+            return self._routes[self._retrieve(key)]
+        return self._routes[(intent, self._match_subtopic(intent, key))]
+    
+    def _route(self, user_message: str) -> Tuple[Dict, bytes]:
+        key, entry = self.response_cache.lookup(user_message)
+        if entry is None:
+            entry = self._resolve(key)
+            self.response_cache.put(key, entry)
+            if key != user_message:
+                self.response_cache.put(user_message, entry)
         
         # 记录对话历史
+        timestamp = datetime.now().isoformat()
         self.conversation_history.append({
             'role': 'user',
             'content': user_message,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp
         })
         self.conversation_history.append({
             'role': 'assistant',
-            'content': response['message'],
-            'timestamp': datetime.now().isoformat()
+            'content': entry[0]['message'],
+            'timestamp': timestamp
         })
         
-        return response
+        return entry
     
-    def _identify_intent(self, message: str) -> str:
-        """识别用户意图"""
-        message_lower = message.lower()
-        
+    def chat(self, user_message: str, context: Dict = None) -> Dict:
+        """
+        处理用户消息并返回回复
+
+        Args:
+            user_message: 用户输入的消息
+            context: 上下文信息（设备信息、历史记录等）
+
+        Returns:
+            回复消息字典（路由表中的共享对象，调用方不应修改）
+        """
+        return self._route(user_message)[0]
+    
+    def chat_json(self, user_message: str, context: Dict = None) -> bytes:
+        """与 chat 相同，直接返回预先序列化的 JSON 响应体"""
+        return self._route(user_message)[1]
+    
+    def _identify_intent(self, message_lower: str) -> Optional[str]:
+        """识别用户意图（message_lower 为小写后的消息），未命中任何关键词时返回 None"""
+        contains = message_lower.__contains__
         intent_scores = {}
         for intent, keywords in self.INTENT_KEYWORDS.items():
-            score = sum(1 for keyword in keywords if keyword in message_lower)
+            score = sum(map(contains, keywords))
             if score > 0:
                 intent_scores[intent] = score
         
         if intent_scores:
             return max(intent_scores, key=intent_scores.get)
         
-        return 'general'
+        return None
     
-    def _generate_response(self, intent: str, message: str, context: Dict = None) -> Dict:
-        """根据意图生成回复"""
-        
-        if intent == 'product_inquiry':
-            return self._handle_product_inquiry(message)
-        elif intent == 'usage_guide':
-            return self._handle_usage_guide(message)
-        elif intent == 'troubleshoot':
-            return self._handle_troubleshoot(message)
-        elif intent == 'filter_replace':
-            return self._handle_filter_inquiry(message)
-        elif intent == 'air_quality':
-            return self._handle_air_quality(message)
-        elif intent == 'order_service':
-            return self._handle_order_service(message)
-        else:
-            return self._handle_general(message)
+    def _match_subtopic(self, intent: str, message_lower: str) -> str:
+        """按 SUBTOPIC_RULES 匹配子话题"""
+        contains = message_lower.__contains__
+        for subtopic, groups in self.SUBTOPIC_RULES.get(intent, ()):
+            if all(any(map(contains, group)) for group in groups):
+                return subtopic
+        return DEFAULT_SUBTOPIC
     
-    def _handle_product_inquiry(self, message: str) -> Dict:
-        """处理产品咨询"""
-        message_lower = message.lower()
-        
-        # 检查是否询问特定产品
-        if 'mini' in message_lower or '入门' in message_lower or '便宜' in message_lower:
-            product = self.KNOWLEDGE_BASE['products']['mini']
-            response_text = f"推荐您了解我们的{product['name']}：\n\n{product['features']}\n\n适用场景：{product['suitable']}\n价格：{product['price']}\n\n这款产品性价比很高，非常适合小空间使用。"
-        
-        elif 'pro' in message_lower or '除甲醛' in message_lower or '智能' in message_lower:
-            product = self.KNOWLEDGE_BASE['products']['pro']
-            response_text = f"为您推荐{product['name']}：\n\n{product['features']}\n\n适用场景：{product['suitable']}\n价格：{product['price']}\n\n这是我们的明星产品，除甲醛效果出色，支持智能控制。"
-        
-        elif 'max' in message_lower or '大' in message_lower or '全屋' in message_lower or '旗舰' in message_lower:
-            product = self.KNOWLEDGE_BASE['products']['max']
-            response_text = f"隆重推荐{product['name']}：\n\n{product['features']}\n\n适用场景：{product['suitable']}\n价格：{product['price']}\n\n这是我们的旗舰产品，适合大空间和追求极致净化效果的用户。"
-        
-        elif '婴儿' in message_lower or '宝宝' in message_lower or '杀菌' in message_lower or '消毒' in message_lower:
-            product = self.KNOWLEDGE_BASE['products']['uv']
-            response_text = f"特别推荐{product['name']}：\n\n{product['features']}\n\n适用场景：{product['suitable']}\n价格：{product['price']}\n\n这款产品通过医疗级认证，UV-C消毒功能可有效杀灭细菌病毒，特别适合有婴幼儿或免疫力较弱人群的家庭。"
-        
+    def _search(self, message_lower: str) -> Optional[Tuple[str, str]]:
+        """在知识库、文章和产品介绍中检索，返回得分最高且达到阈值的文档对应的路由键"""
+        hits = self._index.search(message_lower)
+        if hits and hits[0][1] >= RETRIEVAL_MIN_SCORE:
+            return hits[0][0]
+        return None
+    
+    def _retrieve(self, message_lower: str) -> Tuple[str, str]:
+        key = self._search(message_lower)
+        registry.inc('senxi_butler_retrieval_total', help_text='AI空气管家知识检索次数',
+                     result='miss' if key is None else 'hit')
+        return key or ('general', DEFAULT_SUBTOPIC)
+    
+    def explain(self, user_message: str) -> Dict:
+        """
+        说明一条消息的路由过程（供对话分析使用，不计入缓存和检索指标）
+
+        Returns:
+            message（规范化后的消息）、intent、subtopic、keywords（命中的意图关键词，经检索或通用回复时为空）
+        """
+        key = normalize_message(user_message)
+        intent = self._identify_intent(key)
+        if intent is None:
+            intent, subtopic = self._search(key) or ('general', DEFAULT_SUBTOPIC)
+            return {'message': key, 'intent': intent, 'subtopic': subtopic, 'keywords': []}
+        return {
+            'message': key,
+            'intent': intent,
+            'subtopic': self._match_subtopic(intent, key),
+            'keywords': [keyword for keyword in self.INTENT_KEYWORDS[intent] if keyword in key],
+        }
+    
+    # ==================== 回复生成（编译路由表时调用） ====================
+    
+    def _render_product_inquiry(self, subtopic: str) -> Dict:
+        """产品咨询"""
+        if subtopic in self.PRODUCT_PITCHES:
+            product = self.KNOWLEDGE_BASE['products'][subtopic]
+            opening, closing = self.PRODUCT_PITCHES[subtopic]
+            response_text = f"{opening}{product['name']}：\n\n{product['features']}\n\n适用场景：{product['suitable']}\n价格：{product['price']}\n\n{closing}"
         else:
             response_text = """我来帮您选择合适的产品！我们有以下系列：
 
@@ -286,7 +517,7 @@ class AirButler:
 医疗级杀菌，母婴优选
 
 您可以告诉我您的具体需求（房间大小、主要问题、预算等），我来为您精准推荐！"""
-        
+
         return {
             'message': response_text,
             'intent': 'product_inquiry',
@@ -294,16 +525,10 @@ class AirButler:
             'show_products': True
         }
     
-    def _handle_usage_guide(self, message: str) -> Dict:
-        """处理使用指南"""
-        message_lower = message.lower()
-        
-        if 'app' in message_lower or '连接' in message_lower or '配对' in message_lower:
-            response_text = self.KNOWLEDGE_BASE['usage_guides']['app_connect']
-        elif '睡眠' in message_lower:
-            response_text = self.KNOWLEDGE_BASE['usage_guides']['sleep_mode']
-        elif '自动' in message_lower:
-            response_text = self.KNOWLEDGE_BASE['usage_guides']['auto_mode']
+    def _render_usage_guide(self, subtopic: str) -> Dict:
+        """使用指南"""
+        if subtopic in self.KNOWLEDGE_BASE['usage_guides']:
+            response_text = self.KNOWLEDGE_BASE['usage_guides'][subtopic]
         else:
             response_text = """我可以帮您解答使用问题，请问您想了解：
 
@@ -314,25 +539,17 @@ class AirButler:
 5. 🔧 滤芯更换方法
 
 请选择或直接描述您的问题。"""
-        
+
         return {
             'message': response_text,
             'intent': 'usage_guide',
             'quick_replies': self.QUICK_REPLIES['usage']
         }
     
-    def _handle_troubleshoot(self, message: str) -> Dict:
-        """处理故障排查"""
-        message_lower = message.lower()
-        
-        if '噪音' in message_lower or '声音大' in message_lower:
-            response_text = self.KNOWLEDGE_BASE['troubleshooting']['noise']
-        elif '闪烁' in message_lower or '显示' in message_lower:
-            response_text = self.KNOWLEDGE_BASE['troubleshooting']['display_flash']
-        elif '风' in message_lower and ('小' in message_lower or '弱' in message_lower):
-            response_text = self.KNOWLEDGE_BASE['troubleshooting']['weak_airflow']
-        elif '滤芯' in message_lower and ('灯' in message_lower or '亮' in message_lower):
-            response_text = self.KNOWLEDGE_BASE['troubleshooting']['filter_indicator']
+    def _render_troubleshoot(self, subtopic: str) -> Dict:
+        """故障排查"""
+        if subtopic in self.KNOWLEDGE_BASE['troubleshooting']:
+            response_text = self.KNOWLEDGE_BASE['troubleshooting'][subtopic]
         else:
             response_text = """我来帮您排查问题。常见故障及解决方案：
 
@@ -344,7 +561,7 @@ class AirButler:
 请描述具体症状，我来为您提供针对性解决方案。
 
 如果问题无法解决，可以转接人工客服为您服务。"""
-        
+
         return {
             'message': response_text,
             'intent': 'troubleshoot',
@@ -352,15 +569,13 @@ class AirButler:
             'show_human_service': True
         }
     
-    def _handle_filter_inquiry(self, message: str) -> Dict:
-        """处理滤芯相关咨询"""
-        message_lower = message.lower()
-        
-        if '多久' in message_lower or '寿命' in message_lower or '更换' in message_lower:
-            response_text = f"**滤芯更换周期**\n\n{self.KNOWLEDGE_BASE['filter_info']['lifespan']}\n\n**滤芯类型说明：**\n"
-            for filter_type, desc in self.KNOWLEDGE_BASE['filter_info']['types'].items():
-                response_text += f"• {desc}\n"
-            response_text += f"\n{self.KNOWLEDGE_BASE['filter_info']['purchase']}"
+    def _render_filter_inquiry(self, subtopic: str) -> Dict:
+        """滤芯相关咨询"""
+        if subtopic == 'lifespan':
+            filter_info = self.KNOWLEDGE_BASE['filter_info']
+            response_text = f"**滤芯更换周期**\n\n{filter_info['lifespan']}\n\n**滤芯类型说明：**\n"
+            response_text += ''.join(f"• {desc}\n" for desc in filter_info['types'].values())
+            response_text += f"\n{filter_info['purchase']}"
         else:
             response_text = """**滤芯知识小课堂**
 
@@ -377,25 +592,23 @@ class AirButler:
 • 重污染地区建议缩短更换周期
 • 请购买官方原装滤芯
 • 更换后记得重置滤芯计时器"""
-        
+
         return {
             'message': response_text,
             'intent': 'filter_replace',
             'quick_replies': ['如何购买原装滤芯？', '滤芯更换步骤', '如何重置滤芯计时器？']
         }
     
-    def _handle_air_quality(self, message: str) -> Dict:
-        """处理空气质量咨询"""
-        message_lower = message.lower()
-        
-        if 'aqi' in message_lower or '指数' in message_lower:
+    def _render_air_quality(self, subtopic: str) -> Dict:
+        """空气质量咨询"""
+        air_quality = self.KNOWLEDGE_BASE['air_quality']
+        if subtopic == 'aqi':
             response_text = "**空气质量指数(AQI)等级说明：**\n\n"
-            for level, desc in self.KNOWLEDGE_BASE['air_quality']['aqi_levels'].items():
-                response_text += f"• AQI {level}：{desc}\n"
-        elif 'pm2.5' in message_lower or 'pm' in message_lower:
-            response_text = f"**PM2.5知识**\n\n{self.KNOWLEDGE_BASE['air_quality']['pm25']}\n\n净界者空气净化器采用HEPA H13滤网，对PM2.5过滤效率达99.97%。"
-        elif '甲醛' in message_lower:
-            response_text = f"**甲醛知识**\n\n{self.KNOWLEDGE_BASE['air_quality']['formaldehyde']}\n\n推荐使用森林呼吸Pro或清新之风Max，配备专业除醛滤网和甲醛数显功能。"
+            response_text += ''.join(f"• AQI {level}：{desc}\n" for level, desc in air_quality['aqi_levels'].items())
+        elif subtopic == 'pm25':
+            response_text = f"**PM2.5知识**\n\n{air_quality['pm25']}\n\n净界者空气净化器采用HEPA H13滤网，对PM2.5过滤效率达99.97%。"
+        elif subtopic == 'formaldehyde':
+            response_text = f"**甲醛知识**\n\n{air_quality['formaldehyde']}\n\n推荐使用森林呼吸Pro或清新之风Max，配备专业除醛滤网和甲醛数显功能。"
         else:
             response_text = """**空气质量小百科**
 
@@ -410,15 +623,15 @@ class AirButler:
 151-200 中度 | 201-300 重度 | 300+ 严重
 
 您想了解哪方面的详细信息？"""
-        
+
         return {
             'message': response_text,
             'intent': 'air_quality',
             'quick_replies': ['什么是PM2.5？', '甲醛危害有哪些？', 'AQI指数怎么看？']
         }
     
-    def _handle_order_service(self, message: str) -> Dict:
-        """处理订单服务"""
+    def _render_order_service(self, subtopic: str) -> Dict:
+        """订单服务"""
         response_text = """**订单与售后服务**
 
 📦 **物流查询**
@@ -436,7 +649,7 @@ class AirButler:
 • 在线客服：APP内咨询
 
 如需人工服务，请点击下方按钮转接。"""
-        
+
         return {
             'message': response_text,
             'intent': 'order_service',
@@ -444,8 +657,8 @@ class AirButler:
             'show_human_service': True
         }
     
-    def _handle_general(self, message: str) -> Dict:
-        """处理通用问题"""
+    def _render_general(self, subtopic: str) -> Dict:
+        """通用问题"""
         response_text = """您好！我是森系智韵的AI空气管家 🌿
 
 我可以帮您：
@@ -456,13 +669,38 @@ class AirButler:
 • 🌡️ **空气知识** - 空气质量科普
 
 请问有什么可以帮您的？"""
-        
+
         return {
             'message': response_text,
             'intent': 'general',
             'quick_replies': self.QUICK_REPLIES['general']
         }
     
+    def _render_article(self, article: Dict) -> Dict:
+        """检索命中的空气研究院文章"""
+        response_text = (f"空气研究院的这篇文章或许能解答您的问题：\n\n**{article['title']}**\n{article['summary']}\n\n"
+                         f"分类：{article['category']}　发布日期：{article['date']}\n欢迎前往空气研究院阅读全文。")
+        return {
+            'message': response_text,
+            'intent': 'knowledge',
+            'quick_replies': self.QUICK_REPLIES['general'],
+            'article': {'id': article['id'], 'title': article['title'], 'url': '/research'}
+        }
+    
+    def _render_product(self, product: Dict) -> Dict:
+        """检索命中的产品介绍"""
+        features = ''.join(f"• {feature}\n" for feature in product.get('features', ()))
+        response_text = (f"为您找到**{product['name']}**（¥{product['price']}）：\n\n{features}\n"
+                         f"适用面积：{product.get('applicable_area', '-')}　PM2.5 CADR：{product.get('cadr_pm25', '-')}m³/h")
+        return {
+            'message': response_text,
+            'intent': 'knowledge',
+            'quick_replies': self.QUICK_REPLIES['product'],
+            'show_products': True,
+            'product': {'id': product['id'], 'name': product['name'], 'price': product['price'],
+                        'url': f"/product/{product['id']}"}
+        }
+    
     def get_quick_replies(self, category: str = 'general') -> List[str]:
         """获取快捷回复选项"""
         return self.QUICK_REPLIES.get(category, self.QUICK_REPLIES['general'])
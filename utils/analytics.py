@@ -0,0 +1,343 @@
+"""
+对话分析事件日志
+记录 AI空气管家和智能导购的每次交互（意图、子话题、匹配关键词、导购步骤、耗时），
+用于统计热门意图和导购各步骤的流失：
+
+- 只追加：事件写入独立的 SQLite 事件库（默认 <主库文件名>.events），不影响主库的写入
+- 异步批量：请求中只把事件追加到内存缓冲区（不加锁、不做 I/O），每个进程的后台线程每秒批量写入一次；
+  管家消息的规范化、子话题和关键词匹配也在后台线程中完成
+- 有界：缓冲区超过 MAX_BUFFERED 条时丢弃新事件并计数（senxi_analytics_events_dropped_total），不会拖慢请求
+- 聚合：aggregate() 按天汇总为 intent_daily（各意图/子话题的消息数与耗时）
+  和 guide_funnel_daily（导购各步骤到达的会话数、转化率与流失数），可重复执行
+
+用法（汇总某天，默认今天）：
+    python -m utils.analytics --date 2024-12-15 --keep-days 30
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from models import db
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 1000
+MAX_BUFFERED = 50000
+MAX_MESSAGE_CHARS = 200  # 事件中保存的管家消息长度上限
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS conversation_events (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        source TEXT NOT NULL,
+        session TEXT,
+        intent TEXT,
+        subtopic TEXT,
+        step INTEGER,
+        next_step INTEGER,
+        keywords TEXT,
+        message TEXT,
+        latency_ms REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_events_source_ts ON conversation_events (source, ts);
+
+    CREATE TABLE IF NOT EXISTS intent_daily (
+        day TEXT NOT NULL,
+        intent TEXT NOT NULL,
+        subtopic TEXT NOT NULL,
+        messages INTEGER NOT NULL,
+        avg_latency_ms REAL NOT NULL,
+        p95_latency_ms REAL NOT NULL,
+        PRIMARY KEY (day, intent, subtopic)
+    );
+
+    CREATE TABLE IF NOT EXISTS guide_funnel_daily (
+        day TEXT NOT NULL,
+        step INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        sessions INTEGER NOT NULL,
+        conversion REAL NOT NULL,
+        drop_off INTEGER NOT NULL,
+        PRIMARY KEY (day, step)
+    );
+'''
+
+_INSERT_SQL = '''
+    INSERT INTO conversation_events
+        (ts, source, session, intent, subtopic, step, next_step, keywords, message, latency_ms)
+    VALUES (:ts, :source, :session, :intent, :subtopic, :step, :next_step, :keywords, :message, :latency_ms)
+'''
+
+
+class EventLog:
+    """
+    对话事件日志
+
+    用法:
+        event_log.record('butler', latency, message=user_message, intent=response['intent'])
+        event_log.record('guide', latency, session=state['session_id'], step=1, next_step=2)
+    """
+    
+    def __init__(self):
+        self.path: Optional[str] = None
+        # 按来源补全事件字段（在后台线程中调用），如管家消息的规范化与关键词匹配
+        self.enrichers: Dict[str, Callable[[Dict], None]] = {}
+        self._buffer: deque = deque()
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+    
+    def init_app(self, app, path: str):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    # ==================== 记录 ====================
+    
+    def record(self, source: str, latency: float, **fields):
+        """追加一条事件（latency 单位为秒）；只写入内存缓冲区，由后台线程批量落盘"""
+        if self.path is None:
+            return
+        if self._pid != os.getpid():
+            self._ensure_started()
+        if len(self._buffer) >= MAX_BUFFERED:
+            self._dropped += 1
+            return
+        fields['source'] = source
+        fields['ts'] = time.time()
+        fields['latency_ms'] = latency * 1000
+        self._buffer.append(fields)
+    
+    def flush(self) -> int:
+        """把缓冲区中的事件全部写入事件库，返回写入条数"""
+        written = 0
+        with self._lock:
+            with closing(self._connect()) as conn:
+                while self._buffer:
+                    batch = []
+                    while self._buffer and len(batch) < BATCH_SIZE:
+                        batch.append(self._row(self._buffer.popleft()))
+                    with conn:
+                        conn.executemany(_INSERT_SQL, batch)
+                    written += len(batch)
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            registry.inc('senxi_analytics_events_dropped_total', dropped,
+                         help_text='缓冲区已满而丢弃的对话事件数')
+        if written:
+            registry.inc('senxi_analytics_events_total', written, help_text='写入事件库的对话事件数')
+        return written
+    
+    def _row(self, event: Dict) -> Dict:
+        enrich = self.enrichers.get(event['source'])
+        if enrich is not None:
+            try:
+                enrich(event)
+            except Exception:
+                logger.exception('对话事件补全失败')
+        keywords = event.get('keywords')
+        return {
+            'ts': event['ts'],
+            'source': event['source'],
+            'session': event.get('session'),
+            'intent': event.get('intent'),
+            'subtopic': event.get('subtopic'),
+            'step': event.get('step'),
+            'next_step': event.get('next_step'),
+            'keywords': json.dumps(keywords, ensure_ascii=False) if keywords else None,
+            'message': (event.get('message') or '')[:MAX_MESSAGE_CHARS] or None,
+            'latency_ms': event['latency_ms'],
+        }
+    
+    # ==================== 后台线程 ====================
+    
+    def _ensure_started(self):
+        """按进程启动写线程（gunicorn preload 时 master 中不启动，fork 后在各 worker 中启动）"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='analytics', daemon=True)
+            self._thread.start()
+    
+    def _reset_after_fork(self):
+        # 子进程不写父进程缓冲区中的事件（父进程自己会写入）
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._buffer = deque()
+        self._dropped = 0
+        self._thread = None
+    
+    def _run(self):
+        while not self._stopping.wait(FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('对话事件写入失败')
+    
+    def stop(self):
+        """停止写线程并写入剩余事件"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(FLUSH_INTERVAL * 5)
+        self._pid = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('对话事件写入失败')
+
+
+# 全局事件日志
+event_log = EventLog()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=event_log._reset_after_fork)
+
+
+def init_analytics(app, butler=None):
+    """
+    初始化事件库并注册退出时写入剩余事件；传入 butler 时管家事件在后台补全子话题和匹配关键词
+
+    配置项：
+        ANALYTICS_DATABASE: 事件库文件路径，默认与主库同目录的 <主库文件名>.events
+        ANALYTICS_ENABLED: 是否记录对话事件，默认 True
+    """
+    with app.app_context():
+        app.config.setdefault('ANALYTICS_DATABASE', f'{db.engine.url.database}.events')
+    app.config.setdefault('ANALYTICS_ENABLED', True)
+    if not app.config['ANALYTICS_ENABLED']:
+        return
+    if butler is not None:
+        event_log.enrichers['butler'] = lambda event: event.update(butler.explain(event['message']))
+    event_log.init_app(app, app.config['ANALYTICS_DATABASE'])
+    atexit.register(event_log.stop)
+
+
+# ==================== 聚合 ====================
+
+def _day_range(day: date):
+    start = datetime.combine(day, datetime.min.time()).timestamp()
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+    return start, end
+
+
+def aggregate(conn: sqlite3.Connection, day: date, step_names: Dict[int, str] = None) -> Dict[str, List[Dict]]:
+    """
+    汇总某天（本地时间）的事件，写入 intent_daily 与 guide_funnel_daily（覆盖当天已有结果）
+
+    导购漏斗按会话统计：会话到达的最大步骤为其全部事件中 next_step 的最大值，
+    到达第 n 步的会话数包含走得更远的会话；流失数 = 到达本步 - 到达下一步（最后一步为 0）
+    """
+    start, end = _day_range(day)
+    label = day.isoformat()
+    step_names = step_names or {}
+    
+    intents = [dict(row) for row in conn.execute('''
+        WITH ranked AS (
+            SELECT COALESCE(intent, '') AS intent, COALESCE(subtopic, '') AS subtopic, latency_ms,
+                   ROW_NUMBER() OVER (PARTITION BY intent, subtopic ORDER BY latency_ms) AS rn,
+                   COUNT(*) OVER (PARTITION BY intent, subtopic) AS n
+            FROM conversation_events
+            WHERE source = 'butler' AND ts >= ? AND ts < ?
+        )
+        SELECT intent, subtopic, MAX(n) AS messages, ROUND(AVG(latency_ms), 3) AS avg_latency_ms,
+               ROUND(MIN(CASE WHEN rn >= 0.95 * n THEN latency_ms END), 3) AS p95_latency_ms
+        FROM ranked
+        GROUP BY intent, subtopic
+        ORDER BY messages DESC
+    ''', (start, end))]
+    
+    reached_counts = dict(conn.execute('''
+        SELECT reached, COUNT(*) FROM (
+            SELECT MAX(next_step) AS reached
+            FROM conversation_events
+            WHERE source = 'guide' AND session IS NOT NULL AND ts >= ? AND ts < ?
+            GROUP BY session
+        )
+        GROUP BY reached
+    ''', (start, end)).fetchall())
+    funnel = []
+    if reached_counts:
+        last = max(max(reached_counts), max(step_names, default=0))
+        sessions = [sum(count for reached, count in reached_counts.items() if reached >= step)
+                    for step in range(last + 2)]
+        started = sessions[1] or 1
+        for step in range(1, last + 1):
+            funnel.append({
+                'step': step,
+                'name': step_names.get(step, str(step)),
+                'sessions': sessions[step],
+                'conversion': round(sessions[step] / started, 4),
+                'drop_off': sessions[step] - sessions[step + 1] if step < last else 0,
+            })
+    
+    with conn:
+        conn.execute('DELETE FROM intent_daily WHERE day = ?', (label,))
+        conn.executemany('''
+            INSERT INTO intent_daily (day, intent, subtopic, messages, avg_latency_ms, p95_latency_ms)
+            VALUES (:day, :intent, :subtopic, :messages, :avg_latency_ms, :p95_latency_ms)
+        ''', [dict(row, day=label) for row in intents])
+        conn.execute('DELETE FROM guide_funnel_daily WHERE day = ?', (label,))
+        conn.executemany('''
+            INSERT INTO guide_funnel_daily (day, step, name, sessions, conversion, drop_off)
+            VALUES (:day, :step, :name, :sessions, :conversion, :drop_off)
+        ''', [dict(row, day=label) for row in funnel])
+    return {'intents': intents, 'funnel': funnel}
+
+
+def prune(conn: sqlite3.Connection, before: date) -> int:
+    """删除 before（本地时间）之前的原始事件，已汇总的结果保留"""
+    with conn:
+        return conn.execute('DELETE FROM conversation_events WHERE ts < ?', (_day_range(before)[0],)).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description='汇总对话分析事件')
+    parser.add_argument('--date', help='汇总日期 YYYY-MM-DD（本地时间），默认今天')
+    parser.add_argument('--keep-days', type=int, help='只保留最近 N 天的原始事件')
+    args = parser.parse_args()
+    
+    from app import app
+    from utils.smart_guide import SmartGuideSystem
+    day = date.fromisoformat(args.date) if args.date else date.today()
+    with closing(sqlite3.connect(app.config['ANALYTICS_DATABASE'], timeout=30)) as conn:
+        conn.row_factory = sqlite3.Row
+        result = aggregate(conn, day, dict(SmartGuideSystem.STEPS))
+        if args.keep_days is not None:
+            prune(conn, date.today() - timedelta(days=args.keep_days))
+    
+    print(f'{day} 管家意图（共 {sum(row["messages"] for row in result["intents"])} 条消息）')
+    print(f"{'意图':<18}{'子话题':<20}{'消息数':>8}{'平均(ms)':>10}{'p95(ms)':>10}")
+    for row in result['intents']:
+        print(f"{row['intent']:<18}{row['subtopic']:<20}{row['messages']:>8}"
+              f"{row['avg_latency_ms']:>10}{row['p95_latency_ms']:>10}")
+    print(f'\n{day} 导购漏斗')
+    print(f"{'步骤':<6}{'名称':<16}{'会话数':>8}{'转化率':>9}{'流失':>7}")
+    for row in result['funnel']:
+        print(f"{row['step']:<6}{row['name']:<16}{row['sessions']:>8}{row['conversion']:>9.1%}{row['drop_off']:>7}")
+
+
+if __name__ == '__main__':
+    main()
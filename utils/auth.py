@@ -9,19 +9,39 @@ from typing import Dict, Optional
 from functools import wraps
 from flask import session, redirect, url_for, request
 
+from utils.database import UserDB
+
 
 class User:
-    """用户模型"""
-    def __init__(self, user_id: str, nickname: str, avatar: str = None, 
-                 phone: str = None, auth_type: str = 'phone'):
+    """用户模型（会话视图，数据持久化在 users 表）"""
+    def __init__(self, user_id: int, nickname: str, avatar: str = None, 
+                 phone: str = None, auth_type: str = 'phone',
+                 level: int = 1, points: int = 0):
         self.id = user_id
         self.nickname = nickname
         self.avatar = avatar or '/static/images/default-avatar.png'
         self.phone = phone
         self.auth_type = auth_type  # phone, wechat, qq, github
-        self.level = 1  # 会员等级
-        self.points = 0  # 积分
-        self.created_at = time.time()
+        self.level = level  # 会员等级
+        self.points = points  # 积分
+    
+    @classmethod
+    def from_record(cls, record: Dict) -> 'User':
+        """由 users 表记录构建"""
+        auth_type = next(
+            (platform for platform, column in UserDB.OAUTH_COLUMNS.items() if record.get(column)),
+            'phone'
+        )
+        level = str(record.get('level') or 'L1').lstrip('L')
+        return cls(
+            user_id=record['id'],
+            nickname=record.get('username') or '',
+            avatar=record.get('avatar'),
+            phone=record.get('phone'),
+            auth_type=auth_type,
+            level=int(level) if level.isdigit() else 1,
+            points=record.get('points') or 0
+        )
     
     def to_dict(self) -> Dict:
         return {
@@ -39,17 +59,11 @@ class AuthManager:
     """认证管理器"""
     
     def __init__(self):
-        # 模拟用户数据库
-        self.users: Dict[str, User] = {}
         # 验证码存储 {phone: (code, expire_time)}
         self.verification_codes: Dict[str, tuple] = {}
         # OAuth state存储
         self.oauth_states: Dict[str, Dict] = {}
     
-    def generate_user_id(self) -> str:
-        """生成用户ID"""
-        return secrets.token_hex(16)
-    
     def send_verification_code(self, phone: str) -> Dict:
         """发送验证码（模拟）"""
         if not self._validate_phone(phone):
@@ -92,16 +106,9 @@ class AuthManager:
         if not self.verify_code(phone, code):
             return {'success': False, 'message': '验证码错误或已过期'}
         
-        # 查找或创建用户
-        user = self._find_user_by_phone(phone)
-        if not user:
-            user = User(
-                user_id=self.generate_user_id(),
-                nickname=f'用户{phone[-4:]}',
-                phone=phone,
-                auth_type='phone'
-            )
-            self.users[user.id] = user
+        # 查找或创建用户（并发的首次登录不会因手机号唯一约束失败）
+        record = UserDB.get_or_create(nickname=f'用户{phone[-4:]}', phone=phone, auth_type='phone')
+        user = User.from_record(record)
         
         return {
             'success': True,
@@ -174,17 +181,13 @@ class AuthManager:
         mock_user_info = self._mock_oauth_user_info(platform, code)
         
         # 查找或创建用户
-        oauth_id = f"{platform}_{mock_user_info['openid']}"
-        user = self.users.get(oauth_id)
-        
-        if not user:
-            user = User(
-                user_id=oauth_id,
-                nickname=mock_user_info['nickname'],
-                avatar=mock_user_info['avatar'],
-                auth_type=platform
-            )
-            self.users[user.id] = user
+        record = UserDB.get_or_create(
+            nickname=mock_user_info['nickname'],
+            avatar=mock_user_info['avatar'],
+            auth_type=platform,
+            openid=mock_user_info['openid']
+        )
+        user = User.from_record(record)
         
         return {
             'success': True,
@@ -206,13 +209,6 @@ class AuthManager:
             'avatar': avatars.get(platform, '')
         }
     
-    def _find_user_by_phone(self, phone: str) -> Optional[User]:
-        """根据手机号查找用户"""
-        for user in self.users.values():
-            if user.phone == phone:
-                return user
-        return None
-    
     def _validate_phone(self, phone: str) -> bool:
         """验证手机号格式"""
         if not phone or len(phone) != 11:
@@ -222,9 +218,10 @@ class AuthManager:
     def get_current_user(self) -> Optional[User]:
         """获取当前登录用户"""
         user_id = session.get('user_id')
-        if user_id and user_id in self.users:
-            return self.users[user_id]
-        return None
+        if not user_id:
+            return None
+        record = UserDB.get_by_id(user_id)
+        return User.from_record(record) if record else None
     
     def login_user(self, user: User):
         """登录用户（设置session）"""
@@ -1,419 +1,146 @@
 """
-数据库模型和管理
-使用SQLite作为本地数据库
+数据访问层（仓储）
+与 models.py 共用同一个 SQLite 数据库、同一套表结构和同一个 SQLAlchemy 连接池，
+热点路径使用手写 SQL 直接在池化连接上执行；写操作交给 utils.write_coordinator 的写线程，
+与同一进程内的其他写请求合并提交；列表类查询走 utils.read_replica 的只读连接/读快照
 """
+import base64
 import sqlite3
-import os
 import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Optional
 from contextlib import contextmanager
 
-# 数据库文件路径
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'senxi.db')
-
-
-def ensure_db_dir():
-    """确保数据库目录存在"""
-    db_dir = os.path.dirname(DB_PATH)
-    if not os.path.exists(db_dir):
-        os.makedirs(db_dir)
+from models import db
+from utils.metrics import instrument_connection, registry
+from utils.ranking import HOT_SCORE_SQL, hot_score
+from utils.ids import new_order_id, new_post_id
+from utils.write_coordinator import AbortWrite, write_coordinator
+from utils.read_replica import read_db
+from utils.inventory import inventory
 
 
 @contextmanager
 def get_db():
-    """获取数据库连接"""
-    ensure_db_dir()
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    从 SQLAlchemy 引擎的连接池借出一个 DBAPI 连接
+
+    需要在应用上下文中调用；连接关闭时归还连接池（未提交的事务会被回滚）。
+    游标经过埋点，执行的语句计入当前请求的指标
+    """
+    conn = db.engine.raw_connection()
+    conn.driver_connection.row_factory = sqlite3.Row
     try:
-        yield conn
+        yield instrument_connection(conn)
     finally:
         conn.close()
 
 
-def init_database():
-    """初始化数据库表"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # 用户表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                nickname TEXT NOT NULL,
-                avatar TEXT,
-                phone TEXT UNIQUE,
-                auth_type TEXT DEFAULT 'phone',
-                level INTEGER DEFAULT 1,
-                points INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 商品表（含库存）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT,
-                price REAL NOT NULL,
-                original_price REAL,
-                category TEXT,
-                main_image TEXT,
-                images TEXT,
-                tags TEXT,
-                specs TEXT,
-                features TEXT,
-                stock INTEGER DEFAULT 0,
-                sales INTEGER DEFAULT 0,
-                rating REAL DEFAULT 5.0,
-                reviews_count INTEGER DEFAULT 0,
-                badge TEXT,
-                badge_color TEXT,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 订单表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                total_amount REAL NOT NULL,
-                status TEXT DEFAULT 'pending',
-                shipping_address TEXT,
-                shipping_name TEXT,
-                shipping_phone TEXT,
-                payment_method TEXT,
-                paid_at TIMESTAMP,
-                shipped_at TIMESTAMP,
-                completed_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # 订单项表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS order_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_id TEXT NOT NULL,
-                product_id TEXT NOT NULL,
-                product_name TEXT NOT NULL,
-                product_image TEXT,
-                price REAL NOT NULL,
-                quantity INTEGER NOT NULL,
-                FOREIGN KEY (order_id) REFERENCES orders(id),
-                FOREIGN KEY (product_id) REFERENCES products(id)
-            )
-        ''')
-        
-        # 购物车表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cart_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                product_id TEXT NOT NULL,
-                quantity INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (product_id) REFERENCES products(id),
-                UNIQUE(user_id, product_id)
-            )
-        ''')
+def _now() -> str:
+    """当前 UTC 时间，格式与 SQLAlchemy DateTime 列保持一致"""
+    return datetime.utcnow().isoformat(' ')
+
+
+def stage_job(cursor, kind: str, key, amount: int = 0):
+    """
+    在当前写事务内登记一条写队列任务（写入主库的 job_outbox）
+
+    任务与主写入一起提交或回滚，由写队列线程执行，不会出现主写入成功而计数漏加（或反之）
+    """
+    cursor.execute('INSERT INTO job_outbox (kind, key, amount, created_at) VALUES (?, ?, ?, ?)',
+                   (kind, str(key), amount, time.time()))
+
+
+def _parse_json_fields(record: Dict, fields) -> Dict:
+    """解析JSON字段"""
+    for field in fields:
+        if record.get(field):
+            try:
+                record[field] = json.loads(record[field])
+            except (TypeError, ValueError):
+                pass
+    return record
+
+
+class UserDB:
+    """用户数据库操作"""
+    
+    # 第三方登录平台 -> users 表中的 OpenID 列
+    OAUTH_COLUMNS = {
+        'wechat': 'wechat_openid',
+        'qq': 'qq_openid',
+        'github': 'github_id'
+    }
+    
+    @staticmethod
+    def _new_user_row(nickname: str, phone: str, avatar: str, auth_type: str, openid: str):
+        columns = ['phone', 'username', 'avatar', 'level', 'points', 'created_at', 'updated_at']
+        now = _now()
+        values = [phone, nickname, avatar, 'L1', 0, now, now]
+        oauth_column = UserDB.OAUTH_COLUMNS.get(auth_type)
+        if oauth_column and openid:
+            columns.append(oauth_column)
+            values.append(openid)
+        return columns, values
+    
+    @staticmethod
+    def create(nickname: str, phone: str = None, avatar: str = None,
+               auth_type: str = 'phone', openid: str = None) -> Dict:
+        """创建用户，返回包含自增整数 id 的用户记录"""
+        columns, values = UserDB._new_user_row(nickname, phone, avatar, auth_type, openid)
         
-        # 社区帖子表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                images TEXT,
-                category TEXT DEFAULT 'general',
-                likes INTEGER DEFAULT 0,
-                views INTEGER DEFAULT 0,
-                comments_count INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
+        def write(cursor):
+            cursor.execute(
+                f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                values
             )
-        ''')
+            return cursor.lastrowid
         
-        # 帖子评论表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS comments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id INTEGER NOT NULL,
-                user_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                parent_id INTEGER,
-                likes INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (post_id) REFERENCES posts(id),
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (parent_id) REFERENCES comments(id)
-            )
-        ''')
+        user_id = write_coordinator.run(write)
+        return UserDB.get_by_id(user_id)
+    
+    @staticmethod
+    def get_or_create(nickname: str, phone: str = None, avatar: str = None,
+                      auth_type: str = 'phone', openid: str = None) -> Dict:
+        """
+        按手机号（auth_type='phone'）或第三方 OpenID 查找用户，不存在时创建
+
+        插入用 ON CONFLICT DO NOTHING，并发的首次登录只会有一个插入成功，其余直接读出已有记录
+        """
+        if auth_type == 'phone':
+            key_column, key = 'phone', phone
+        else:
+            key_column, key = UserDB.OAUTH_COLUMNS[auth_type], openid
         
-        # 点赞记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS likes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                target_type TEXT NOT NULL,
-                target_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, target_type, target_id)
-            )
-        ''')
+        record = UserDB._get_by_column(key_column, key)
+        if record:
+            return record
         
-        # 收藏表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS favorites (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                product_id TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (product_id) REFERENCES products(id),
-                UNIQUE(user_id, product_id)
-            )
-        ''')
+        columns, values = UserDB._new_user_row(nickname, phone, avatar, auth_type, openid)
         
-        # 收货地址表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS addresses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                phone TEXT NOT NULL,
-                province TEXT NOT NULL,
-                city TEXT NOT NULL,
-                district TEXT NOT NULL,
-                detail TEXT NOT NULL,
-                is_default INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
+        def write(cursor):
+            cursor.execute(
+                f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT({key_column}) DO NOTHING",
+                values
             )
-        ''')
         
-        conn.commit()
-        
-        # 初始化示例商品数据
-        _init_sample_products(cursor, conn)
-
-
-def _init_sample_products(cursor, conn):
-    """初始化示例商品数据"""
-    cursor.execute('SELECT COUNT(*) FROM products')
-    if cursor.fetchone()[0] > 0:
-        return  # 已有数据，跳过
-    
-    products = [
-        {
-            'id': 'prod_001',
-            'name': '净界者·森林呼吸Pro',
-            'description': '采用H13级HEPA滤网，配合光触媒分解技术，高效去除PM2.5、甲醛、细菌病毒。适合40-60㎡空间使用。',
-            'price': 2999,
-            'original_price': 3599,
-            'category': 'home',
-            'main_image': 'https://via.placeholder.com/400x400?text=Forest+Pro',
-            'images': json.dumps(['https://via.placeholder.com/400x400?text=Image1', 'https://via.placeholder.com/400x400?text=Image2']),
-            'tags': json.dumps(['除甲醛', '除PM2.5', '智能控制', '静音']),
-            'specs': json.dumps({
-                'area': '40-60㎡',
-                'cadr': '500m³/h',
-                'formaldehyde_cadr': '300m³/h',
-                'noise': '22-58dB',
-                'filter_level': 'HEPA H13',
-                'power': '55W',
-                'dimensions': '350×350×680mm',
-                'weight': '9.5kg',
-                'smart_features': 'APP控制、语音控制、空气质量监测'
-            }),
-            'features': json.dumps([
-                {'icon': 'shield', 'title': 'H13级HEPA滤网', 'description': '过滤99.97%的0.3微米颗粒物'},
-                {'icon': 'zap', 'title': '光触媒分解', 'description': '主动分解甲醛、TVOC等有害气体'},
-                {'icon': 'wifi', 'title': '智能互联', 'description': 'APP远程控制，支持小爱同学/天猫精灵'},
-                {'icon': 'moon', 'title': '超静音设计', 'description': '睡眠模式仅22分贝，安心入眠'}
-            ]),
-            'stock': 500,
-            'sales': 1256,
-            'rating': 4.9,
-            'reviews_count': 328,
-            'badge': '热销',
-            'badge_color': 'red'
-        },
-        {
-            'id': 'prod_002',
-            'name': '净界者·清新之风Max',
-            'description': '旗舰级空气净化器，双风道设计，CADR值高达800m³/h，适合60-100㎡大空间使用。',
-            'price': 4999,
-            'original_price': 5999,
-            'category': 'home',
-            'main_image': 'https://via.placeholder.com/400x400?text=Fresh+Max',
-            'images': json.dumps(['https://via.placeholder.com/400x400?text=Image1']),
-            'tags': json.dumps(['大户型', '双风道', '高CADR', '智能']),
-            'specs': json.dumps({
-                'area': '60-100㎡',
-                'cadr': '800m³/h',
-                'formaldehyde_cadr': '500m³/h',
-                'noise': '25-65dB',
-                'filter_level': 'HEPA H13',
-                'power': '75W',
-                'dimensions': '400×400×780mm',
-                'weight': '12kg',
-                'smart_features': 'APP控制、语音控制、空气质量监测、滤芯寿命提醒'
-            }),
-            'features': json.dumps([
-                {'icon': 'wind', 'title': '双风道设计', 'description': '360°进风，快速净化全屋空气'},
-                {'icon': 'activity', 'title': '高效净化', 'description': 'CADR值800m³/h，10分钟净化60㎡'},
-                {'icon': 'smartphone', 'title': '智能APP', 'description': '实时监测，远程控制，滤芯提醒'},
-                {'icon': 'award', 'title': '权威认证', 'description': '通过中国家电研究院检测认证'}
-            ]),
-            'stock': 200,
-            'sales': 856,
-            'rating': 4.8,
-            'reviews_count': 215,
-            'badge': '旗舰',
-            'badge_color': 'purple'
-        },
-        {
-            'id': 'prod_003',
-            'name': '净界者·守护天使',
-            'description': '专为母婴设计，采用医疗级净化标准，超静音运行，守护宝宝健康呼吸。',
-            'price': 3499,
-            'original_price': 3999,
-            'category': 'home',
-            'main_image': 'https://via.placeholder.com/400x400?text=Angel',
-            'images': json.dumps(['https://via.placeholder.com/400x400?text=Image1']),
-            'tags': json.dumps(['母婴', '医疗级', '超静音', '无臭氧']),
-            'specs': json.dumps({
-                'area': '30-50㎡',
-                'cadr': '400m³/h',
-                'formaldehyde_cadr': '200m³/h',
-                'noise': '20-52dB',
-                'filter_level': 'HEPA H13 + 活性炭',
-                'power': '45W',
-                'dimensions': '320×320×620mm',
-                'weight': '8kg',
-                'smart_features': 'APP控制、童锁、夜灯模式'
-            }),
-            'features': json.dumps([
-                {'icon': 'baby', 'title': '母婴专属', 'description': '医疗级净化标准，无臭氧释放'},
-                {'icon': 'volume-x', 'title': '超静音', 'description': '睡眠模式仅20分贝，不打扰宝宝'},
-                {'icon': 'lock', 'title': '童锁保护', 'description': '防止宝宝误触，安全放心'},
-                {'icon': 'sun', 'title': '柔和夜灯', 'description': '可调节亮度，陪伴宝宝入睡'}
-            ]),
-            'stock': 300,
-            'sales': 623,
-            'rating': 4.9,
-            'reviews_count': 189,
-            'badge': '母婴优选',
-            'badge_color': 'pink'
-        },
-        {
-            'id': 'prod_004',
-            'name': '净界者·车载清风',
-            'description': '车载空气净化器，小巧便携，USB供电，快速净化车内空气。',
-            'price': 599,
-            'original_price': 799,
-            'category': 'car',
-            'main_image': 'https://via.placeholder.com/400x400?text=Car+Air',
-            'images': json.dumps(['https://via.placeholder.com/400x400?text=Image1']),
-            'tags': json.dumps(['车载', '便携', 'USB供电', '除异味']),
-            'specs': json.dumps({
-                'area': '车内空间',
-                'cadr': '30m³/h',
-                'noise': '≤35dB',
-                'filter_level': 'HEPA H11',
-                'power': '5W',
-                'dimensions': '80×80×180mm',
-                'weight': '0.5kg',
-                'smart_features': '一键开关、滤芯更换提醒'
-            }),
-            'features': json.dumps([
-                {'icon': 'car', 'title': '车载专用', 'description': '专为车内空间设计，小巧不占位'},
-                {'icon': 'usb', 'title': 'USB供电', 'description': '车载USB即可供电，方便使用'},
-                {'icon': 'wind', 'title': '快速净化', 'description': '5分钟净化车内空气'},
-                {'icon': 'droplet', 'title': '除异味', 'description': '有效去除烟味、异味'}
-            ]),
-            'stock': 1000,
-            'sales': 2156,
-            'rating': 4.7,
-            'reviews_count': 523,
-            'badge': '热销',
-            'badge_color': 'orange'
-        },
-        {
-            'id': 'prod_005',
-            'name': 'H13级HEPA复合滤芯',
-            'description': '适用于净界者·森林呼吸Pro，建议6-12个月更换一次。',
-            'price': 299,
-            'original_price': 399,
-            'category': 'accessory',
-            'main_image': 'https://via.placeholder.com/400x400?text=Filter',
-            'images': json.dumps(['https://via.placeholder.com/400x400?text=Image1']),
-            'tags': json.dumps(['滤芯', 'H13', '原装']),
-            'specs': json.dumps({
-                'compatible': '净界者·森林呼吸Pro',
-                'filter_level': 'HEPA H13 + 活性炭',
-                'lifespan': '6-12个月',
-                'dimensions': '300×300×50mm'
-            }),
-            'features': json.dumps([
-                {'icon': 'check', 'title': '原装品质', 'description': '官方原装滤芯，品质保证'},
-                {'icon': 'shield', 'title': 'H13级别', 'description': '过滤99.97%的0.3微米颗粒物'}
-            ]),
-            'stock': 2000,
-            'sales': 3256,
-            'rating': 4.9,
-            'reviews_count': 856,
-            'badge': None,
-            'badge_color': None
-        }
-    ]
-    
-    for p in products:
-        cursor.execute('''
-            INSERT INTO products (id, name, description, price, original_price, category, 
-                main_image, images, tags, specs, features, stock, sales, rating, 
-                reviews_count, badge, badge_color)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            p['id'], p['name'], p['description'], p['price'], p['original_price'],
-            p['category'], p['main_image'], p['images'], p['tags'], p['specs'],
-            p['features'], p['stock'], p['sales'], p['rating'], p['reviews_count'],
-            p['badge'], p['badge_color']
-        ))
-    
-    conn.commit()
-
-
-class UserDB:
-    """用户数据库操作"""
+        write_coordinator.run(write)
+        return UserDB._get_by_column(key_column, key)
     
     @staticmethod
-    def create(user_id: str, nickname: str, phone: str = None, 
-               avatar: str = None, auth_type: str = 'phone') -> Dict:
+    def _get_by_column(column: str, value) -> Optional[Dict]:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO users (id, nickname, phone, avatar, auth_type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, nickname, phone, avatar, auth_type))
-            conn.commit()
-            return UserDB.get_by_id(user_id)
+            cursor.execute(f'SELECT * FROM users WHERE {column} = ?', (value,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
     
     @staticmethod
-    def get_by_id(user_id: str) -> Optional[Dict]:
+    def get_by_id(user_id: int) -> Optional[Dict]:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
@@ -422,29 +149,33 @@ class UserDB:
     
     @staticmethod
     def get_by_phone(phone: str) -> Optional[Dict]:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM users WHERE phone = ?', (phone,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        return UserDB._get_by_column('phone', phone)
     
     @staticmethod
-    def update_points(user_id: str, points: int):
-        with get_db() as conn:
-            cursor = conn.cursor()
+    def get_by_openid(platform: str, openid: str) -> Optional[Dict]:
+        """根据第三方平台 OpenID 查找用户"""
+        column = UserDB.OAUTH_COLUMNS.get(platform)
+        if not column:
+            return None
+        return UserDB._get_by_column(column, openid)
+    
+    @staticmethod
+    def update_points(user_id: int, points: int):
+        def write(cursor):
             cursor.execute('''
-                UPDATE users SET points = points + ?, updated_at = CURRENT_TIMESTAMP
+                UPDATE users SET points = points + ?, updated_at = ?
                 WHERE id = ?
-            ''', (points, user_id))
-            conn.commit()
+            ''', (points, _now(), user_id))
+        
+        write_coordinator.run(write)
 
 
 class ProductDB:
-    """商品数据库操作"""
+    """商品数据库操作（product_id 为商品编号，如 prod_001）"""
     
     @staticmethod
     def get_all(category: str = None, status: str = 'active') -> List[Dict]:
-        with get_db() as conn:
+        with read_db(snapshot=True) as conn:
             cursor = conn.cursor()
             if category:
                 cursor.execute('''
@@ -463,279 +194,632 @@ class ProductDB:
     def get_by_id(product_id: str) -> Optional[Dict]:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM products WHERE id = ?', (product_id,))
+            cursor.execute('SELECT * FROM products WHERE product_id = ?', (product_id,))
             row = cursor.fetchone()
             return ProductDB._parse_product(dict(row)) if row else None
     
+    @staticmethod
+    def get_by_ids(product_ids: List[str]) -> Dict[str, Dict]:
+        """批量获取商品，返回 {商品编号: 商品}"""
+        if not product_ids:
+            return {}
+        with get_db() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(product_ids))
+            cursor.execute(f'SELECT * FROM products WHERE product_id IN ({placeholders})',
+                           list(product_ids))
+            return {row['product_id']: ProductDB._parse_product(dict(row))
+                    for row in cursor.fetchall()}
+    
     @staticmethod
     def check_stock(product_id: str, quantity: int) -> bool:
         """检查库存是否充足"""
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT stock FROM products WHERE id = ?', (product_id,))
+            cursor.execute('SELECT stock FROM products WHERE product_id = ?', (product_id,))
             row = cursor.fetchone()
-            return row and row['stock'] >= quantity
+            return bool(row) and row['stock'] >= quantity
     
     @staticmethod
     def reduce_stock(product_id: str, quantity: int) -> bool:
         """减少库存"""
-        with get_db() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             cursor.execute('''
                 UPDATE products SET stock = stock - ?, sales = sales + ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ? AND stock >= ?
-            ''', (quantity, quantity, product_id, quantity))
-            conn.commit()
+                    updated_at = ?
+                WHERE product_id = ? AND stock >= ?
+            ''', (quantity, quantity, _now(), product_id, quantity))
             return cursor.rowcount > 0
+        
+        return write_coordinator.run(write)
     
     @staticmethod
     def _parse_product(product: Dict) -> Dict:
         """解析JSON字段"""
-        for field in ['images', 'tags', 'specs', 'features']:
-            if product.get(field):
-                try:
-                    product[field] = json.loads(product[field])
-                except:
-                    pass
-        return product
+        return _parse_json_fields(product, ['images', 'tags', 'specs', 'features'])
+
+
+# 订单列表每页数量
+ORDER_PAGE_SIZE = 20
+
+# 用户可执行的订单状态变更：动作 -> (原状态, 新状态, 同时记录时间的列)
+ORDER_TRANSITIONS = {
+    'cancel': ('pending', 'cancelled', None),
+    'complete': ('shipped', 'completed', 'completed_at'),
+}
+
+
+def _encode_cursor(created_at: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{created_at}|{row_id}'.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Optional[tuple]:
+    """解析分页游标，无效时返回 None（从第一页开始）"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = text.rsplit('|', 1)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
 
 
 class OrderDB:
-    """订单数据库操作"""
+    """订单数据库操作（order_id 为订单编号）"""
     
     @staticmethod
-    def create(user_id: str, items: List[Dict], shipping_info: Dict) -> Optional[str]:
-        """创建订单"""
-        import uuid
-        order_id = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
+    def create(user_id: int, items: List[Dict], shipping_info: Dict) -> Optional[str]:
+        """
+        创建订单
+
+        商品查询、订单写入和库存扣减在写线程的同一事务内完成，
+        任一商品不存在或库存不足时整单回滚。
+        订单项带 reservation_id 时在同一事务内提交预占（utils.inventory，预占可以属于其他进程），
+        不再检查和扣减 products.stock；预占不存在、已结束、已过期、不属于该用户或商品/数量不符时下单失败
+        """
+        order_id = new_order_id()
+        reservation_ids = [item['reservation_id'] for item in items if item.get('reservation_id')]
         
-        with get_db() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
+            # 一次查询取出所有商品
+            codes = [item['product_id'] for item in items]
+            placeholders = ', '.join('?' * len(codes))
+            cursor.execute(f'''
+                SELECT id, product_id, name, main_image, price, stock
+                FROM products WHERE product_id IN ({placeholders})
+            ''', codes)
+            products = {row['product_id']: row for row in cursor.fetchall()}
             
             # 计算总金额并检查库存
             total_amount = 0
             for item in items:
-                product = ProductDB.get_by_id(item['product_id'])
+                product = products.get(item['product_id'])
                 if not product:
-                    return None
-                if not ProductDB.check_stock(item['product_id'], item['quantity']):
-                    return None
+                    raise AbortWrite(None)
+                if not item.get('reservation_id') and product['stock'] < item['quantity']:
+                    raise AbortWrite(None)
                 total_amount += product['price'] * item['quantity']
             
             # 创建订单
+            now = _now()
             cursor.execute('''
-                INSERT INTO orders (id, user_id, total_amount, shipping_address, 
-                    shipping_name, shipping_phone)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO orders (order_id, user_id, total_amount, status,
+                    receiver_name, receiver_phone, receiver_address, created_at, updated_at)
+                VALUES (?, ?, ?, 'pending', ?, ?, ?, ?, ?)
             ''', (
                 order_id, user_id, total_amount,
-                shipping_info.get('address', ''),
                 shipping_info.get('name', ''),
-                shipping_info.get('phone', '')
+                shipping_info.get('phone', ''),
+                shipping_info.get('address', ''),
+                now, now
             ))
+            order_pk = cursor.lastrowid
             
-            # 创建订单项并减少库存
+            # 创建订单项并减少库存（已预占的提交预占）
             for item in items:
-                product = ProductDB.get_by_id(item['product_id'])
+                product = products[item['product_id']]
+                if item.get('reservation_id'):
+                    if not inventory.commit_sql(cursor, item['reservation_id'], user_id, order_id,
+                                                product['id'], item['quantity']):
+                        raise AbortWrite(None)
+                else:
+                    cursor.execute('''
+                        UPDATE products SET stock = stock - ?, sales = sales + ?, updated_at = ?
+                        WHERE id = ? AND stock >= ?
+                    ''', (item['quantity'], item['quantity'], now, product['id'], item['quantity']))
+                    if cursor.rowcount == 0:
+                        raise AbortWrite(None)
                 cursor.execute('''
-                    INSERT INTO order_items (order_id, product_id, product_name, 
+                    INSERT INTO order_items (order_id, product_id, product_name,
                         product_image, price, quantity)
                     VALUES (?, ?, ?, ?, ?, ?)
                 ''', (
-                    order_id, item['product_id'], product['name'],
+                    order_pk, product['id'], product['name'],
                     product['main_image'], product['price'], item['quantity']
                 ))
-                ProductDB.reduce_stock(item['product_id'], item['quantity'])
-            
-            conn.commit()
             return order_id
+        
+        result = write_coordinator.run(write)
+        if result is not None and reservation_ids:
+            inventory.settle(reservation_ids)
+        return result
     
     @staticmethod
-    def get_user_orders(user_id: str, status: str = None) -> List[Dict]:
-        """获取用户订单列表"""
-        with get_db() as conn:
-            cursor = conn.cursor()
-            if status:
-                cursor.execute('''
-                    SELECT * FROM orders WHERE user_id = ? AND status = ?
-                    ORDER BY created_at DESC
-                ''', (user_id, status))
-            else:
-                cursor.execute('''
-                    SELECT * FROM orders WHERE user_id = ?
-                    ORDER BY created_at DESC
-                ''', (user_id,))
-            orders = [dict(row) for row in cursor.fetchall()]
+    def get_user_orders(user_id: int, status: str = None, limit: int = ORDER_PAGE_SIZE,
+                        cursor: str = None) -> Dict:
+        """
+        获取用户订单列表（按下单时间倒序，游标分页）
+
+        走 (user_id, status, created_at) 索引，按 (created_at, id) 定位下一页，
+        翻到后面也不需要扫描前面的订单；一页订单的订单项一次 IN 查询取出
+
+        Args:
+            cursor: 上一页返回的 next_cursor，为空时取第一页
+
+        Returns:
+            {'orders': [...], 'next_cursor': 下一页游标（没有更多时为 None）}
+        """
+        conditions, params = ['user_id = ?'], [user_id]
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        position = _decode_cursor(cursor) if cursor else None
+        if position:
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend(position)
+        
+        with read_db() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(f'''
+                SELECT * FROM orders WHERE {' AND '.join(conditions)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', [*params, limit + 1])
+            orders = [dict(row) for row in db_cursor.fetchall()]
+            has_more = len(orders) > limit
+            orders = orders[:limit]
             
-            # 获取订单项
+            # 一次取出本页全部订单项
+            items: Dict[int, List[Dict]] = {order['id']: [] for order in orders}
+            if orders:
+                placeholders = ', '.join('?' * len(orders))
+                db_cursor.execute(f'''
+                    SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY id
+                ''', list(items))
+                for row in db_cursor.fetchall():
+                    items[row['order_id']].append(dict(row))
             for order in orders:
-                cursor.execute('''
-                    SELECT * FROM order_items WHERE order_id = ?
-                ''', (order['id'],))
-                order['items'] = [dict(row) for row in cursor.fetchall()]
-            
-            return orders
+                order['items'] = items[order['id']]
+        
+        next_cursor = None
+        if has_more:
+            last = orders[-1]
+            next_cursor = _encode_cursor(last['created_at'], last['id'])
+        return {'orders': orders, 'next_cursor': next_cursor}
     
     @staticmethod
     def get_by_id(order_id: str) -> Optional[Dict]:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM orders WHERE id = ?', (order_id,))
+            cursor.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,))
             row = cursor.fetchone()
             if not row:
                 return None
             order = dict(row)
-            cursor.execute('SELECT * FROM order_items WHERE order_id = ?', (order_id,))
+            cursor.execute('SELECT * FROM order_items WHERE order_id = ?', (order['id'],))
             order['items'] = [dict(r) for r in cursor.fetchall()]
             return order
     
     @staticmethod
     def update_status(order_id: str, status: str):
-        with get_db() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             cursor.execute('''
-                UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (status, order_id))
-            conn.commit()
+                UPDATE orders SET status = ?, updated_at = ?
+                WHERE order_id = ?
+            ''', (status, _now(), order_id))
+        
+        write_coordinator.run(write)
+    
+    @staticmethod
+    def cancel(order_id: str, user_id: int) -> bool:
+        """
+        取消待付款订单，并在同一事务内退回库存、扣回销量
+
+        只有订单属于该用户且仍为 pending 时才会更新（条件 UPDATE，并发取消/付款不会重复退库存）
+        """
+        def write(cursor):
+            order_pk = OrderDB._transition(cursor, order_id, user_id, 'cancel')
+            if order_pk is None:
+                return False
+            cursor.execute('''
+                UPDATE products SET
+                    stock = stock + (SELECT SUM(quantity) FROM order_items
+                                     WHERE order_id = :order AND product_id = products.id),
+                    sales = MAX(0, sales - (SELECT SUM(quantity) FROM order_items
+                                            WHERE order_id = :order AND product_id = products.id)),
+                    updated_at = :now
+                WHERE id IN (SELECT product_id FROM order_items WHERE order_id = :order)
+            ''', {'order': order_pk, 'now': _now()})
+            cursor.execute('''
+                UPDATE stock_reservations SET status = 'released', updated_at = ?
+                WHERE order_id = ? AND status = 'committed'
+            ''', (_now(), order_id))
+            return True
+        
+        return write_coordinator.run(write)
+    
+    @staticmethod
+    def complete(order_id: str, user_id: int) -> bool:
+        """确认收货（仅 shipped 状态的订单）"""
+        return write_coordinator.run(
+            lambda cursor: OrderDB._transition(cursor, order_id, user_id, 'complete') is not None
+        )
+    
+    @staticmethod
+    def _transition(cursor, order_id: str, user_id: int, action: str) -> Optional[int]:
+        """按 ORDER_TRANSITIONS 执行一次条件状态变更，成功时返回订单主键"""
+        from_status, to_status, timestamp_column = ORDER_TRANSITIONS[action]
+        now = _now()
+        extra = f', {timestamp_column} = :now' if timestamp_column else ''
+        cursor.execute(f'''
+            UPDATE orders SET status = :to_status, updated_at = :now{extra}
+            WHERE order_id = :order_id AND user_id = :user_id AND status = :from_status
+            RETURNING id
+        ''', {'to_status': to_status, 'now': now, 'order_id': order_id,
+              'user_id': user_id, 'from_status': from_status})
+        row = cursor.fetchone()
+        return row['id'] if row else None
+
+
+class CartSummaryCache:
+    """
+    购物车摘要缓存（按用户，进程内 LRU）
+
+    本进程内购物车变化时立即失效；其他 worker 的修改、商品价格和库存变化最多延迟 ttl 秒反映
+    """
+    
+    def __init__(self, max_users: int = 10000, ttl: float = 30.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._generations: Dict[int, int] = {}
+    
+    def get(self, user_id: int, loader) -> Dict:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                registry.inc('senxi_cart_summary_cache_total', help_text='购物车摘要缓存查询次数', result='hit')
+                return dict(entry[1])
+            generation = self._generations.get(user_id, 0)
+        registry.inc('senxi_cart_summary_cache_total', help_text='购物车摘要缓存查询次数', result='miss')
+        summary = loader(user_id)
+        with self._lock:
+            # 加载期间购物车又有变化时不写入，避免缓存旧值
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (time.monotonic() + self.ttl, summary)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return dict(summary)
+    
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > self.max_users * 2:
+                self._generations = {key: value for key, value in self._generations.items()
+                                     if key in self._entries or key == user_id}
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+cart_summary_cache = CartSummaryCache()
+
+# 单个商品在购物车中的数量上限
+MAX_CART_QUANTITY = 99
+
+# 购物车条目与商品一次 JOIN 取出，价格和库存校验在同一查询中完成
+CART_AVAILABLE_SQL = "p.status = 'active' AND p.stock >= c.quantity"
+
+
+class CartDB:
+    """购物车数据库操作（product_id 为商品编号，写入后使摘要缓存失效）"""
+    
+    @staticmethod
+    def add(user_id: int, product_id: str, quantity: int = 1) -> bool:
+        """加入购物车，已有时累加数量；商品不存在或已下架时返回 False"""
+        def write(cursor):
+            cursor.execute('''
+                INSERT INTO cart_items (user_id, product_id, quantity, created_at)
+                SELECT ?, id, MIN(?, ?), ? FROM products WHERE product_id = ? AND status = 'active'
+                ON CONFLICT (user_id, product_id)
+                DO UPDATE SET quantity = MIN(quantity + excluded.quantity, ?)
+            ''', (user_id, quantity, MAX_CART_QUANTITY, _now(), product_id, MAX_CART_QUANTITY))
+            return cursor.rowcount > 0
+        
+        return CartDB._write(user_id, write)
+    
+    @staticmethod
+    def update_quantity(user_id: int, product_id: str, quantity: int) -> bool:
+        """修改数量，quantity <= 0 时移除；购物车中没有该商品时返回 False"""
+        if quantity <= 0:
+            return CartDB.remove(user_id, product_id)
+        
+        def write(cursor):
+            cursor.execute('''
+                UPDATE cart_items SET quantity = ?
+                WHERE user_id = ? AND product_id = (SELECT id FROM products WHERE product_id = ?)
+            ''', (min(quantity, MAX_CART_QUANTITY), user_id, product_id))
+            return cursor.rowcount > 0
+        
+        return CartDB._write(user_id, write)
+    
+    @staticmethod
+    def remove(user_id: int, product_id: str) -> bool:
+        def write(cursor):
+            cursor.execute('''
+                DELETE FROM cart_items
+                WHERE user_id = ? AND product_id = (SELECT id FROM products WHERE product_id = ?)
+            ''', (user_id, product_id))
+            return cursor.rowcount > 0
+        
+        return CartDB._write(user_id, write)
+    
+    @staticmethod
+    def clear(user_id: int):
+        def write(cursor):
+            cursor.execute('DELETE FROM cart_items WHERE user_id = ?', (user_id,))
+        
+        CartDB._write(user_id, write)
+    
+    @staticmethod
+    def _write(user_id: int, write):
+        try:
+            return write_coordinator.run(write)
+        finally:
+            cart_summary_cache.invalidate(user_id)
+    
+    @staticmethod
+    def get_items(user_id: int) -> Dict:
+        """
+        购物车明细（结算预览）：一次查询取出全部条目及当前价格、库存
+
+        Returns:
+            {'items': [...], 'summary': {...}}，items 中 available 为 False 的条目不计入合计
+        """
+        with read_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT p.product_id, p.name, p.main_image, p.price, p.original_price, p.stock,
+                    c.quantity, c.created_at, {CART_AVAILABLE_SQL} AS available
+                FROM cart_items c
+                JOIN products p ON p.id = c.product_id
+                WHERE c.user_id = ?
+                ORDER BY c.created_at DESC, c.id DESC
+            ''', (user_id,))
+            items = []
+            for row in cursor.fetchall():
+                item = dict(row)
+                item['available'] = bool(item['available'])
+                item['subtotal'] = round(item['price'] * item['quantity'], 2)
+                items.append(item)
+        
+        available = [item for item in items if item['available']]
+        summary = {
+            'item_count': len(items),
+            'quantity': sum(item['quantity'] for item in items),
+            'total_amount': round(sum(item['subtotal'] for item in available), 2),
+            'unavailable_count': len(items) - len(available),
+        }
+        return {'items': items, 'summary': summary}
+    
+    @staticmethod
+    def get_summary(user_id: int) -> Dict:
+        """购物车摘要（角标、结算栏），带缓存"""
+        return cart_summary_cache.get(user_id, CartDB._load_summary)
+    
+    @staticmethod
+    def _load_summary(user_id: int) -> Dict:
+        with read_db() as conn:
+            row = conn.execute(f'''
+                SELECT COUNT(*) AS item_count,
+                    COALESCE(SUM(c.quantity), 0) AS quantity,
+                    COALESCE(SUM(CASE WHEN {CART_AVAILABLE_SQL} THEN p.price * c.quantity END), 0) AS total_amount,
+                    COALESCE(SUM(NOT ({CART_AVAILABLE_SQL})), 0) AS unavailable_count
+                FROM cart_items c
+                JOIN products p ON p.id = c.product_id
+                WHERE c.user_id = ?
+            ''', (user_id,)).fetchone()
+        summary = dict(row)
+        summary['total_amount'] = round(summary['total_amount'], 2)
+        return summary
 
 
 class PostDB:
     """帖子数据库操作"""
     
+    # 帖子列表附带作者信息
+    _SELECT_WITH_AUTHOR = '''
+        SELECT p.*, u.username as author_name, u.avatar as author_avatar
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+    '''
+    
     @staticmethod
-    def create(user_id: str, title: str, content: str, 
-               category: str = 'general', images: List[str] = None) -> int:
-        with get_db() as conn:
-            cursor = conn.cursor()
+    def create(user_id: int, title: str, content: str,
+               category: str = 'general', images: List[str] = None, post_id: str = None) -> int:
+        post_id = post_id or new_post_id()
+        now = _now()
+        
+        def write(cursor):
             cursor.execute('''
-                INSERT INTO posts (user_id, title, content, category, images)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, title, content, category, json.dumps(images or [])))
-            conn.commit()
+                INSERT INTO posts (post_id, user_id, title, content, category, images,
+                    likes, views, comment_count, hot_score, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, 0, 0, ?, ?, ?)
+            ''', (post_id, user_id, title, content, category,
+                  json.dumps(images) if images else None, hot_score(0, 0, 0, now), now, now))
             return cursor.lastrowid
+        
+        return write_coordinator.run(write)
     
     @staticmethod
     def get_all(category: str = None, limit: int = 20, offset: int = 0) -> List[Dict]:
-        with get_db() as conn:
+        with read_db(snapshot=True) as conn:
             cursor = conn.cursor()
             if category:
-                cursor.execute('''
-                    SELECT p.*, u.nickname as author_name, u.avatar as author_avatar
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    WHERE p.status = 'active' AND p.category = ?
+                cursor.execute(PostDB._SELECT_WITH_AUTHOR + '''
+                    WHERE p.category = ?
                     ORDER BY p.created_at DESC
                     LIMIT ? OFFSET ?
                 ''', (category, limit, offset))
             else:
-                cursor.execute('''
-                    SELECT p.*, u.nickname as author_name, u.avatar as author_avatar
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    WHERE p.status = 'active'
+                cursor.execute(PostDB._SELECT_WITH_AUTHOR + '''
                     ORDER BY p.created_at DESC
                     LIMIT ? OFFSET ?
                 ''', (limit, offset))
-            posts = [dict(row) for row in cursor.fetchall()]
-            for post in posts:
-                if post.get('images'):
-                    try:
-                        post['images'] = json.loads(post['images'])
-                    except:
-                        pass
-            return posts
+            return [_parse_json_fields(dict(row), ['images']) for row in cursor.fetchall()]
     
     @staticmethod
-    def get_user_posts(user_id: str) -> List[Dict]:
+    def get_hot(category: str = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """热榜（按物化的 hot_score 走索引倒序扫描）"""
+        with read_db() as conn:
+            cursor = conn.cursor()
+            if category:
+                cursor.execute(PostDB._SELECT_WITH_AUTHOR + '''
+                    WHERE p.category = ?
+                    ORDER BY p.hot_score DESC, p.id DESC
+                    LIMIT ? OFFSET ?
+                ''', (category, limit, offset))
+            else:
+                cursor.execute(PostDB._SELECT_WITH_AUTHOR + '''
+                    ORDER BY p.hot_score DESC, p.id DESC
+                    LIMIT ? OFFSET ?
+                ''', (limit, offset))
+            return [_parse_json_fields(dict(row), ['images']) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def get_user_posts(user_id: int) -> List[Dict]:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT * FROM posts WHERE user_id = ? AND status = 'active'
+                SELECT * FROM posts WHERE user_id = ?
                 ORDER BY created_at DESC
             ''', (user_id,))
-            posts = [dict(row) for row in cursor.fetchall()]
-            for post in posts:
-                if post.get('images'):
-                    try:
-                        post['images'] = json.loads(post['images'])
-                    except:
-                        pass
-            return posts
+            return [_parse_json_fields(dict(row), ['images']) for row in cursor.fetchall()]
     
     @staticmethod
     def get_by_id(post_id: int) -> Optional[Dict]:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.*, u.nickname as author_name, u.avatar as author_avatar
-                FROM posts p
-                JOIN users u ON p.user_id = u.id
-                WHERE p.id = ?
-            ''', (post_id,))
+            cursor.execute(PostDB._SELECT_WITH_AUTHOR + 'WHERE p.id = ?', (post_id,))
             row = cursor.fetchone()
             if not row:
                 return None
-            post = dict(row)
-            if post.get('images'):
-                try:
-                    post['images'] = json.loads(post['images'])
-                except:
-                    pass
-            return post
+            return _parse_json_fields(dict(row), ['images'])
     
     @staticmethod
     def increment_views(post_id: int):
-        with get_db() as conn:
-            cursor = conn.cursor()
+        def write(cursor):
             cursor.execute('UPDATE posts SET views = views + 1 WHERE id = ?', (post_id,))
-            conn.commit()
+            PostDB.refresh_hot_score(cursor, post_id)
+        
+        write_coordinator.run(write)
     
     @staticmethod
-    def like(post_id: int, user_id: str) -> bool:
-        with get_db() as conn:
-            cursor = conn.cursor()
+    def like(post_id: int, user_id: int) -> bool:
+        def write(cursor):
             try:
                 cursor.execute('''
-                    INSERT INTO likes (user_id, target_type, target_id)
-                    VALUES (?, 'post', ?)
-                ''', (user_id, post_id))
-                cursor.execute('UPDATE posts SET likes = likes + 1 WHERE id = ?', (post_id,))
-                conn.commit()
-                return True
+                    INSERT INTO post_likes (user_id, post_id, created_at)
+                    VALUES (?, ?, ?)
+                ''', (user_id, post_id, _now()))
             except sqlite3.IntegrityError:
-                return False
+                raise AbortWrite(False)
+            cursor.execute('UPDATE posts SET likes = likes + 1 WHERE id = ?', (post_id,))
+            PostDB.refresh_hot_score(cursor, post_id)
+            return True
+        
+        return write_coordinator.run(write)
+    
+    @staticmethod
+    def toggle_like(post_id: int, user_id: int) -> bool:
+        """点赞/取消点赞，返回操作后是否为已点赞（点赞数和热度分经发件箱由写队列更新）"""
+        return PostDB._toggle('post_likes', post_id, user_id, job='post_likes')
+    
+    @staticmethod
+    def toggle_favorite(post_id: int, user_id: int) -> bool:
+        """收藏/取消收藏，返回操作后是否为已收藏"""
+        return PostDB._toggle('post_favorites', post_id, user_id)
+    
+    @staticmethod
+    def _toggle(table: str, post_id: int, user_id: int, job: str = None) -> bool:
+        def write(cursor):
+            cursor.execute(f'DELETE FROM {table} WHERE user_id = ? AND post_id = ?', (user_id, post_id))
+            added = not cursor.rowcount
+            if added:
+                cursor.execute(f'INSERT INTO {table} (user_id, post_id, created_at) VALUES (?, ?, ?)',
+                               (user_id, post_id, _now()))
+            if job:
+                stage_job(cursor, job, post_id, 1 if added else -1)
+            return added
+        
+        return write_coordinator.run(write)
+    
+    @staticmethod
+    def get_user_flags(user_id: int, post_ids: List[int]) -> Dict[int, Dict[str, bool]]:
+        """批量查询用户对一组帖子的点赞/收藏状态（每张表一次 IN 查询）"""
+        flags = {post_id: {'liked': False, 'favorited': False} for post_id in post_ids}
+        if not post_ids:
+            return flags
+        
+        placeholders = ', '.join('?' * len(post_ids))
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for table, key in (('post_likes', 'liked'), ('post_favorites', 'favorited')):
+                cursor.execute(f'''
+                    SELECT post_id FROM {table}
+                    WHERE user_id = ? AND post_id IN ({placeholders})
+                ''', [user_id, *post_ids])
+                for row in cursor.fetchall():
+                    flags[row['post_id']][key] = True
+        return flags
+    
+    @staticmethod
+    def refresh_hot_score(cursor, post_id: int):
+        """计数变化后在同一事务内重算该帖子的热度分"""
+        cursor.execute(f'UPDATE posts SET hot_score = {HOT_SCORE_SQL} WHERE id = ?', (post_id,))
 
 
 class CommentDB:
     """评论数据库操作"""
     
     @staticmethod
-    def create(post_id: int, user_id: str, content: str, parent_id: int = None) -> int:
-        with get_db() as conn:
-            cursor = conn.cursor()
+    def create(post_id: int, user_id: int, content: str, parent_id: int = None) -> int:
+        """发表评论（评论数和热度分经发件箱由写队列更新）"""
+        def write(cursor):
             cursor.execute('''
-                INSERT INTO comments (post_id, user_id, content, parent_id)
-                VALUES (?, ?, ?, ?)
-            ''', (post_id, user_id, content, parent_id))
-            cursor.execute('UPDATE posts SET comments_count = comments_count + 1 WHERE id = ?', (post_id,))
-            conn.commit()
-            return cursor.lastrowid
+                INSERT INTO comments (post_id, user_id, content, parent_id, likes, created_at)
+                VALUES (?, ?, ?, ?, 0, ?)
+            ''', (post_id, user_id, content, parent_id, _now()))
+            comment_id = cursor.lastrowid
+            stage_job(cursor, 'post_comments', post_id, 1)
+            return comment_id
+        
+        return write_coordinator.run(write)
     
     @staticmethod
     def get_post_comments(post_id: int) -> List[Dict]:
-        with get_db() as conn:
+        with read_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT c.*, u.nickname as author_name, u.avatar as author_avatar
+                SELECT c.*, u.username as author_name, u.avatar as author_avatar
                 FROM comments c
                 JOIN users u ON c.user_id = u.id
                 WHERE c.post_id = ?
                 ORDER BY c.created_at ASC
             ''', (post_id,))
             return [dict(row) for row in cursor.fetchall()]
-
-
-# 初始化数据库
-init_database()
@@ -0,0 +1,49 @@
+"""
+帖子互动状态
+按页批量查询当前用户对帖子的点赞/收藏状态，并在请求内缓存：
+一页帖子只需每张表一次 IN 查询，模板中逐条读取不再产生额外查询
+"""
+from typing import Dict, Iterable, Optional
+
+from flask import g, session
+
+from utils.database import PostDB
+
+# 未登录或没有记录时的状态
+EMPTY_FLAGS = {'liked': False, 'favorited': False}
+
+
+class PostFlagsLoader:
+    """单个请求内的帖子点赞/收藏状态加载器（键为帖子主键 id）"""
+    
+    def __init__(self, user_id: Optional[int]):
+        self.user_id = user_id
+        self._cache: Dict[int, Dict[str, bool]] = {}
+    
+    def load(self, post_ids: Iterable[int]) -> Dict[int, Dict[str, bool]]:
+        """批量加载，只查询缓存中没有的帖子"""
+        post_ids = list(dict.fromkeys(post_ids))
+        missing = [post_id for post_id in post_ids if post_id not in self._cache]
+        if missing:
+            if self.user_id is None:
+                self._cache.update((post_id, EMPTY_FLAGS) for post_id in missing)
+            else:
+                self._cache.update(PostDB.get_user_flags(self.user_id, missing))
+        return {post_id: self._cache[post_id] for post_id in post_ids}
+    
+    def get(self, post_id: int) -> Dict[str, bool]:
+        return self.load([post_id])[post_id]
+
+
+def get_post_flags_loader() -> PostFlagsLoader:
+    """当前请求的加载器（首次调用时按登录用户创建）"""
+    loader = g.get('_post_flags_loader')
+    if loader is None:
+        user = session.get('user')
+        loader = g._post_flags_loader = PostFlagsLoader(user['id'] if user else None)
+    return loader
+
+
+def init_feed_state(app):
+    """注册模板函数 post_flags(post_id)"""
+    app.jinja_env.globals['post_flags'] = lambda post_id: get_post_flags_loader().get(post_id)
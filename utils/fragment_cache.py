@@ -0,0 +1,117 @@
+"""
+模板片段缓存
+Jinja 扩展 {% cache key[, ttl] %} ... {% endcache %}：块内渲染结果按 key 缓存在进程内，
+页面渲染时只重新执行块外的动态部分（当前用户、点赞状态、计数等）。
+
+    {% cache ('product_grid', catalog_version) %} ... {% endcache %}
+    {% cache ('post_card', post.id, post.updated_at, post.author, post.date, post.post_id, post.title, post.content), 600 %}
+
+- key 须包含块内用到的全部数据的版本：产品目录用 catalog_version（目录内容指纹），
+  帖子用块内渲染的字段加 updated_at（计数类字段不更新 updated_at，应放在块外）
+- 缓存键自动加上模板名和行号，不同位置的同名 key 互不影响
+- LRU 按渲染结果的 UTF-8 字节数计量，超过 FRAGMENT_CACHE_BYTES 时淘汰最久未用的片段；
+  ttl（秒）省略时只按 LRU 淘汰
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from utils.metrics import registry
+
+# 默认字节预算
+FRAGMENT_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class FragmentCache:
+    """按字节预算淘汰的片段 LRU（线程安全；片段在锁外渲染）"""
+    
+    def __init__(self, max_bytes: int = FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.size = 0
+        self._lock = threading.Lock()
+        # key -> (过期时间或 None, 片段, 字节数)
+        self._entries: 'OrderedDict[Hashable, Tuple[Optional[float], Markup, int]]' = OrderedDict()
+    
+    def get_or_render(self, key: Hashable, ttl: Optional[float], render: Callable[[], Any]) -> Markup:
+        if not self.enabled:
+            return Markup(render())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                registry.inc('senxi_fragment_cache_total', help_text='模板片段缓存查询次数', result='hit')
+                return entry[1]
+        registry.inc('senxi_fragment_cache_total', help_text='模板片段缓存查询次数', result='miss')
+        fragment = Markup(render())
+        self.put(key, fragment, ttl)
+        return fragment
+    
+    def put(self, key: Hashable, fragment: Markup, ttl: Optional[float] = None):
+        size = len(fragment.encode())
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self._entries[key] = (expires, fragment, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                registry.inc('senxi_fragment_cache_evictions_total', help_text='超出字节预算而淘汰的模板片段数')
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 全局片段缓存
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache key[, ttl] %} ... {% endcache %}"""
+    
+    tags = {'cache'}
+    
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(f'{parser.name}:{lineno}'), parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+    
+    @staticmethod
+    def _render(location: str, key: Hashable, ttl: Optional[float], caller: Callable[[], str]) -> Markup:
+        return fragment_cache.get_or_render((location, key), ttl, caller)
+
+
+def init_fragment_cache(app, product_manager):
+    """
+    注册 {% cache %} 标签和模板变量 catalog_version
+
+    配置项：
+        FRAGMENT_CACHE_BYTES: 片段缓存字节预算，默认 8MB
+        FRAGMENT_CACHE_ENABLED: 是否缓存片段，默认 True（关闭时 {% cache %} 块每次照常渲染）
+    """
+    app.config.setdefault('FRAGMENT_CACHE_BYTES', FRAGMENT_CACHE_BYTES)
+    app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+    fragment_cache.max_bytes = app.config['FRAGMENT_CACHE_BYTES']
+    fragment_cache.enabled = app.config['FRAGMENT_CACHE_ENABLED']
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['catalog_version'] = product_manager.version
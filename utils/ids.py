@@ -0,0 +1,123 @@
+"""
+业务编号生成
+Snowflake 结构的 64 位整数：41 位毫秒时间戳 | 10 位 worker id | 12 位序列号，
+编码为定长 13 位 Crockford Base32，字符串顺序与生成顺序一致
+
+- 同一进程内加锁生成，时间回拨或同一毫秒内序列号用尽时沿用/推进逻辑时间，保证单调递增
+- 不同进程通过 worker id 区分：gunicorn master 为存活的 worker 分配不重复的槽位（0-63），
+  worker id = SENXI_NODE_ID（0-15，多机部署时每台机器不同）* 64 + 槽位；
+  单进程运行时可用 SENXI_WORKER_ID（0-1023）直接指定，未指定时取进程号低 10 位
+- 新编号总是大于已有编号，作为唯一索引键时只在 B 树末尾追加
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Tuple
+
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ENCODED_LENGTH = 13
+
+
+def encode(value: int) -> str:
+    """64 位整数编码为定长 Base32"""
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def decode(text: str) -> int:
+    value = 0
+    for char in text:
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+
+class IdGenerator:
+    """线程安全的单调编号生成器"""
+    
+    def __init__(self, worker_id: int = 0):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+        self.set_worker_id(worker_id)
+    
+    def set_worker_id(self, worker_id: int):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker id 超出范围 0-{MAX_WORKER_ID}: {worker_id}')
+        with self._lock:
+            self.worker_id = worker_id
+    
+    def next_int(self) -> int:
+        with self._lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # 时钟回拨或同一毫秒：沿用上次时间，序列号用尽则推进到下一毫秒
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) \
+                | (self.worker_id << SEQUENCE_BITS) | self._sequence
+    
+    def next_id(self, prefix: str = '') -> str:
+        return prefix + encode(self.next_int())
+    
+    def _reset_after_fork(self):
+        # 子进程在分配槽位之前先按进程号区分，避免与父进程生成相同编号
+        self._lock = threading.Lock()
+        self.worker_id = os.getpid() & MAX_WORKER_ID
+
+
+def parse_id(text: str) -> Tuple[datetime, int, int]:
+    """解析编号（不含前缀），返回 (生成时间, worker id, 序列号)"""
+    value = decode(text)
+    sequence = value & MAX_SEQUENCE
+    worker_id = (value >> SEQUENCE_BITS) & MAX_WORKER_ID
+    timestamp_ms = (value >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc), worker_id, sequence
+
+
+def _default_worker_id() -> int:
+    configured = os.environ.get('SENXI_WORKER_ID')
+    if configured is not None:
+        return int(configured)
+    return os.getpid() & MAX_WORKER_ID
+
+
+# 全局生成器
+id_generator = IdGenerator(_default_worker_id())
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=id_generator._reset_after_fork)
+
+
+SLOTS_PER_NODE = 64
+
+
+def configure_worker(slot: int):
+    """按 gunicorn 分配的槽位设置当前进程的 worker id"""
+    if not 0 <= slot < SLOTS_PER_NODE:
+        raise ValueError(f'槽位超出范围 0-{SLOTS_PER_NODE - 1}: {slot}')
+    node_id = int(os.environ.get('SENXI_NODE_ID', 0))
+    id_generator.set_worker_id(node_id * SLOTS_PER_NODE + slot)
+
+
+def new_post_id() -> str:
+    return id_generator.next_id('post_')
+
+
+def new_order_id() -> str:
+    return id_generator.next_id('ORD')
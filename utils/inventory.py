@@ -0,0 +1,443 @@
+"""
+库存预占
+下单前先预占库存（带过期时间），下单时提交预占、放弃时释放，过期自动释放。
+
+- 租约：每个进程按商品从 products.stock 中一次领取一批库存（LEASE_SIZE）记入 inventory_leases，
+  预占从本进程租约的内存计数器中分配，热门商品不必每次预占都争抢 products 的同一行；
+  库存在领取时已从 products.stock 扣除，多个进程之间不会超卖
+- 预占记录：预占在返回前写入 stock_reservations（经写协调器，并发的预占共用一次提交），
+  释放、提交、过期都是 stock_reservations 上的条件 UPDATE（WHERE status = 'held'），
+  因此任何进程都能释放或提交其他进程的预占，同一预占只会生效一次；
+  提交预占与订单写入在同一事务内完成，并从预占所属进程的租约中扣除
+- 内存中的预占只是所属进程的缓存，用于维护租约计数器；其他进程释放或提交后，
+  所属进程在下次对账时同步（此前这部分库存暂不可预占）
+- 对账：后台线程定期让本进程过期的预占失效、同步其他进程结束的预占、续期本进程的租约、
+  把空闲租约的剩余库存退回 products.stock，并回收已退出进程（租约过期）持有的库存
+
+库存紧张时，其他进程租约中的库存要等对账退回后才能被本进程预占（不会超卖，可能短暂少卖）
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from utils.ids import id_generator
+from utils.read_replica import read_db
+from utils.write_coordinator import AbortWrite, write_coordinator
+
+logger = logging.getLogger(__name__)
+
+LEASE_SIZE = 50            # 每次领取的库存数
+LEASE_TTL = 120            # 租约有效期（秒），对账时续期
+DEFAULT_HOLD_TTL = 900     # 预占默认保留时间（秒）
+RECONCILE_INTERVAL = 5.0   # 对账间隔（秒）
+MAX_LEASE_FACTOR = 16      # 抢购集中时租约批量最多放大到 LEASE_SIZE 的倍数
+SOLD_OUT_RECHECK = 1.0     # 领取不到库存后，多久内不再查询数据库（秒）
+
+
+def _utc(timestamp: float) -> str:
+    """时间戳转为与 SQLAlchemy DateTime 列一致的 UTC 字符串"""
+    return datetime.utcfromtimestamp(timestamp).isoformat(' ')
+
+
+class Reservation:
+    """一次预占"""
+    
+    __slots__ = ('reservation_id', 'product_code', 'product_pk', 'quantity', 'user_id',
+                 'expires_at', 'status')
+    
+    def __init__(self, reservation_id: str, product_code: str, product_pk: int, quantity: int,
+                 user_id: Optional[int], expires_at: float):
+        self.reservation_id = reservation_id
+        self.product_code = product_code
+        self.product_pk = product_pk
+        self.quantity = quantity
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.status = 'held'  # held, committed, released, expired
+    
+    def to_dict(self) -> Dict:
+        return {
+            'reservation_id': self.reservation_id,
+            'product_id': self.product_code,
+            'quantity': self.quantity,
+            'status': self.status,
+            'expires_at': _utc(self.expires_at),
+        }
+
+
+class SkuCounter:
+    """单个商品在本进程内的库存计数"""
+    
+    __slots__ = ('lock', 'product_pk', 'leased', 'held', 'returning', 'active', 'lease_factor',
+                 'leased_at', 'sold_out_until')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.product_pk: Optional[int] = None
+        self.leased = 0     # 本进程租约中的库存
+        self.held = 0       # 其中已被预占的数量
+        self.returning = 0  # 对账中正在退回 products.stock 的数量（提交前不可预占）
+        self.active = False  # 上次对账以来是否有预占
+        self.lease_factor = 1
+        self.leased_at = 0.0
+        self.sold_out_until = 0.0
+    
+    @property
+    def available(self) -> int:
+        return self.leased - self.held - self.returning
+
+
+class InventoryEngine:
+    """
+    库存预占引擎（每个进程一个实例）
+
+    用法:
+        reservation = inventory.reserve('prod_001', 2, user_id=1)
+        OrderDB.create(user_id, [{'product_id': 'prod_001', 'quantity': 2,
+                                  'reservation_id': reservation.reservation_id}], shipping_info)
+    """
+    
+    def __init__(self, lease_size: int = LEASE_SIZE, hold_ttl: int = DEFAULT_HOLD_TTL):
+        self.lease_size = lease_size
+        self.hold_ttl = hold_ttl
+        self._app = None
+        self._reset()
+    
+    def _reset(self):
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._lock = threading.Lock()
+        self._counters: Dict[str, SkuCounter] = {}
+        # 本进程持有、仍为 held 的预占（缓存；以 stock_reservations 为准）
+        self._reservations: Dict[str, Reservation] = {}
+        self._pid = None
+        self._stopping = threading.Event()
+    
+    def init_app(self, app):
+        self._app = app
+    
+    # ==================== 预占 / 释放 ====================
+    
+    def reserve(self, product_code: str, quantity: int, user_id: Optional[int] = None,
+                ttl: Optional[int] = None) -> Optional[Reservation]:
+        """预占库存（返回时预占已写入数据库），库存不足或商品不存在时返回 None"""
+        if quantity <= 0:
+            raise ValueError('预占数量必须大于 0')
+        self._ensure_started()
+        counter = self._counter(product_code)
+        if counter is None:
+            return None
+        with counter.lock:
+            if counter.available < quantity and not self._lease(counter, product_code, quantity):
+                return None
+            counter.held += quantity
+            counter.active = True
+        now = time.time()
+        reservation = Reservation(id_generator.next_id('RSV'), product_code, counter.product_pk,
+                                  quantity, user_id, now + (ttl or self.hold_ttl))
+        owner = self.owner
+        
+        def write(cursor):
+            cursor.execute('''
+                INSERT INTO stock_reservations (reservation_id, product_id, user_id, owner,
+                    quantity, status, expires_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, 'held', ?, ?, ?)
+            ''', (reservation.reservation_id, reservation.product_pk, user_id, owner, quantity,
+                  _utc(reservation.expires_at), _utc(now), _utc(now)))
+        
+        try:
+            self._run(write)
+        except Exception:
+            with counter.lock:
+                counter.held -= quantity
+            raise
+        self._reservations[reservation.reservation_id] = reservation
+        return reservation
+    
+    def release(self, reservation_id: str, user_id: Optional[int] = None) -> bool:
+        """释放预占（只能释放仍处于 held 状态的预占，可以属于其他进程）"""
+        now_text = _utc(time.time())
+        
+        def write(cursor):
+            cursor.execute('''
+                UPDATE stock_reservations SET status = 'released', updated_at = ?
+                WHERE reservation_id = ? AND status = 'held' AND (? IS NULL OR user_id = ?)
+                RETURNING reservation_id
+            ''', (now_text, reservation_id, user_id, user_id))
+            return cursor.fetchone() is not None
+        
+        if not self._run(write):
+            return False
+        self._forget(reservation_id, 'released')
+        return True
+    
+    def get(self, reservation_id: str) -> Optional[Reservation]:
+        """本进程持有、仍为 held 的预占"""
+        return self._reservations.get(reservation_id)
+    
+    def _forget(self, reservation_id: str, status: str):
+        """
+        预占已在数据库中结束后更新本进程的计数（不属于本进程或已处理过时忽略）
+
+        释放、过期的库存仍在本进程租约中，可再次预占；提交的库存已从租约中扣除
+        """
+        reservation = self._reservations.pop(reservation_id, None)
+        if reservation is None:
+            return
+        counter = self._counters[reservation.product_code]
+        with counter.lock:
+            reservation.status = status
+            counter.held -= reservation.quantity
+            if status == 'committed':
+                counter.leased -= reservation.quantity
+    
+    def _counter(self, product_code: str) -> Optional[SkuCounter]:
+        """商品的计数器；商品不存在时返回 None（不为客户端传入的任意编号创建计数器）"""
+        counter = self._counters.get(product_code)
+        if counter is None:
+            with self._app.app_context(), read_db() as conn:
+                row = conn.execute('SELECT id FROM products WHERE product_id = ?', (product_code,)).fetchone()
+            if row is None:
+                return None
+            with self._lock:
+                counter = self._counters.setdefault(product_code, SkuCounter())
+                if counter.product_pk is None:
+                    counter.product_pk = row[0]
+        return counter
+    
+    def _lease(self, counter: SkuCounter, product_code: str, quantity: int) -> bool:
+        """
+        从 products.stock 领取库存（调用方持有商品锁），不足 quantity 时不领取
+
+        上一批在 1 秒内用完时批量翻倍（热门商品少查库），否则恢复为 lease_size；
+        领取失败后 SOLD_OUT_RECHECK 秒内直接返回，售罄商品的抢购请求不再查询数据库
+        """
+        now = time.time()
+        if now < counter.sold_out_until:
+            return False
+        if now - counter.leased_at < 1.0:
+            counter.lease_factor = min(counter.lease_factor * 2, MAX_LEASE_FACTOR)
+        else:
+            counter.lease_factor = 1
+        shortfall = quantity - counter.available
+        wanted = max(shortfall, self.lease_size * counter.lease_factor)
+        expires_at = _utc(time.time() + LEASE_TTL)
+        owner = self.owner
+        
+        def write(cursor):
+            cursor.execute('SELECT id, stock FROM products WHERE product_id = ?', (product_code,))
+            row = cursor.fetchone()
+            if row is None:
+                raise AbortWrite((None, 0))
+            if row['stock'] < shortfall:
+                raise AbortWrite((row['id'], 0))
+            # 余量不多时只领取需要的数量，把库存留给其他进程和不经预占的下单
+            take = wanted if row['stock'] >= wanted * 2 else shortfall
+            cursor.execute('UPDATE products SET stock = stock - ?, updated_at = ? WHERE id = ?',
+                           (take, _utc(time.time()), row['id']))
+            cursor.execute('''
+                INSERT INTO inventory_leases (product_id, owner, quantity, expires_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (product_id, owner)
+                DO UPDATE SET quantity = quantity + excluded.quantity, expires_at = excluded.expires_at
+            ''', (row['id'], owner, take, expires_at, _utc(time.time())))
+            return row['id'], take
+        
+        product_pk, taken = self._run(write)
+        if product_pk is not None:
+            counter.product_pk = product_pk
+        counter.leased += taken
+        counter.leased_at = time.time()
+        if not taken:
+            counter.sold_out_until = counter.leased_at + SOLD_OUT_RECHECK
+        return taken > 0
+    
+    # ==================== 提交（下单） ====================
+    
+    @staticmethod
+    def commit_sql(cursor, reservation_id: str, user_id: int, order_id: Optional[str],
+                   product_pk: Optional[int] = None, quantity: Optional[int] = None) -> bool:
+        """
+        在调用方的事务内提交预占：从所属进程的租约中扣除、累加销量
+
+        预占不存在、不属于该用户、已结束或已过期，或与给定的商品/数量不符时返回 False（不做任何修改）
+        """
+        now = _utc(time.time())
+        cursor.execute('''
+            UPDATE stock_reservations SET status = 'committed', order_id = ?, updated_at = ?
+            WHERE reservation_id = ? AND status = 'held' AND user_id = ? AND expires_at > ?
+              AND (? IS NULL OR product_id = ?) AND (? IS NULL OR quantity = ?)
+            RETURNING product_id, owner, quantity
+        ''', (order_id, now, reservation_id, user_id, now, product_pk, product_pk, quantity, quantity))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        cursor.execute('''
+            UPDATE inventory_leases SET quantity = quantity - ?, updated_at = ?
+            WHERE product_id = ? AND owner = ?
+        ''', (row['quantity'], now, row['product_id'], row['owner']))
+        cursor.execute('UPDATE products SET sales = sales + ? WHERE id = ?', (row['quantity'], row['product_id']))
+        return True
+    
+    def settle(self, reservation_ids: Iterable[str]):
+        """提交预占的事务成功后调用：本进程持有的预占从租约计数中扣除（其他进程的在其对账时同步）"""
+        for reservation_id in reservation_ids:
+            self._forget(reservation_id, 'committed')
+    
+    def commit(self, reservation_id: str, user_id: int, order_id: Optional[str] = None) -> bool:
+        """单独提交一个预占（下单时由 OrderDB.create 在订单事务内提交）"""
+        if not self._run(lambda cursor: self.commit_sql(cursor, reservation_id, user_id, order_id)):
+            return False
+        self.settle([reservation_id])
+        return True
+    
+    # ==================== 对账 ====================
+    
+    def reconcile(self):
+        """
+        对账：
+        1. 本进程过期的预占失效
+        2. 同步其他进程释放或提交的本进程预占
+        3. 上次对账以来没有预占的商品，把租约中未预占的库存退回 products.stock
+        4. 续期本进程的租约
+        5. 回收过期租约（进程已退出）的库存，并让其预占失效
+        """
+        now = time.time()
+        cached = list(self._reservations)
+        
+        returns = []
+        for counter in list(self._counters.values()):
+            with counter.lock:
+                if not counter.active and counter.available > 0 and counter.product_pk is not None:
+                    # 提交前先标记为退回中，期间的预占不会用到这部分库存
+                    counter.returning = counter.available
+                    returns.append((counter, counter.product_pk, counter.returning))
+                counter.active = False
+        
+        owner, now_text, expires_at = self.owner, _utc(now), _utc(now + LEASE_TTL)
+        
+        def write(cursor):
+            cursor.execute('''
+                UPDATE stock_reservations SET status = 'expired', updated_at = ?
+                WHERE owner = ? AND status = 'held' AND expires_at <= ?
+                RETURNING reservation_id
+            ''', (now_text, owner, now_text))
+            ended = {row[0]: 'expired' for row in cursor.fetchall()}
+            
+            cursor.execute("SELECT reservation_id FROM stock_reservations WHERE owner = ? AND status = 'held'",
+                           (owner,))
+            held = {row[0] for row in cursor.fetchall()}
+            gone = [reservation_id for reservation_id in cached
+                    if reservation_id not in held and reservation_id not in ended]
+            for start in range(0, len(gone), 500):
+                chunk = gone[start:start + 500]
+                cursor.execute(f'''
+                    SELECT reservation_id, status FROM stock_reservations
+                    WHERE reservation_id IN ({', '.join('?' * len(chunk))})
+                ''', chunk)
+                ended.update((row[0], row[1]) for row in cursor.fetchall())
+            
+            for _, product_pk, quantity in returns:
+                cursor.execute('UPDATE products SET stock = stock + ? WHERE id = ?', (quantity, product_pk))
+                cursor.execute('''
+                    UPDATE inventory_leases SET quantity = quantity - ?, updated_at = ?
+                    WHERE product_id = ? AND owner = ?
+                ''', (quantity, now_text, product_pk, owner))
+            cursor.execute('UPDATE inventory_leases SET expires_at = ? WHERE owner = ?', (expires_at, owner))
+            cursor.execute('DELETE FROM inventory_leases WHERE owner = ? AND quantity = 0', (owner,))
+            
+            cursor.execute('SELECT DISTINCT owner FROM inventory_leases WHERE expires_at < ?', (now_text,))
+            for (dead_owner,) in cursor.fetchall():
+                self._reclaim_sql(cursor, dead_owner, now_text)
+            return ended
+        
+        committed = False
+        try:
+            ended = self._run(write)
+            committed = True
+        finally:
+            # 退回的库存提交后才从租约计数中扣除，失败时恢复为可预占
+            for counter, _, quantity in returns:
+                with counter.lock:
+                    if committed:
+                        counter.leased -= quantity
+                    counter.returning = 0
+        for reservation_id, status in ended.items():
+            self._forget(reservation_id, status)
+    
+    @staticmethod
+    def _reclaim_sql(cursor, owner: str, now_text: str):
+        """退回某个进程全部租约中的库存，并让其未提交的预占失效"""
+        cursor.execute('''
+            UPDATE products SET stock = stock + COALESCE((
+                SELECT SUM(quantity) FROM inventory_leases l
+                WHERE l.product_id = products.id AND l.owner = ?
+            ), 0)
+            WHERE id IN (SELECT product_id FROM inventory_leases WHERE owner = ?)
+        ''', (owner, owner))
+        cursor.execute('DELETE FROM inventory_leases WHERE owner = ?', (owner,))
+        cursor.execute('''
+            UPDATE stock_reservations SET status = 'expired', updated_at = ?
+            WHERE owner = ? AND status = 'held'
+        ''', (now_text, owner))
+    
+    def shutdown(self):
+        """进程退出：未提交的预占失效，租约全部退回"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        owner = self.owner
+        try:
+            self._run(lambda cursor: self._reclaim_sql(cursor, owner, _utc(time.time())))
+            self._reservations.clear()
+        except Exception:
+            logger.exception('退回库存租约失败，将在租约过期后由其他进程回收')
+    
+    # ==================== 后台线程 ====================
+    
+    def _run(self, write):
+        with self._app.app_context():
+            return write_coordinator.run(write)
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._background, name='inventory', daemon=True).start()
+    
+    def _background(self):
+        while not self._stopping.wait(RECONCILE_INTERVAL):
+            try:
+                self.reconcile()
+            except Exception:
+                logger.exception('库存对账失败')
+
+
+# 全局预占引擎
+inventory = InventoryEngine()
+
+if hasattr(os, 'register_at_fork'):
+    # 子进程不继承父进程的租约和预占
+    os.register_at_fork(after_in_child=inventory._reset)
+
+
+def init_inventory(app):
+    """
+    配置项：
+        INVENTORY_LEASE_SIZE: 每次从数据库领取的库存数，默认 50
+        INVENTORY_HOLD_TTL: 预占默认保留时间（秒），默认 900
+    """
+    app.config.setdefault('INVENTORY_LEASE_SIZE', LEASE_SIZE)
+    app.config.setdefault('INVENTORY_HOLD_TTL', DEFAULT_HOLD_TTL)
+    inventory.lease_size = app.config['INVENTORY_LEASE_SIZE']
+    inventory.hold_ttl = app.config['INVENTORY_HOLD_TTL']
+    inventory.init_app(app)
+    atexit.register(inventory.shutdown)
@@ -0,0 +1,326 @@
+"""
+请求级性能指标
+统计每个请求的 SQL 条数与耗时（SQLAlchemy 与 utils.database 两条路径）、模板渲染耗时、
+智能导购/AI管家业务逻辑耗时，按路由汇总为直方图并以 Prometheus 文本格式输出
+
+注意：指标按进程统计，gunicorn 多 worker 时每次抓取只反映处理该请求的 worker
+"""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from flask import Response, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """累积分桶直方图"""
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+    
+    def render(self, name: str, labels: str) -> List[str]:
+        """输出 Prometheus 文本格式行"""
+        lines = []
+        cumulative = 0
+        sep = ',' if labels else ''
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.total}')
+        return lines
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+    
+    # 指标名 -> (说明, 分桶)
+    HISTOGRAMS = {
+        'senxi_request_duration_seconds': ('请求总耗时', LATENCY_BUCKETS),
+        'senxi_request_db_queries': ('单个请求的 SQL 条数', QUERY_COUNT_BUCKETS),
+        'senxi_request_db_seconds': ('单个请求的 SQL 耗时', LATENCY_BUCKETS),
+        'senxi_request_template_seconds': ('单个请求的模板渲染耗时', LATENCY_BUCKETS),
+        'senxi_logic_seconds': ('业务模块耗时', LATENCY_BUCKETS),
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._counter_help: Dict[str, str] = {}
+    
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _format_labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.HISTOGRAMS[name][1])
+            histogram.observe(value)
+    
+    def inc(self, name: str, amount: float = 1, help_text: str = '', **labels):
+        with self._lock:
+            self._counters[(name, _format_labels(labels))] += amount
+            if help_text:
+                self._counter_help.setdefault(name, help_text)
+    
+    def reset(self):
+        """清空全部指标（启动预热后调用，预热请求不计入）"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+    
+    def render(self) -> str:
+        """渲染全部指标为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                series = [(labels, h) for (n, labels), h in self._histograms.items() if n == name]
+                if not series:
+                    continue
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in sorted(series, key=lambda item: item[0]):
+                    lines.extend(histogram.render(name, labels))
+            
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                lines.append(f'# HELP {name} {self._counter_help.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+                for (n, labels), value in sorted(self._counters.items()):
+                    if n == name:
+                        lines.append(f'{name}{{{labels}}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: Dict) -> str:
+    """格式化标签，转义引号和反斜杠"""
+    parts = []
+    for key in sorted(labels):
+        value = str(labels[key]).replace('\\', '\\\\').replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return ','.join(parts)
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+
+# ==================== 请求级统计 ====================
+
+class RequestStats:
+    """单个请求的统计数据"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements: List[Tuple[str, float]] = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_started = None
+        self.logic_time: Dict[str, float] = defaultdict(float)
+    
+    def record_statement(self, statement: str, elapsed: float):
+        self.statements.append((statement, elapsed))
+        self.db_time += elapsed
+
+
+def current_stats():
+    """当前请求的统计对象（请求之外返回 None；可交给其他线程代为记录，如写线程执行的 SQL）"""
+    if not has_request_context():
+        return None
+    return g.get('_request_stats')
+
+
+def record_statement(statement: str, elapsed: float):
+    """记录一条 SQL 执行"""
+    stats = current_stats()
+    if stats is not None:
+        stats.record_statement(statement, elapsed)
+
+
+@contextmanager
+def track(component: str):
+    """统计一段业务逻辑的耗时，如 with track('butler'): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = current_stats()
+        if stats is not None:
+            stats.logic_time[component] += elapsed
+        registry.observe('senxi_logic_seconds', elapsed, component=component)
+
+
+# ==================== utils.database 连接埋点 ====================
+
+class InstrumentedCursor:
+    """记录 execute/executemany 耗时的游标代理"""
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, parameters)
+        finally:
+            record_statement(sql, time.perf_counter() - started)
+    
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_of_parameters)
+        finally:
+            record_statement(sql, time.perf_counter() - started)
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """游标经过埋点的连接代理"""
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_connection(conn):
+    """包装 DBAPI 连接，使其执行的语句计入当前请求"""
+    return InstrumentedConnection(conn)
+
+
+# ==================== SQLAlchemy 埋点 ====================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['_query_started'].pop()
+    record_statement(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    # 执行失败的语句不会触发 after_cursor_execute，需弹出开始时间，否则会错配下一条语句的耗时
+    conn = exception_context.connection
+    if conn is not None and exception_context.statement is not None:
+        started = conn.info.get('_query_started')
+        if started:
+            started.pop()
+
+
+# ==================== Flask 集成 ====================
+
+def init_metrics(app):
+    """
+    注册请求钩子、SQLAlchemy 事件、模板信号和 /metrics 接口
+
+    配置项：
+        METRICS_SLOW_REQUEST_MS: 慢请求阈值（毫秒），默认 500
+        METRICS_SLOW_SAMPLE_RATE: 慢请求采样率，默认 1.0（全部记录语句列表）
+    """
+    app.config.setdefault('METRICS_SLOW_REQUEST_MS', 500)
+    app.config.setdefault('METRICS_SLOW_SAMPLE_RATE', 1.0)
+    
+    # 监听函数注册在全局 Engine 上，同一进程多次调用（多个应用实例）时只注册一次，避免重复计数
+    for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                           ('after_cursor_execute', _after_cursor_execute),
+                           ('handle_error', _handle_error)):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+    
+    def _before_render(sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None and stats.template_started is None:
+            stats.template_started = time.perf_counter()
+    
+    def _rendered(sender, template, context, **extra):
+        stats = current_stats()
+        if stats is not None and stats.template_started is not None:
+            stats.template_time += time.perf_counter() - stats.template_started
+            stats.template_started = None
+    
+    # 信号默认弱引用接收函数，局部函数需要强引用
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_rendered, app, weak=False)
+    
+    @app.before_request
+    def _start_request_stats():
+        g._request_stats = RequestStats()
+    
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = g.pop('_request_stats', None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        
+        elapsed = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = {'route': route, 'method': request.method}
+        registry.observe('senxi_request_duration_seconds', elapsed, **labels)
+        registry.observe('senxi_request_db_queries', len(stats.statements), **labels)
+        registry.observe('senxi_request_db_seconds', stats.db_time, **labels)
+        registry.observe('senxi_request_template_seconds', stats.template_time, **labels)
+        registry.inc('senxi_requests_total', help_text='请求总数',
+                     status=response.status_code, **labels)
+        
+        if elapsed * 1000 >= app.config['METRICS_SLOW_REQUEST_MS']:
+            registry.inc('senxi_slow_requests_total', help_text='慢请求数', **labels)
+            if random.random() < app.config['METRICS_SLOW_SAMPLE_RATE']:
+                _log_slow_request(route, elapsed, stats)
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus 指标"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _log_slow_request(route: str, elapsed: float, stats: RequestStats):
+    """输出慢请求的语句列表"""
+    parts = [
+        f'慢请求 {request.method} {route} 耗时 {elapsed * 1000:.1f}ms',
+        f'SQL {len(stats.statements)} 条/{stats.db_time * 1000:.1f}ms',
+        f'模板 {stats.template_time * 1000:.1f}ms',
+    ]
+    parts.extend(f'{name} {t * 1000:.1f}ms' for name, t in stats.logic_time.items())
+    lines = ['，'.join(parts)]
+    for statement, statement_elapsed in stats.statements:
+        lines.append(f'  [{statement_elapsed * 1000:.2f}ms] {" ".join(statement.split())}')
+    logger.warning('\n'.join(lines))
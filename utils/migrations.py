@@ -0,0 +1,303 @@
+"""
+数据库迁移
+按版本号顺序执行增量 DDL，已应用的版本记录在 SQLite 的 PRAGMA user_version 中
+
+- 加列、建索引直接使用 ALTER TABLE / CREATE INDEX，幂等，可在线执行
+- 需要改约束（如 NOT NULL）时用影子表重建：触发器同步增量写入，分批复制存量数据，
+  最后在一个短事务内替换原表，复制期间不阻塞读写；新表结构写死在迁移中，不引用当前模型
+
+新增迁移时在 MIGRATIONS 末尾追加一条，版本号递增；models.py 同步修改，
+使全新建库（create_all）与迁移后的结构保持一致
+"""
+import re
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple
+
+from models import db
+from utils.ranking import HOT_SCORE_SQL
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class Migration:
+    """一个版本的迁移"""
+    
+    def __init__(self, version: int, description: str, operations: List[Callable]):
+        self.version = version
+        self.description = description
+        self.operations = operations
+
+
+# ==================== 迁移操作 ====================
+
+def _columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def _id_batches(conn, table: str, batch_size: int) -> Iterator[Tuple[int, int]]:
+    """按主键划分批次，逐批返回 (low, high]，区间在上一批提交后才计算"""
+    last_id = 0
+    while True:
+        row = conn.execute(f'''
+            SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)
+        ''', (last_id, batch_size)).fetchone()
+        if row[0] is None:
+            return
+        yield last_id, row[0]
+        last_id = row[0]
+
+
+def add_column(table: str, column_ddl: str) -> Callable:
+    """
+    添加列（已存在则跳过）
+
+    Args:
+        column_ddl: 列定义，如 "status VARCHAR(20) DEFAULT 'active'"
+    """
+    def operation(conn):
+        name = column_ddl.split()[0]
+        if name not in _columns(conn, table):
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column_ddl}')
+            conn.commit()
+    return operation
+
+
+def create_index(name: str, table: str, columns: List[str], unique: bool = False) -> Callable:
+    """创建索引（已存在则跳过）"""
+    def operation(conn):
+        conn.execute('CREATE {}INDEX IF NOT EXISTS {} ON {} ({})'.format(
+            'UNIQUE ' if unique else '', name, table, ', '.join(columns)
+        ))
+        conn.commit()
+    return operation
+
+
+def drop_index(name: str) -> Callable:
+    """删除索引（不存在则跳过）"""
+    def operation(conn):
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+        conn.commit()
+    return operation
+
+
+def backfill(table: str, assignments: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Callable:
+    """
+    按主键分批执行 UPDATE，每批一个事务，避免长时间持有写锁
+
+    Args:
+        assignments: SET 子句，如 "hot_score = hot_score(likes, comment_count, views, created_at)"
+    """
+    def operation(conn):
+        for low, high in _id_batches(conn, table, batch_size):
+            conn.execute(f'UPDATE {table} SET {assignments} WHERE id > ? AND id <= ?', (low, high))
+            conn.commit()
+    return operation
+
+
+def rebuild_table(table: str, create_sql: str, indexes: List[str] = (),
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> Callable:
+    """
+    按迁移中固定的建表语句重建表（不读取 models.py，之后修改模型不会改变已发布迁移的结果）
+
+    1. 建影子表，在原表上建触发器，把复制期间的增删改同步到影子表
+    2. 按主键分批复制存量数据（跳过触发器已同步的行），每批一个事务；
+       任何一行违反新约束（UNIQUE、NOT NULL 等）时迁移失败并清理影子表，不丢弃数据
+    3. 短事务内核对行数，删除原表、影子表改名并重建索引
+
+    Args:
+        create_sql: 新表的 CREATE TABLE 语句（表名为 table）
+        indexes: 新表上的 CREATE INDEX 语句
+
+    新旧表同名的列会被复制；新增的 NOT NULL 列须带默认值
+    """
+    def operation(conn):
+        shadow = f'_migrate_{table}'
+        
+        _drop_sync_triggers(conn, table)
+        conn.execute(f'DROP TABLE IF EXISTS {shadow}')
+        conn.execute(re.sub(rf'^\s*CREATE TABLE {table}\b', f'CREATE TABLE {shadow}', create_sql, count=1))
+        
+        existing = set(_columns(conn, table))
+        columns = [column for column in _columns(conn, shadow) if column in existing]
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        conn.executescript(f'''
+            CREATE TRIGGER {shadow}_ai AFTER INSERT ON {table} BEGIN
+                DELETE FROM {shadow} WHERE id = NEW.id;
+                INSERT INTO {shadow} ({column_list}) VALUES ({new_values});
+            END;
+            CREATE TRIGGER {shadow}_au AFTER UPDATE ON {table} BEGIN
+                DELETE FROM {shadow} WHERE id = OLD.id;
+                INSERT INTO {shadow} ({column_list}) VALUES ({new_values});
+            END;
+            CREATE TRIGGER {shadow}_ad AFTER DELETE ON {table} BEGIN
+                DELETE FROM {shadow} WHERE id = OLD.id;
+            END;
+        ''')
+        
+        try:
+            # 分批复制存量数据（触发器已同步的行以影子表中的为准）
+            for low, high in _id_batches(conn, table, batch_size):
+                conn.execute(f'''
+                    INSERT INTO {shadow} ({column_list})
+                    SELECT {column_list} FROM {table} AS t
+                    WHERE t.id > ? AND t.id <= ?
+                      AND NOT EXISTS (SELECT 1 FROM {shadow} AS s WHERE s.id = t.id)
+                ''', (low, high))
+                conn.commit()
+            
+            # 替换原表
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                copied = conn.execute(f'SELECT COUNT(*) FROM {shadow}').fetchone()[0]
+                total = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                if copied != total:
+                    raise RuntimeError(f'重建 {table} 时行数不一致：原表 {total} 行，新表 {copied} 行')
+                _drop_sync_triggers(conn, table)
+                conn.execute(f'DROP TABLE {table}')
+                conn.execute(f'ALTER TABLE {shadow} RENAME TO {table}')
+                for index_sql in indexes:
+                    conn.execute(index_sql)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        except Exception:
+            # 原表保持不变，清理触发器和影子表后抛出（如违反新约束的 IntegrityError）
+            conn.rollback()
+            _drop_sync_triggers(conn, table)
+            conn.execute(f'DROP TABLE IF EXISTS {shadow}')
+            conn.commit()
+            raise
+    return operation
+
+
+def _drop_sync_triggers(conn, table: str):
+    for suffix in ('ai', 'au', 'ad'):
+        conn.execute(f'DROP TRIGGER IF EXISTS _migrate_{table}_{suffix}')
+
+
+# ==================== 迁移列表 ====================
+
+# 迁移 2 重建后的 users 表（固定在迁移中，不随 models.py 变化）
+USERS_V2_SQL = '''
+    CREATE TABLE users (
+        id INTEGER NOT NULL,
+        phone VARCHAR(11),
+        email VARCHAR(120),
+        username VARCHAR(80),
+        password_hash VARCHAR(128),
+        avatar VARCHAR(200),
+        level VARCHAR(10),
+        points INTEGER,
+        wechat_openid VARCHAR(100),
+        qq_openid VARCHAR(100),
+        github_id VARCHAR(100),
+        created_at DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (email),
+        UNIQUE (wechat_openid),
+        UNIQUE (qq_openid),
+        UNIQUE (github_id)
+    )
+'''
+
+MIGRATIONS = [
+    Migration(1, '仓储层统一后新增的列', [
+        add_column('products', "status VARCHAR(20) DEFAULT 'active'"),
+        add_column('orders', 'updated_at DATETIME'),
+        add_column('order_items', 'product_name VARCHAR(200)'),
+        add_column('order_items', 'product_image VARCHAR(500)'),
+    ]),
+    Migration(2, 'users.phone 改为可空（第三方登录用户没有手机号）', [
+        rebuild_table('users', USERS_V2_SQL, ['CREATE UNIQUE INDEX ix_users_phone ON users (phone)']),
+    ]),
+    Migration(3, '帖子热度分及索引', [
+        add_column('posts', 'hot_score FLOAT'),
+        backfill('posts', f'hot_score = {HOT_SCORE_SQL}'),
+        create_index('ix_posts_hot_score', 'posts', ['hot_score']),
+    ]),
+    Migration(4, '订单列表分页索引', [
+        create_index('ix_orders_user_created', 'orders', ['user_id', 'created_at']),
+        create_index('ix_orders_user_status_created', 'orders', ['user_id', 'status', 'created_at']),
+        create_index('ix_order_items_order_id', 'order_items', ['order_id']),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+# ==================== 执行 ====================
+
+def get_version(conn) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _set_version(conn, version: int):
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+    conn.commit()
+
+
+@contextmanager
+def _migration_lock():
+    """多个进程同时启动时（如 gunicorn 未开启 preload），保证只有一个进程执行迁移"""
+    database = db.engine.url.database
+    if fcntl is None or not database or database == ':memory:':
+        yield
+        return
+    with open(f'{database}.migrate.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def upgrade_schema(log: Callable[[str], None] = print) -> int:
+    """
+    创建缺失的表并执行未应用的迁移（需在应用上下文中调用）
+
+    全新的数据库由 create_all 直接建成最新结构，只记录版本号
+
+    Returns:
+        执行后的版本号
+    """
+    with _migration_lock():
+        conn = db.engine.raw_connection()
+        try:
+            fresh = conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+            ).fetchone()[0] == 0
+            db.create_all()
+            
+            if fresh:
+                _set_version(conn, LATEST_VERSION)
+                return LATEST_VERSION
+            
+            version = get_version(conn)
+            if version >= LATEST_VERSION:
+                return version
+            
+            # 重建表时需要先删除被外键引用的原表
+            foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+            conn.execute('PRAGMA foreign_keys = OFF')
+            try:
+                for migration in MIGRATIONS:
+                    if migration.version <= version:
+                        continue
+                    log(f'执行数据库迁移 {migration.version}: {migration.description}')
+                    for operation in migration.operations:
+                        operation(conn)
+                    _set_version(conn, migration.version)
+                    version = migration.version
+            finally:
+                conn.execute(f'PRAGMA foreign_keys = {foreign_keys}')
+            return version
+        finally:
+            conn.close()
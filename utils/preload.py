@@ -0,0 +1,73 @@
+"""
+目录预加载与只读化
+在 gunicorn master 进程中一次性构建只读查找结构，fork 出的 worker 以写时复制方式共享内存页
+"""
+import gc
+from types import MappingProxyType
+from typing import Any
+
+
+# 需要只读化的类级别查找表
+FROZEN_CLASS_TABLES = {
+    'SmartGuideSystem': (
+        'STEPS', 'REGION_CHARACTERISTICS', 'AIR_PROBLEMS',
+        'USER_GROUPS', 'SPACE_TYPES', 'BUDGET_RANGES'
+    ),
+    'AirButler': ('INTENT_KEYWORDS', 'SUBTOPIC_RULES', 'QUICK_REPLIES', 'KNOWLEDGE_BASE', 'PRODUCT_PITCHES'),
+}
+
+
+def freeze(value: Any) -> Any:
+    """递归转换为只读结构：dict -> MappingProxyType，list -> tuple，set -> frozenset"""
+    if isinstance(value, MappingProxyType):
+        return value
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def freeze_records(records) -> tuple:
+    """
+    只读化记录列表
+
+    记录及其内部的 dict 保持原样（需要直接序列化为 JSON），
+    列表容器及记录内的列表字段转为 tuple
+    """
+    frozen = []
+    for record in records:
+        frozen.append({
+            key: tuple(item) if isinstance(item, list) else item
+            for key, item in record.items()
+        })
+    return tuple(frozen)
+
+
+def freeze_catalog(*components) -> None:
+    """
+    只读化各业务组件的静态目录
+
+    Args:
+        components: SmartGuideSystem / AirButler / ProductManager 实例
+    """
+    for component in components:
+        cls = type(component)
+        for attr in FROZEN_CLASS_TABLES.get(cls.__name__, ()):
+            setattr(cls, attr, freeze(getattr(cls, attr)))
+        
+        if hasattr(component, 'freeze'):
+            component.freeze()
+
+
+def freeze_heap() -> None:
+    """
+    冻结当前堆对象
+
+    先完成一次完整回收，再把存活对象移入永久代，避免 worker 中的 GC
+    触碰这些对象头而导致共享页被复制
+    """
+    gc.collect()
+    gc.freeze()
@@ -2,7 +2,46 @@
 产品管理模块
 森系智韵智能空气管理平台
 """
-from typing import Dict, List, Optional
+import hashlib
+import json
+import re
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+
+from utils.preload import freeze_records
+
+# 对比维度：(字段, 名称, 单位, 更优方向, 区间取值)
+# 区间取值为 'max'/'min' 的字段是 "14-24㎡"、"≤35dB" 这类范围字符串，解析后按上限/下限比较
+COMPARE_DIMENSIONS = (
+    ('price', '价格', '元', 'low', None),
+    ('cadr_pm25', 'PM2.5 CADR', 'm³/h', 'high', None),
+    ('cadr_formaldehyde', '甲醛 CADR', 'm³/h', 'high', None),
+    ('applicable_area', '适用面积', '㎡', 'high', 'max'),
+    ('noise_range', '噪音范围', 'dB', 'low', 'min'),
+    ('rating', '用户评分', '分', 'high', None),
+)
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_range(text) -> Optional[Tuple[Optional[float], Optional[float]]]:
+    """
+    解析范围字符串为 (下限, 上限)，无法解析时返回 None
+
+    "14-24㎡" -> (14, 24)，"≤35dB" -> (None, 35)，"≥20㎡" -> (20, None)，"车内空间" -> None
+    """
+    if not isinstance(text, str):
+        return None
+    numbers = [float(n) for n in _NUMBER.findall(text)]
+    if not numbers:
+        return None
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    if '≤' in text or '<' in text:
+        return None, numbers[0]
+    if '≥' in text or '>' in text:
+        return numbers[0], None
+    return numbers[0], numbers[0]
 
 
 class ProductManager:
@@ -12,6 +51,19 @@ class ProductManager:
         """初始化产品数据"""
         self.products = self._init_products()
         self.categories = self._init_categories()
+        self._products_by_id = {p['id']: p for p in self.products}
+        self._build_compare_table()
+        # 目录内容指纹，用作模板片段缓存键（目录变化时旧片段自然失效）
+        self.version = hashlib.sha1(json.dumps([self.products, self.categories], sort_keys=True,
+                                               ensure_ascii=False).encode()).hexdigest()[:12]
+    
+    def freeze(self):
+        """只读化产品目录与索引（在 master 进程预加载时调用）"""
+        self.products = freeze_records(self.products)
+        self.categories = freeze_records(self.categories)
+        self._products_by_id = MappingProxyType({p['id']: p for p in self.products})
+        self._build_compare_table()
+        self._compare_rows = MappingProxyType(self._compare_rows)
     
     def _init_products(self) -> List[Dict]:
         """初始化产品数据库"""
@@ -336,14 +388,11 @@ class ProductManager:
     
     def get_product_by_id(self, product_id: str) -> Optional[Dict]:
         """根据ID获取产品"""
-        for product in self.products:
-            if product['id'] == product_id:
-                return product
-        return None
+        return self._products_by_id.get(product_id)
     
     def get_products(self, category: str = None, sort_by: str = 'default') -> List[Dict]:
         """获取产品列表（支持筛选和排序）"""
-        products = self.products.copy()
+        products = list(self.products)
         
         # 分类筛选
         if category and category != 'all':
@@ -395,64 +444,116 @@ class ProductManager:
         
         return [r['product'] for r in related[:limit]]
     
-    def compare_products(self, product_ids: List[str]) -> Dict:
-        """产品对比"""
-        products = [self.get_product_by_id(pid) for pid in product_ids]
-        products = [p for p in products if p is not None]
-        
-        if len(products) < 2:
-            return {'error': '至少需要2个产品进行对比'}
-        
-        # 对比维度
-        comparison = {
-            'products': products,
-            'dimensions': [
-                {
-                    'name': '价格',
-                    'key': 'price',
-                    'unit': '元',
-                    'values': [p.get('price', 0) for p in products],
-                    'best': 'low'
-                },
-                {
-                    'name': 'PM2.5 CADR',
-                    'key': 'cadr_pm25',
-                    'unit': 'm³/h',
-                    'values': [p.get('cadr_pm25', 0) for p in products],
-                    'best': 'high'
-                },
-                {
-                    'name': '甲醛 CADR',
-                    'key': 'cadr_formaldehyde',
-                    'unit': 'm³/h',
-                    'values': [p.get('cadr_formaldehyde', 0) for p in products],
-                    'best': 'high'
-                },
-                {
-                    'name': '适用面积',
-                    'key': 'applicable_area',
-                    'unit': '',
-                    'values': [p.get('applicable_area', '-') for p in products],
-                    'best': None
-                },
-                {
-                    'name': '噪音范围',
-                    'key': 'noise_range',
-                    'unit': '',
-                    'values': [p.get('noise_range', '-') for p in products],
-                    'best': 'low'
+    # ==================== 产品对比 ====================
+    
+    def _build_compare_table(self):
+        """
+        预计算对比表：每个产品一行，按 COMPARE_DIMENSIONS 顺序存放 (展示值, 区间, 比较值)
+
+        对比请求只需按产品取行、按列拼装；结果按产品 ID 元组缓存（目录固定，组合数有限）：
+        同一组产品只计算一次（按排序后的 ID），其他请求顺序由该结果换列得到
+        """
+        rows = {}
+        for product in self.products:
+            cells = []
+            for key, _, _, _, bound in COMPARE_DIMENSIONS:
+                value = product.get(key)
+                if bound is None:
+                    score = value if isinstance(value, (int, float)) else None
+                    cells.append((value, None, score))
+                else:
+                    parsed = parse_range(value)
+                    score = None
+                    if parsed:
+                        low, high = parsed
+                        score = (high if high is not None else low) if bound == 'max' else \
+                            (low if low is not None else high)
+                    cells.append((value, parsed, score))
+            rows[product['id']] = {
+                'head': {
+                    'id': product['id'],
+                    'name': product['name'],
+                    'category': product.get('category'),
+                    'main_image': product.get('main_image'),
+                    'price': product.get('price'),
                 },
-                {
-                    'name': '用户评分',
-                    'key': 'rating',
-                    'unit': '分',
-                    'values': [p.get('rating', 0) for p in products],
-                    'best': 'high'
-                }
-            ]
-        }
+                'cells': tuple(cells),
+            }
+        self._compare_rows = rows
+        self._compare_cache: Dict[Tuple[str, ...], Tuple[Dict, bytes]] = {}
+    
+    def _compare_key(self, product_ids: List[str]) -> Tuple[str, ...]:
+        """有效且去重后的产品 ID（保持请求中的顺序）"""
+        return tuple(dict.fromkeys(pid for pid in product_ids if pid in self._compare_rows))
+    
+    def _compare(self, product_ids: List[str]) -> Tuple[Dict, bytes]:
+        order = self._compare_key(product_ids)
+        cached = self._compare_cache.get(order)
+        if cached is not None:
+            return cached
         
-        return comparison
+        key = tuple(sorted(order))
+        if key != order:
+            comparison, _ = self._compare(list(key))
+            if 'products' in comparison:
+                comparison = self._reorder_comparison(comparison, [key.index(pid) for pid in order])
+        elif len(key) < 2:
+            comparison = {'error': '至少需要2个产品进行对比'}
+        else:
+            comparison = self._build_comparison(key)
+        
+        entry = (comparison, json.dumps(comparison, ensure_ascii=False).encode())
+        self._compare_cache[order] = entry
+        return entry
+    
+    def _build_comparison(self, key: Tuple[str, ...]) -> Dict:
+        rows = [self._compare_rows[pid] for pid in key]
+        dimensions = []
+        for index, (dim_key, name, unit, best, bound) in enumerate(COMPARE_DIMENSIONS):
+            cells = [row['cells'][index] for row in rows]
+            scores = [cell[2] for cell in cells]
+            known = [score for score in scores if score is not None]
+            target = None
+            # 至少两个产品有可比较的值且不全相同时才标出最优
+            if len(known) >= 2 and len(set(known)) > 1:
+                target = min(known) if best == 'low' else max(known)
+            dimension = {
+                'name': name,
+                'key': dim_key,
+                'unit': unit,
+                'best': best,
+                'values': [cell[0] if cell[0] is not None else '-' for cell in cells],
+                'is_best': [target is not None and score == target for score in scores],
+            }
+            if bound is not None:
+                dimension['ranges'] = [list(cell[1]) if cell[1] else None for cell in cells]
+            dimensions.append(dimension)
+        return {'products': [row['head'] for row in rows], 'dimensions': dimensions}
+    
+    @staticmethod
+    def _reorder_comparison(comparison: Dict, positions: List[int]) -> Dict:
+        """按 positions（新顺序中每列在原结果中的位置）重排各列"""
+        dimensions = []
+        for dimension in comparison['dimensions']:
+            dimension = dict(dimension)
+            for field in ('values', 'is_best', 'ranges'):
+                if field in dimension:
+                    dimension[field] = [dimension[field][i] for i in positions]
+            dimensions.append(dimension)
+        return {'products': [comparison['products'][i] for i in positions], 'dimensions': dimensions}
+    
+    def compare_products(self, product_ids: List[str]) -> Dict:
+        """
+        产品对比（列式）
+
+        products 为精简的产品信息（按请求中的顺序，重复和不存在的 ID 忽略），dimensions 每项的 values / is_best / ranges
+        与 products 一一对应；is_best 在服务端按 COMPARE_DIMENSIONS 的更优方向计算
+        """
+        return self._compare(product_ids)[0]
+    
+    def compare_products_json(self, product_ids: List[str]) -> bytes:
+        """产品对比的 JSON 响应体（与 compare_products 共用缓存，直接返回序列化结果）"""
+        return self._compare(product_ids)[1]
     
     def search_products(self, keyword: str) -> List[Dict]:
         """搜索产品"""
@@ -0,0 +1,59 @@
+"""
+社区热度排序
+热度分 = log10(互动权重) + 发帖时间 / 时间尺度
+
+分数只取决于帖子自身的计数和发帖时间，不随当前时间变化，因此可以物化到 posts.hot_score
+并建索引：点赞/评论/浏览变化时只重算该帖子的分数，热榜读取是一次索引范围扫描。
+新帖的时间项更大，等价于旧帖随时间衰减：发布时间每早 HOT_TIME_SCALE 秒，需要 10 倍的互动权重才能排在同一位置
+"""
+import math
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 互动权重
+HOT_WEIGHTS = {
+    'likes': 1.0,
+    'comment_count': 2.0,
+    'views': 0.02,
+}
+
+HOT_EPOCH = datetime(2024, 1, 1)
+HOT_TIME_SCALE = 45000  # 秒（12.5 小时）
+
+# 按当前计数重算热度分的 SQL 片段（依赖 install_sql_functions 注册的 hot_score 函数）
+HOT_SCORE_SQL = 'hot_score(likes, comment_count, views, created_at)'
+
+
+def hot_score(likes, comment_count, views, created_at) -> float:
+    """
+    计算帖子热度分
+
+    Args:
+        created_at: datetime 或 ISO 格式字符串；为空时按 HOT_EPOCH 计算（不取当前时间，
+            同样的参数总是得到同样的分数，SQL 函数才能注册为 deterministic）
+    """
+    weight = (
+        float(likes or 0) * HOT_WEIGHTS['likes']
+        + float(comment_count or 0) * HOT_WEIGHTS['comment_count']
+        + float(views or 0) * HOT_WEIGHTS['views']
+    )
+    if not created_at:
+        created_at = HOT_EPOCH
+    elif isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    seconds = (created_at - HOT_EPOCH).total_seconds()
+    return round(math.log10(max(weight, 1)) + seconds / HOT_TIME_SCALE, 7)
+
+
+def _register_sql_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('hot_score', 4, hot_score, deterministic=True)
+
+
+def install_sql_functions():
+    """在之后建立的每个 SQLite 连接上注册 hot_score() SQL 函数"""
+    if not event.contains(Engine, 'connect', _register_sql_functions):
+        event.listen(Engine, 'connect', _register_sql_functions)
@@ -0,0 +1,239 @@
+"""
+只读连接与读快照
+列表类查询不占用写连接池，使用独立的只读连接：
+
+- 实时只读连接：`file:<主库>?mode=ro` + `PRAGMA query_only`，WAL 下读到最新已提交数据且不阻塞写入
+- 读快照：后台线程用 SQLite 在线备份 API 把主库复制为快照文件（主库有写入才复制），
+  每次写到新文件后原子替换；快照以 `immutable=1` 打开，不加锁、不读 WAL。
+  耗时的列表/统计查询走快照，不会因长时间持有主库读事务而阻止 checkpoint、拖慢下单等写入
+
+快照数据最多落后约 READ_SNAPSHOT_INTERVAL 秒；快照尚未生成时退回实时只读连接。
+复制中途失败时删除临时文件；进程被强制结束留下的临时文件在下次初始化时清理
+"""
+import glob
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Optional
+
+from models import db
+from utils.metrics import instrument_connection
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_INTERVAL = 30  # 秒，0 表示不使用快照
+MAX_IDLE_CONNECTIONS = 8
+
+
+class ReadReplica:
+    """只读连接池 + 快照维护"""
+    
+    def __init__(self):
+        self.database: Optional[str] = None
+        self.snapshot_path: Optional[str] = None
+        self.interval = DEFAULT_SNAPSHOT_INTERVAL
+        self.refreshes = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._live: queue.LifoQueue = queue.LifoQueue()
+        self._snapshots: queue.LifoQueue = queue.LifoQueue()
+        self._watch: Optional[sqlite3.Connection] = None
+        self._data_version = None
+    
+    def configure(self, database: str, snapshot_path: Optional[str], interval: int):
+        self.database = database
+        self.snapshot_path = snapshot_path if interval > 0 else None
+        self.interval = interval
+        if snapshot_path:
+            self._remove_stale_tmp(snapshot_path)
+    
+    @staticmethod
+    def _remove_stale_tmp(snapshot_path: str):
+        """删除已退出进程留下的快照临时文件（<快照>.tmp-<pid> 及其 -journal）"""
+        for tmp_path in glob.glob(f'{glob.escape(snapshot_path)}.tmp-*'):
+            try:
+                pid = int(tmp_path[len(snapshot_path) + len('.tmp-'):].split('-')[0])
+                if pid != os.getpid():
+                    os.kill(pid, 0)
+                    continue  # 进程仍在运行，可能正在复制
+            except (ValueError, ProcessLookupError):
+                pass
+            except PermissionError:
+                continue  # 进程存在但属于其他用户
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+    
+    # ==================== 连接 ====================
+    
+    @contextmanager
+    def connect(self, snapshot: bool = False):
+        """借出一个只读连接；snapshot=True 且快照已生成时读快照"""
+        self._ensure_started()
+        inode = self._snapshot_inode() if snapshot else None
+        if inode is None:
+            pool, conn = self._live, self._checkout_live()
+        else:
+            pool, conn = self._snapshots, self._checkout_snapshot(inode)
+        try:
+            yield instrument_connection(conn)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if pool.qsize() >= MAX_IDLE_CONNECTIONS:
+                conn.close()
+            else:
+                pool.put((conn, inode))
+    
+    def _checkout_live(self) -> sqlite3.Connection:
+        try:
+            return self._live.get_nowait()[0]
+        except queue.Empty:
+            return self._open(f'file:{self.database}?mode=ro')
+    
+    def _checkout_snapshot(self, inode: int) -> sqlite3.Connection:
+        # 快照替换后 inode 变化，旧连接仍读旧文件，取出时关闭
+        while True:
+            try:
+                conn, conn_inode = self._snapshots.get_nowait()
+            except queue.Empty:
+                return self._open(f'file:{self.snapshot_path}?mode=ro&immutable=1')
+            if conn_inode == inode:
+                return conn
+            conn.close()
+    
+    def _snapshot_inode(self) -> Optional[int]:
+        if not self.snapshot_path:
+            return None
+        try:
+            return os.stat(self.snapshot_path).st_ino
+        except FileNotFoundError:
+            return None
+    
+    @staticmethod
+    def _open(uri: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA query_only = 1')
+        return conn
+    
+    # ==================== 快照 ====================
+    
+    def _ensure_started(self):
+        """按进程初始化连接池并启动快照线程（fork 后不复用父进程的连接）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._live = queue.LifoQueue()
+            self._snapshots = queue.LifoQueue()
+            self._watch = None
+            self._data_version = None
+            if self.snapshot_path:
+                threading.Thread(target=self._refresh_loop, name='read-snapshot', daemon=True).start()
+            self._pid = os.getpid()
+    
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('读快照刷新失败')
+            time.sleep(self.interval)
+    
+    def refresh(self, force: bool = False) -> bool:
+        """
+        生成新快照，返回是否生成
+
+        非 force 时跳过：其他 worker 刚刷新过（快照未过期），或主库自本进程上次复制以来没有写入。
+        多个 worker 共用一个快照文件，文件锁保证同一时刻只有一个进程在复制
+        """
+        if self._watch is None:
+            self._watch = sqlite3.connect(f'file:{self.database}?mode=ro', uri=True, check_same_thread=False)
+        # data_version 在其他连接（含其他进程）提交后变化
+        data_version = self._watch.execute('PRAGMA data_version').fetchone()[0]
+        
+        with self._refresh_lock():
+            if not force:
+                try:
+                    age = time.time() - os.stat(self.snapshot_path).st_mtime
+                    if age < self.interval * 0.9 or data_version == self._data_version:
+                        return False
+                except FileNotFoundError:
+                    pass
+            
+            tmp_path = f'{self.snapshot_path}.tmp-{os.getpid()}'
+            replaced = False
+            try:
+                with closing(sqlite3.connect(tmp_path)) as target:
+                    # 一步复制整个库：在同一个读事务内完成，得到一致的快照；WAL 下不阻塞写入
+                    self._watch.backup(target)
+                    # 备份会带上主库的 WAL 标记，快照改为普通日志模式以便 immutable 只读打开
+                    target.execute('PRAGMA journal_mode = DELETE')
+                os.replace(tmp_path, self.snapshot_path)
+                replaced = True
+            finally:
+                if not replaced:
+                    for path in (tmp_path, f'{tmp_path}-journal'):
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+            self._data_version = data_version
+            self.refreshes += 1
+            return True
+    
+    @contextmanager
+    def _refresh_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f'{self.snapshot_path}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# 全局只读连接
+read_replica = ReadReplica()
+
+
+@contextmanager
+def read_db(snapshot: bool = False):
+    """
+    借出一个只读连接（游标经过埋点，语句计入当前请求的指标）
+
+    Args:
+        snapshot: 是否读快照（数据可能落后数十秒，用于列表类查询）
+    """
+    with read_replica.connect(snapshot) as conn:
+        yield conn
+
+
+def init_read_replica(app):
+    """
+    配置只读连接与读快照
+
+    配置项：
+        READ_SNAPSHOT_PATH: 快照文件路径，默认 <主库文件名>.snapshot
+        READ_SNAPSHOT_INTERVAL: 快照刷新间隔（秒），默认 30，0 表示不使用快照
+    """
+    with app.app_context():
+        database = db.engine.url.database
+    app.config.setdefault('READ_SNAPSHOT_PATH', f'{database}.snapshot')
+    app.config.setdefault('READ_SNAPSHOT_INTERVAL', DEFAULT_SNAPSHOT_INTERVAL)
+    read_replica.configure(os.path.abspath(database), app.config['READ_SNAPSHOT_PATH'],
+                           int(app.config['READ_SNAPSHOT_INTERVAL']))
@@ -0,0 +1,47 @@
+"""
+空气研究院文章
+文章页面与 AI空气管家的知识检索共用同一份数据
+"""
+from typing import Dict, List
+
+
+def get_research_articles() -> List[Dict]:
+    """获取空气研究院文章"""
+    return [
+        {
+            'id': 1,
+            'title': 'PM2.5对人体健康的影响及防护措施',
+            'category': '空气污染',
+            'summary': '深入了解PM2.5的危害以及如何有效防护...',
+            'image': '/static/images/research/pm25.jpg',
+            'date': '2024-12-15',
+            'views': 3256
+        },
+        {
+            'id': 2,
+            'title': '甲醛污染：新房装修后的隐形杀手',
+            'category': '室内污染',
+            'summary': '装修后甲醛释放周期及科学除醛方法...',
+            'image': '/static/images/research/formaldehyde.jpg',
+            'date': '2024-12-10',
+            'views': 4521
+        },
+        {
+            'id': 3,
+            'title': '过敏季节如何保护呼吸健康',
+            'category': '健康防护',
+            'summary': '春季花粉过敏的预防与空气净化方案...',
+            'image': '/static/images/research/allergy.jpg',
+            'date': '2024-12-05',
+            'views': 2890
+        },
+        {
+            'id': 4,
+            'title': 'HEPA滤网技术原理详解',
+            'category': '技术科普',
+            'summary': '了解空气净化器核心技术HEPA的工作原理...',
+            'image': '/static/images/research/hepa.jpg',
+            'date': '2024-12-01',
+            'views': 5123
+        }
+    ]
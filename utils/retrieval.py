@@ -0,0 +1,95 @@
+"""
+知识检索
+对 AI空气管家的知识库、空气研究院文章和产品介绍建立 BM25 索引，回答未命中意图关键词的长尾问题。
+中文按相邻两字切分（bigram），英文和数字按单词切分；索引在进程内构建，不依赖外部服务。
+
+安装了 numpy 时文档向量存为矩阵，一次矩阵-向量乘法得出全部文档的得分；未安装时按倒排表累加。
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖
+    np = None
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?|[\u4e00-\u9fff]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """切分词项：英文/数字按单词，中文按相邻两字（单个汉字成段时保留单字）"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if len(run) == 1 or run.isascii():
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class KnowledgeIndex:
+    """
+    BM25 检索索引
+
+    documents 为 (文档键, 文本) 列表。文档中每个词项的 BM25 权重在构建时算好，
+    查询得分 = 文档词项权重矩阵 · 查询词项的 0/1 向量（每个查询词项只计一次）
+    """
+    
+    def __init__(self, documents: Sequence[Tuple[Any, str]], k1: float = BM25_K1, b: float = BM25_B):
+        self.keys = tuple(key for key, _ in documents)
+        counts = [Counter(tokenize(text)) for _, text in documents]
+        lengths = [sum(count.values()) for count in counts]
+        average = (sum(lengths) / len(lengths)) if lengths else 0
+        total = len(documents)
+        document_frequency = Counter(term for count in counts for term in count)
+        
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc, (count, length) in enumerate(zip(counts, lengths)):
+            norm = k1 * (1 - b + b * length / average)
+            for term, tf in count.items():
+                df = document_frequency[term]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                postings.setdefault(term, []).append((doc, idf * tf * (k1 + 1) / (tf + norm)))
+        
+        self.vocabulary = {term: column for column, term in enumerate(sorted(postings))}
+        self._postings = {term: tuple(entries) for term, entries in postings.items()}
+        self._matrix = None
+        if np is not None and total:
+            matrix = np.zeros((total, len(self.vocabulary)), dtype=np.float32)
+            for term, entries in postings.items():
+                column = self.vocabulary[term]
+                for doc, weight in entries:
+                    matrix[doc, column] = weight
+            matrix.flags.writeable = False
+            self._matrix = matrix
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def search(self, text: str, limit: int = 1) -> List[Tuple[Any, float]]:
+        """返回得分最高的 limit 个 (文档键, 得分)，按得分降序；没有共同词项的文档不返回"""
+        terms = {term for term in tokenize(text) if term in self.vocabulary}
+        if not terms:
+            return []
+        
+        if self._matrix is not None:
+            query = np.zeros(len(self.vocabulary), dtype=np.float32)
+            query[[self.vocabulary[term] for term in terms]] = 1
+            scores = self._matrix @ query
+            top = np.argsort(-scores, kind='stable')[:limit]
+            return [(self.keys[doc], float(scores[doc])) for doc in top if scores[doc] > 0]
+        
+        scores: Dict[int, float] = {}
+        for term in terms:
+            for doc, weight in self._postings[term]:
+                scores[doc] = scores.get(doc, 0.0) + weight
+        # 同分时文档序号小的在前（与 numpy 路径一致）
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.keys[doc], score) for doc, score in best]
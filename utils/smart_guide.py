@@ -3,8 +3,11 @@
 森系智韵智能空气管理平台核心模块
 """
 import json
+import uuid
 from typing import Dict, List, Any, Optional
 
+from utils.preload import freeze_records
+
 
 class SmartGuideSystem:
     """
@@ -95,6 +98,10 @@ class SmartGuideSystem:
         """初始化智能导购系统"""
         self.products = self._load_products()
     
+    def freeze(self):
+        """只读化产品数据（在 master 进程预加载时调用）"""
+        self.products = freeze_records(self.products)
+    
     def _load_products(self) -> List[Dict]:
         """加载产品数据"""
         # 产品数据库
@@ -194,6 +201,8 @@ class SmartGuideSystem:
     def init_session(self) -> Dict:
         """初始化会话状态"""
         return {
+            # 对话分析按会话统计导购漏斗
+            'session_id': uuid.uuid4().hex[:16],
             'current_step': 0,
             'user_profile': {
                 'area': None,
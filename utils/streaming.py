@@ -0,0 +1,63 @@
+"""
+流式响应（Server-Sent Events）
+把一次完整的回复拆成事件逐段发送：先发送意图、快捷回复等元信息，再分段发送正文，
+前端据此先显示消息框和快捷回复、再逐段填充正文。
+
+AI空气管家的回复（含意图和正文）由一次路由表查找整体得到，元信息不会早于正文就绪，
+流式输出不缩短首字节时间。回复内容在返回响应之前已经生成，生成器只负责写出，不等待、不休眠：
+客户端读得慢时由内核缓冲区和反向代理承接，worker 线程写完即释放，不会因空闲连接被长期占用。
+"""
+import json
+from typing import Dict, Iterable, Iterator, Tuple
+
+# 正文分段的最大字符数
+STREAM_CHUNK_CHARS = 48
+
+# SSE 响应头：禁用缓存和 nginx 缓冲，事件按写出顺序送达而不是攒到响应结束
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def wants_event_stream(accept_header: str) -> bool:
+    """请求头 Accept 中包含 text/event-stream 时使用流式响应"""
+    return 'text/event-stream' in (accept_header or '')
+
+
+def format_sse(event: str, data: Dict) -> str:
+    """编码一个 SSE 事件"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def split_message(text: str, size: int = STREAM_CHUNK_CHARS) -> Iterator[str]:
+    """按行切分正文（保留换行符），相邻短行合并到不超过 size，超长的行按 size 切分"""
+    buffer = ''
+    for line in text.splitlines(keepends=True):
+        if buffer and len(buffer) + len(line) > size:
+            yield buffer
+            buffer = ''
+        while len(line) > size:
+            yield line[:size]
+            line = line[size:]
+        buffer += line
+    if buffer:
+        yield buffer
+
+
+def reply_events(response: Dict) -> Iterator[Tuple[str, Dict]]:
+    """
+    把一条完整回复拆成事件序列
+
+    meta（除 message 外的全部字段）-> 若干 delta（正文分段）-> done
+    """
+    meta = {key: value for key, value in response.items() if key != 'message'}
+    yield 'meta', meta
+    for chunk in split_message(response.get('message', '')):
+        yield 'delta', {'text': chunk}
+    yield 'done', {}
+
+
+def sse_stream(events: Iterable[Tuple[str, Dict]]) -> Iterator[str]:
+    for event, data in events:
+        yield format_sse(event, data)
@@ -0,0 +1,95 @@
+"""
+启动预热
+新启动的 worker 在第一次访问各页面时才编译模板、建立数据库连接和读快照，部署或扩容后的最初一批请求明显偏慢：
+
+- 模板字节码缓存：编译结果写入 TEMPLATE_BYTECODE_CACHE_DIR（默认 instance/jinja_cache），
+  之后启动的进程直接加载字节码，不再解析模板（模板内容变化时按校验和自动重新编译）
+- warm_up()：编译全部模板，再用测试客户端把主要页面各请求一次（同时填充模板片段缓存和各类连接池），
+  最后清空预热请求产生的指标
+
+gunicorn preload 模式下 master 在 fork 前编译模板（worker 共享编译结果），
+各 worker 在开始接收请求前执行 warm_up()（见 gunicorn.conf.py）；单独运行 uvicorn 时在 lifespan 启动阶段执行（见 asgi.py）
+"""
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from jinja2 import FileSystemBytecodeCache, TemplateError
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 预热的页面
+WARMUP_PATHS = ('/', '/products', '/guide', '/research', '/community', '/brand', '/compare',
+                '/login', '/profile', '/api/products')
+
+# 已完成预热的进程（fork 出的子进程继承 master 的编译结果，但连接池等需要重新预热）
+_warmed_pid = None
+
+
+def compile_templates(app) -> int:
+    """编译 templates/ 下的全部模板（写入 Jinja 的模板缓存和字节码缓存），返回模板数"""
+    env = app.jinja_env
+    count = 0
+    for name in env.list_templates(extensions=('html',)):
+        try:
+            env.get_template(name)
+        except TemplateError:
+            logger.exception('模板编译失败: %s', name)
+        else:
+            count += 1
+    return count
+
+
+def warm_up(app, paths: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    预热当前进程（同一进程只执行一次），返回各页面预热请求的耗时（毫秒）
+
+    WARMUP_ENABLED=False 时跳过
+    """
+    global _warmed_pid
+    if _warmed_pid == os.getpid() or not app.config.get('WARMUP_ENABLED', True):
+        return {}
+    started = time.perf_counter()
+    templates = compile_templates(app)
+    
+    timings = {}
+    client = app.test_client()
+    for path in paths or app.config['WARMUP_PATHS']:
+        request_started = time.perf_counter()
+        try:
+            status = client.get(path).status_code
+        except Exception:
+            logger.exception('预热请求失败: %s', path)
+            continue
+        timings[path] = round((time.perf_counter() - request_started) * 1000, 2)
+        if status >= 500:
+            logger.warning('预热请求返回 %s: %s', status, path)
+    
+    # 预热请求不计入指标
+    registry.reset()
+    _warmed_pid = os.getpid()
+    logger.info('预热完成：%d 个模板，%d 个页面，耗时 %.0fms', templates, len(timings),
+                (time.perf_counter() - started) * 1000)
+    return timings
+
+
+def init_template_cache(app):
+    """
+    配置模板字节码缓存和预热页面（须在渲染任何模板之前调用）
+
+    配置项：
+        TEMPLATE_BYTECODE_CACHE_DIR: 字节码缓存目录，默认 instance/jinja_cache，空字符串表示不使用
+        WARMUP_PATHS: warm_up() 请求的页面，默认 WARMUP_PATHS
+        WARMUP_ENABLED: 是否执行 warm_up()，默认 True
+    """
+    app.config.setdefault('TEMPLATE_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+    app.config.setdefault('WARMUP_PATHS', WARMUP_PATHS)
+    app.config.setdefault('WARMUP_ENABLED', True)
+    
+    directory = app.config['TEMPLATE_BYTECODE_CACHE_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
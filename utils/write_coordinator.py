@@ -0,0 +1,216 @@
+"""
+SQLite 写入协调
+SQLite 同一时刻只允许一个写事务，多线程各自开事务写入时互相等锁，超时即报 database is locked。
+
+- 所有连接开启 WAL（读不阻塞写、写不阻塞读）并设置 busy_timeout，跨进程的写锁冲突由 SQLite 等待重试
+- 进程内 utils.database 的写操作交给单个写线程串行执行；写线程每次取出队列中积压的全部写请求，
+  在一个事务内执行（每个请求一个保存点，互不影响）后统一提交（group commit），
+  高并发时多个请求共用一次提交的开销
+- 超时只针对排队：写请求在超时前未被写线程取出时取消（不会再执行）并抛出 TimeoutError；
+  已开始执行的写请求一直等到提交完成，调用方看到的结果与实际是否提交一致
+- 写线程执行的 SQL 计入提交该写请求的请求统计（慢请求日志中的 SQL 列表与耗时）
+
+写函数接收游标，在写线程的事务内执行：
+    def write(cursor):
+        cursor.execute('UPDATE ...')
+        return cursor.rowcount
+    write_coordinator.run(write)
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db
+from utils.metrics import RequestStats, current_stats, registry, track
+
+DEFAULT_MAX_BATCH = 128
+DEFAULT_BUSY_TIMEOUT_MS = 30000
+DEFAULT_WRITE_TIMEOUT = 60.0  # 秒，写请求排队等待写线程的最长时间
+
+# 每个新连接上执行的 PRAGMA（busy_timeout 在 init_write_coordinator 中按配置设置）
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': DEFAULT_BUSY_TIMEOUT_MS,
+}
+
+
+class AbortWrite(Exception):
+    """
+    在写函数中抛出，回滚本次写入（同批其他写入不受影响），run() 返回 result
+
+    如库存不足时: raise AbortWrite(None)
+    """
+    
+    def __init__(self, result=None):
+        super().__init__(result)
+        self.result = result
+
+
+class _StatsCursor:
+    """把执行的 SQL 及耗时记入提交写请求的请求统计（写线程没有请求上下文，SQLAlchemy 事件也不经过原始游标）"""
+    
+    def __init__(self, cursor, stats: RequestStats):
+        self._cursor = cursor
+        self._stats = stats
+    
+    def execute(self, statement: str, *args):
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(statement, *args)
+        finally:
+            self._stats.record_statement(statement, time.perf_counter() - started)
+        return self
+    
+    def executemany(self, statement: str, *args):
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(statement, *args)
+        finally:
+            self._stats.record_statement(statement, time.perf_counter() - started)
+        return self
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class WriteCoordinator:
+    """进程内单写线程 + group commit"""
+    
+    def __init__(self, max_batch: int = DEFAULT_MAX_BATCH, timeout: float = DEFAULT_WRITE_TIMEOUT):
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.batches = 0
+        self.writes = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+    
+    def run(self, write: Callable):
+        """
+        在写线程的事务内执行 write(cursor)，提交后返回其结果（需在应用上下文中调用）
+
+        write 抛出的异常（AbortWrite 除外）在调用方重新抛出；不能在写函数内再调用 run()。
+        排队超过 timeout 秒仍未开始执行时取消并抛出 TimeoutError（写入不会发生）
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError('不能在写函数内嵌套调用 write_coordinator.run()')
+        self._ensure_started()
+        future = Future()
+        self._queue.put((write, future, current_stats()))
+        with track('db_write'):
+            try:
+                return future.result(self.timeout)
+            except TimeoutError:
+                if future.cancel():
+                    raise
+                # 已开始执行：等待提交完成，不能在写入可能已提交时报告失败
+                return future.result()
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # gunicorn preload 时在各 worker 中分别启动；fork 前父进程队列中的请求不属于子进程
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, args=(db.engine, self._queue),
+                                            name='write-coordinator', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+    
+    def _run(self, engine, requests: queue.Queue):
+        conn = engine.raw_connection()
+        conn.driver_connection.row_factory = sqlite3.Row
+        try:
+            while True:
+                batch = [requests.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(requests.get_nowait())
+                    except queue.Empty:
+                        break
+                self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+    
+    def _commit_batch(self, conn, batch: List[Tuple[Callable, Future, Optional[RequestStats]]]):
+        """一个事务执行一批写请求，提交后再通知各调用方"""
+        # 调用方已超时取消的请求不再执行；其余标记为执行中，之后不能再取消
+        batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for write, future, stats in batch:
+                cursor.execute('SAVEPOINT write_request')
+                try:
+                    request_cursor = cursor if stats is None else _StatsCursor(cursor, stats)
+                    outcomes.append((future, write(request_cursor), None))
+                except AbortWrite as e:
+                    cursor.execute('ROLLBACK TO SAVEPOINT write_request')
+                    outcomes.append((future, e.result, None))
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO SAVEPOINT write_request')
+                    outcomes.append((future, None, e))
+                cursor.execute('RELEASE SAVEPOINT write_request')
+            conn.commit()
+        except Exception as e:
+            # 开始或提交事务失败：整批失败
+            conn.rollback()
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        
+        self.batches += 1
+        self.writes += len(batch)
+        registry.inc('senxi_write_batches_total', help_text='写线程提交的事务数')
+        registry.inc('senxi_write_requests_total', len(batch), help_text='写线程执行的写请求数')
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# 全局写协调器
+write_coordinator = WriteCoordinator()
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+def init_write_coordinator(app):
+    """
+    为之后建立的 SQLite 连接开启 WAL 并设置 busy_timeout（须在建立连接之前调用）
+
+    配置项：
+        SQLITE_BUSY_TIMEOUT_MS: 等待写锁的最长时间（毫秒），默认 30000
+        WRITE_COORDINATOR_MAX_BATCH: 一次提交最多包含的写请求数，默认 128
+    """
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', DEFAULT_BUSY_TIMEOUT_MS)
+    app.config.setdefault('WRITE_COORDINATOR_MAX_BATCH', DEFAULT_MAX_BATCH)
+    SQLITE_PRAGMAS['busy_timeout'] = int(app.config['SQLITE_BUSY_TIMEOUT_MS'])
+    write_coordinator.max_batch = app.config['WRITE_COORDINATOR_MAX_BATCH']
+    if not event.contains(Engine, 'connect', _configure_connection):
+        event.listen(Engine, 'connect', _configure_connection)
@@ -0,0 +1,469 @@
+"""
+后台写队列
+请求中只完成主写入（评论、点赞记录等），计数维护、热度分重算等派生写入
+先落盘到独立的 SQLite 队列库，再由每个进程的单个写线程批量执行：
+
+- 持久化：入队即写入队列库（WAL），进程崩溃或重启后未完成的任务继续执行
+- 发件箱：与主写入必须一致的计数（点赞数、评论数）由仓储方法用 stage_job() 在主写入的
+  同一事务内写入主库的 job_outbox，写线程在主库的一个事务内合并执行并删除，
+  两者之间崩溃也不会漏加或重复累加
+- 缓冲计数：浏览量等允许少量误差的计数用 increment() 只追加到内存缓冲区，
+  由写线程合并后批量入队，请求中不做 I/O（进程崩溃时最多丢失最近约 1 秒的计数）
+- 合并：同一 (kind, key) 的待执行任务只保留一条，amount 累加（如多次浏览合并为一次 +N），
+  热点帖子上的大量互动只产生少量 UPDATE
+- 批量：一批任务在主库的一个事务内执行，每个任务一个保存点，单个任务失败不影响同批其他任务
+- 重试：失败任务按指数退避重试，超过次数标记为 dead 保留在队列库中供排查
+- 关闭：进程退出时（atexit）先执行完已到期的任务再停止写线程
+
+任务只生效一次：执行任务的同一个主库事务内把任务编号写入 applied_jobs，
+主库提交后、队列库删除前进程崩溃时，重放的任务查到编号后直接跳过
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import closing, contextmanager
+from typing import Callable, Dict, List, Optional
+
+from models import db
+from utils.database import PostDB
+from utils.write_coordinator import write_coordinator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 1.0  # 秒，第 n 次失败后等待 RETRY_DELAY * 2^(n-1)
+POLL_INTERVAL = 1.0
+# 任务被领取后超过该时长仍未完成（写线程所在进程已退出），重新放回待执行；
+# 须明显长于写协调器的写超时，否则仍在执行的批次会被其他进程重复领取
+CLAIM_LEASE = 300.0
+# applied_jobs 中的记录保留时长（远长于 CLAIM_LEASE，重放只会发生在租约过期后不久）
+APPLIED_RETENTION = 86400.0
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        amount INTEGER NOT NULL DEFAULT 0,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_at REAL NOT NULL,
+        claimed_at REAL,
+        last_error TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_jobs_pending_key ON jobs (kind, key) WHERE state = 'pending';
+    CREATE INDEX IF NOT EXISTS ix_jobs_state_run_at ON jobs (state, run_at);
+'''
+
+_ENQUEUE_SQL = '''
+    INSERT INTO jobs (kind, key, amount, run_at, created_at) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (kind, key) WHERE state = 'pending'
+    DO UPDATE SET amount = amount + excluded.amount
+'''
+
+# 任务处理函数：handler(cursor, key, amount)，cursor 属于主库的当前批次事务
+HANDLERS: Dict[str, Callable] = {}
+
+
+def handler(kind: str):
+    """注册任务处理函数"""
+    def decorator(func: Callable) -> Callable:
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+class WriteQueue:
+    """
+    持久化写队列
+
+    用法:
+        write_queue.enqueue('post_views', post.id, amount=10)
+        write_queue.increment('post_views', post.id)
+        stage_job(cursor, 'post_likes', post.id, 1)  # 仓储方法的写事务内，经发件箱执行
+    """
+    
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 retry_delay: float = DEFAULT_RETRY_DELAY):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.claim_lease = CLAIM_LEASE
+        self.path: Optional[str] = None
+        self._app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stopping = False
+        self._idle = threading.Event()
+        # increment() 追加的 (kind, key, amount)，由写线程合并入队
+        self._buffered: deque = deque()
+        # 发件箱中有任务执行失败时，到该时间之前不再执行发件箱
+        self._outbox_retry_at = 0.0
+    
+    def init_app(self, app, path: str):
+        self._app = app
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+            # 队列库被删除重建时编号从头开始，跳过 applied_jobs 中仍保留的编号，避免新任务被误判为已执行
+            with app.app_context():
+                main = db.engine.raw_connection()
+                try:
+                    applied = main.execute('SELECT MAX(id) FROM applied_jobs').fetchone()[0]
+                finally:
+                    main.close()
+            last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'jobs'").fetchone()
+            if applied and (last is None or last[0] < applied):
+                with _transaction(conn):
+                    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'jobs'")
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('jobs', ?)", (applied,))
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    # ==================== 入队 ====================
+    
+    def enqueue(self, kind: str, key, amount: int = 0):
+        """
+        写入一条任务（同一 kind/key 已有待执行任务时合并，amount 累加）
+
+        返回时任务已持久化，由后台写线程稍后执行
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f'未注册的任务类型: {kind}')
+        now = time.time()
+        with self._lock:
+            self._ensure_started()
+            self._conn.execute(_ENQUEUE_SQL, (kind, str(key), amount, now, now))
+            self._idle.clear()
+            self._wakeup.notify()
+    
+    def increment(self, kind: str, key, amount: int = 1):
+        """
+        累加计数：只追加到内存缓冲区（不加锁、不做 I/O），写线程约每秒合并后入队
+
+        用于浏览量等允许少量误差的计数；进程崩溃时缓冲区中尚未入队的计数丢失
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f'未注册的任务类型: {kind}')
+        if self._pid != os.getpid():
+            self.ensure_started()
+        self._buffered.append((kind, str(key), amount))
+    
+    def pending_count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE state != 'dead'").fetchone()[0]
+    
+    def clear(self):
+        """清空队列库（重建主库数据时调用，避免旧任务作用到新数据上）"""
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM jobs')
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """等待当前进程的写线程处理完缓冲的计数和已到期的任务，返回是否在超时前完成"""
+        with self._lock:
+            self._ensure_started()
+            self._idle.clear()
+            self._wakeup.notify()
+        return self._idle.wait(timeout)
+    
+    # ==================== 写线程 ====================
+    
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            self._ensure_started()
+    
+    def _ensure_started(self):
+        """按进程启动写线程（gunicorn preload 时 master 中不启动，fork 后在各 worker 中启动）"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stopping = False
+        self._conn = self._connect()
+        self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+        self._thread.start()
+    
+    def _reset_after_fork(self):
+        # fork 时锁可能正被父进程的其他线程持有
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._idle = threading.Event()
+        # 父进程缓冲区中的计数由父进程入队
+        self._buffered = deque()
+    
+    def stop(self, timeout: float = 10.0):
+        """执行完已到期的任务后停止写线程（剩余任务保留在队列库中）"""
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None:
+                return
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        self._pid = None
+    
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                self._enqueue_buffered(conn)
+                self._apply_outbox()
+                self._release_expired(conn)
+                jobs = self._claim(conn)
+                if jobs:
+                    self._execute(conn, jobs)
+                    continue
+                with self._lock:
+                    if self._buffered:
+                        continue
+                    if self._stopping:
+                        return
+                    # 入队在锁内完成，这里看到的是最新状态，不会漏掉通知
+                    wait = self._next_wait(conn)
+                    if wait > 0:
+                        self._idle.set()
+                        self._wakeup.wait(wait)
+        except Exception:
+            logger.exception('写队列线程异常退出')
+        finally:
+            self._idle.set()
+            conn.close()
+    
+    def _enqueue_buffered(self, conn):
+        """把内存缓冲区中的计数按 (kind, key) 合并后入队"""
+        counts: Dict[tuple, int] = {}
+        while self._buffered:
+            kind, key, amount = self._buffered.popleft()
+            counts[(kind, key)] = counts.get((kind, key), 0) + amount
+        if counts:
+            now = time.time()
+            with _transaction(conn):
+                conn.executemany(_ENQUEUE_SQL, [(kind, key, amount, now, now)
+                                                for (kind, key), amount in counts.items()])
+    
+    def _apply_outbox(self):
+        """
+        合并执行主库发件箱中的任务（同一 (kind, key) 的 amount 累加后执行一次）
+
+        执行与删除在主库的同一个事务内完成，只生效一次；多个进程同时执行时由主库写锁串行，
+        后执行的进程看不到已删除的任务。执行失败的任务留在发件箱中，等待 retry_delay 后重试
+        """
+        if time.time() < self._outbox_retry_at:
+            return
+        with self._app.app_context():
+            main = db.engine.raw_connection()
+            try:
+                if main.execute('SELECT 1 FROM job_outbox LIMIT 1').fetchone() is None:
+                    return
+            finally:
+                main.close()
+        failed = []
+        
+        def write(cursor):
+            last_id = cursor.execute('SELECT MAX(id) FROM job_outbox').fetchone()[0]
+            if last_id is None:
+                return
+            groups = cursor.execute('''
+                SELECT kind, key, SUM(amount) AS amount FROM job_outbox
+                WHERE id <= ? GROUP BY kind, key
+            ''', (last_id,)).fetchall()
+            for group in groups:
+                cursor.execute('SAVEPOINT job')
+                try:
+                    if group['kind'] not in HANDLERS:
+                        raise ValueError(f'未注册的任务类型: {group["kind"]}')
+                    HANDLERS[group['kind']](cursor, group['key'], group['amount'])
+                    cursor.execute('''
+                        DELETE FROM job_outbox WHERE kind = ? AND key = ? AND id <= ?
+                    ''', (group['kind'], group['key'], last_id))
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO SAVEPOINT job')
+                    failed.append((group['kind'], group['key'], repr(e)))
+                cursor.execute('RELEASE SAVEPOINT job')
+        
+        try:
+            with self._app.app_context():
+                write_coordinator.run(write)
+        except Exception as e:
+            failed = [('*', '*', repr(e))]
+        for kind, key, error in failed:
+            logger.warning('发件箱任务 %s(%s) 执行失败，稍后重试: %s', kind, key, error)
+        if failed:
+            self._outbox_retry_at = time.time() + self.retry_delay
+    
+    def _next_wait(self, conn) -> float:
+        row = conn.execute("SELECT MIN(run_at) FROM jobs WHERE state = 'pending'").fetchone()
+        if row[0] is None:
+            return POLL_INTERVAL
+        return min(max(row[0] - time.time(), 0), POLL_INTERVAL)
+    
+    def _claim(self, conn) -> List[sqlite3.Row]:
+        """领取一批已到期的任务（多个进程共用队列库时由单条 UPDATE 保证不重复领取）"""
+        now = time.time()
+        return conn.execute('''
+            UPDATE jobs SET state = 'running', claimed_at = ?
+            WHERE id IN (
+                SELECT id FROM jobs WHERE state = 'pending' AND run_at <= ? ORDER BY id LIMIT ?
+            )
+            RETURNING id, kind, key, amount, attempts
+        ''', (now, now, self.batch_size)).fetchall()
+    
+    def _execute(self, conn, jobs: List[sqlite3.Row]):
+        """经写协调器在主库的一个事务内执行一批任务"""
+        done, failed = [], []
+        
+        def write(cursor):
+            now = time.time()
+            for job in jobs:
+                cursor.execute('SAVEPOINT job')
+                try:
+                    # 已执行过（上次提交后未能从队列库删除）的任务直接跳过
+                    if cursor.execute('SELECT 1 FROM applied_jobs WHERE id = ?', (job['id'],)).fetchone() is None:
+                        HANDLERS[job['kind']](cursor, job['key'], job['amount'])
+                        cursor.execute('INSERT INTO applied_jobs (id, applied_at) VALUES (?, ?)', (job['id'], now))
+                    done.append(job)
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO SAVEPOINT job')
+                    failed.append((job, repr(e)))
+                cursor.execute('RELEASE SAVEPOINT job')
+            cursor.execute('DELETE FROM applied_jobs WHERE applied_at < ?', (now - APPLIED_RETENTION,))
+        
+        try:
+            with self._app.app_context():
+                write_coordinator.run(write)
+        except Exception as e:
+            failed = [(job, repr(e)) for job in jobs]
+            done = []
+        
+        with _transaction(conn):
+            conn.executemany('DELETE FROM jobs WHERE id = ?', [(job['id'],) for job in done])
+            for job, error in failed:
+                self._retry(conn, job, error)
+    
+    def _retry(self, conn, job: sqlite3.Row, error: str):
+        attempts = job['attempts'] + 1
+        if attempts >= self.max_attempts:
+            logger.error('写队列任务 %s(%s) 失败 %d 次，已放弃: %s', job['kind'], job['key'], attempts, error)
+            conn.execute('''
+                UPDATE jobs SET state = 'dead', attempts = ?, last_error = ? WHERE id = ?
+            ''', (attempts, error, job['id']))
+            return
+        logger.warning('写队列任务 %s(%s) 执行失败，稍后重试: %s', job['kind'], job['key'], error)
+        run_at = time.time() + self.retry_delay * 2 ** (attempts - 1)
+        self._requeue(conn, job, attempts, run_at, error)
+    
+    def _release_expired(self, conn):
+        """把领取超时的任务放回待执行（已在主库执行过的直接删除，不与其他任务合并）"""
+        expired = conn.execute('''
+            SELECT id, kind, key, amount, attempts FROM jobs WHERE state = 'running' AND claimed_at < ?
+        ''', (time.time() - self.claim_lease,)).fetchall()
+        if expired:
+            applied = self._applied_ids([job['id'] for job in expired])
+            with _transaction(conn):
+                for job in expired:
+                    if job['id'] in applied:
+                        conn.execute('DELETE FROM jobs WHERE id = ?', (job['id'],))
+                    else:
+                        self._requeue(conn, job, job['attempts'], time.time(), None)
+    
+    def _applied_ids(self, ids: List[int]) -> set:
+        with self._app.app_context():
+            main = db.engine.raw_connection()
+            try:
+                placeholders = ', '.join('?' * len(ids))
+                return {row[0] for row in main.execute(
+                    f'SELECT id FROM applied_jobs WHERE id IN ({placeholders})', ids
+                ).fetchall()}
+            finally:
+                main.close()
+    
+    @staticmethod
+    def _requeue(conn, job: sqlite3.Row, attempts: int, run_at: float, error: Optional[str]):
+        """放回待执行；期间已有同 key 的新任务入队时并入该任务"""
+        merged = conn.execute('''
+            UPDATE jobs SET amount = amount + ?, attempts = MAX(attempts, ?),
+                            run_at = MAX(run_at, ?), last_error = COALESCE(?, last_error)
+            WHERE kind = ? AND key = ? AND state = 'pending'
+        ''', (job['amount'], attempts, run_at, error, job['kind'], job['key'])).rowcount
+        if merged:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job['id'],))
+        else:
+            conn.execute('''
+                UPDATE jobs SET state = 'pending', claimed_at = NULL, attempts = ?, run_at = ?,
+                                last_error = COALESCE(?, last_error)
+                WHERE id = ?
+            ''', (attempts, run_at, error, job['id']))
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+# 全局写队列
+write_queue = WriteQueue()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=write_queue._reset_after_fork)
+
+
+def init_write_queue(app):
+    """
+    初始化队列库并注册写线程的启动与退出清空
+
+    配置项：
+        WRITE_QUEUE_DATABASE: 队列库文件路径，默认与主库同目录的 <主库文件名>.jobs
+        WRITE_QUEUE_CLAIM_LEASE: 任务领取租约（秒），默认 CLAIM_LEASE，且不短于写超时的 5 倍
+    """
+    with app.app_context():
+        app.config.setdefault('WRITE_QUEUE_DATABASE', f'{db.engine.url.database}.jobs')
+    app.config.setdefault('WRITE_QUEUE_CLAIM_LEASE', CLAIM_LEASE)
+    write_queue.claim_lease = max(app.config['WRITE_QUEUE_CLAIM_LEASE'], write_coordinator.timeout * 5)
+    write_queue.init_app(app, app.config['WRITE_QUEUE_DATABASE'])
+    app.before_request(write_queue.ensure_started)
+    atexit.register(write_queue.stop)
+
+
+# ==================== 社区派生写入 ====================
+
+@handler('post_likes')
+def _add_post_likes(cursor, key: str, amount: int):
+    """累加点赞数（取消点赞为负数）并重算热度分"""
+    cursor.execute('UPDATE posts SET likes = MAX(0, likes + ?) WHERE id = ?', (amount, int(key)))
+    PostDB.refresh_hot_score(cursor, int(key))
+
+
+@handler('post_comments')
+def _add_post_comments(cursor, key: str, amount: int):
+    """累加评论数并重算热度分"""
+    cursor.execute('UPDATE posts SET comment_count = comment_count + ? WHERE id = ?', (amount, int(key)))
+    PostDB.refresh_hot_score(cursor, int(key))
+
+
+@handler('post_views')
+def _add_post_views(cursor, key: str, amount: int):
+    """累加浏览量并重算热度分"""
+    cursor.execute('UPDATE posts SET views = views + ? WHERE id = ?', (amount, int(key)))
+    PostDB.refresh_hot_score(cursor, int(key))
+